@@ -0,0 +1,70 @@
+# coding=utf-8
+'''Import-time benchmark for the simulation package
+
+every run imports the package in a fresh interpreter inside an empty temp dir
+and checks that it stays light: no pandas / matplotlib / numba loaded, no log
+file written, median wall time under the limit.
+
+python benchmarks/import_time.py [--repeat 7] [--max-ms 250]
+exit code 1 on regression
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY = ['pandas', 'matplotlib', 'numba']
+
+PROBE = '''
+import json, sys, time
+t = time.perf_counter()
+import numpy
+t1 = time.perf_counter()
+import simulation
+t2 = time.perf_counter()
+print(json.dumps({'numpy': t1 - t, 'simulation': t2 - t1, 'loaded': [m for m in %r if m in sys.modules]}))
+''' % LAZY
+
+
+def probe() -> dict:
+    with tempfile.TemporaryDirectory() as cwd:
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get('PYTHONPATH', '')]))
+        out = subprocess.run([sys.executable, '-c', PROBE], cwd=cwd, env=env, check=True,
+                             stdout=subprocess.PIPE, universal_newlines=True).stdout
+        ret = json.loads(out)
+        ret['files'] = os.listdir(cwd)
+    return ret
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--max-ms', type=float, default=250.0, help='limit of the median import time, numpy excluded')
+    args = parser.parse_args()
+
+    runs = [probe() for _ in range(args.repeat)]
+    ms = statistics.median(r['simulation'] for r in runs) * 1000
+    numpy_ms = statistics.median(r['numpy'] for r in runs) * 1000
+    loaded = sorted(set(m for r in runs for m in r['loaded']))
+    files = sorted(set(f for r in runs for f in r['files']))
+    print(json.dumps({'import_ms': round(ms, 2), 'numpy_ms': round(numpy_ms, 2), 'loaded': loaded, 'files': files}))
+
+    ok = True
+    if ms > args.max_ms:
+        print('import simulation took {:.1f} ms > {:.1f} ms'.format(ms, args.max_ms))
+        ok = False
+    if loaded:
+        print('modules loaded at import time: {}'.format(loaded))
+        ok = False
+    if files:
+        print('files written at import time: {}'.format(files))
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+# coding=utf-8
+'''Throughput benchmark of the main simulation paths
+
+every case runs in a fresh interpreter so its peak RSS is its own: it builds
+the strategy, warms up (imports, numba compile, worker pool start) and times
+the best of --repeat calls. Recorded per case: trades/sec, peak RSS of the
+process and of its workers, and the bytes pickled to and from the workers.
+
+cases
+    run, run-batch, run-kernel   MCSimulation.run in the scalar / batch / kernel mode
+    call                         MCSimulation.__call__, one strategy curve
+    gdf                          generateGDF with 8 strategies, the only case run on every --cores
+    df                           generateDF with 4 strategies
+    stat                         getStat without plot, after run
+    perf                         utils.calcPerformance of a balance curve
+    kaili                        KaliSimu.game into a new Ragged
+    portfolio                    generatePortfolio of 500 correlated SimV4 strategies, trades of all of them
+strategies: the representative simuT ones, sim10 (childSim1_0 on losses),
+simv3 and simv4; perf, kaili and portfolio do not depend on a strategy.
+
+TARGETS pins a min throughput from 10^6 trades on: the portfolio has to play
+500 strategies over 10^6 trades within a minute on one core. Its blocks of
+trades are independent and all the same size, so the rate of a smaller run
+carries over.
+
+python benchmarks/suite.py [--max-trades 1e6] [--cores 1 4] [--out bench.json]
+python benchmarks/suite.py --save-baseline            write benchmarks/baseline.json
+python benchmarks/suite.py --baseline benchmarks/baseline.json [--tolerance 0.3]
+exit code 1 when a case is slower, or uses more memory / pickles more, than the baseline by the tolerance,
+or misses its target
+'''
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+STRATEGIES = ['sim10', 'simv3', 'simv4']
+CASES = ['run', 'run-batch', 'run-kernel', 'call', 'gdf', 'df', 'stat', 'perf', 'kaili', 'portfolio']
+GENERIC = ['perf', 'kaili', 'portfolio']
+GDF_STRATEGIES = 8
+DF_STRATEGIES = 4
+PORTFOLIO_STRATEGIES = 500
+## min trades/sec per case from 10^6 trades on
+TARGETS = {'portfolio': PORTFOLIO_STRATEGIES * 10 ** 6 / 60}
+
+
+def strategy(name: str, n: int):
+    import simuT
+
+    if name == 'sim10':
+        return simuT.childSim1_0(10000, 0.002, n, 100, 5, 2, simuT.FLAG.LOSS, Seed=1)
+    if name == 'simv3':
+        return simuT.SimV3(10000, 0.002, n, 100, 2, Seed=1)
+    if name == 'simv4':
+        return simuT.SimV4(10000, 0.002, n, 100, Seed=1)
+    raise ValueError('unknown strategy {}'.format(name))
+
+
+def gameLength(name: str) -> float:
+    '''mean num of trades per game on a pilot chunk'''
+    from simulation.engine import OutcomeStream
+
+    sim = strategy(name, 1)
+    _, counts = sim.play(OutcomeStream(sim.seed, 2000), batch=sim.batchable)
+    return counts.mean()
+
+
+def countingExecutor(cores: int):
+    '''process pool that adds up the pickled size of every task sent and result received'''
+    from simulation.executor import Executor
+
+    class CountingExecutor(Executor):
+        pickled = 0
+
+        def imap(self, fn, tasks, progress=None, chunksize=None):
+            for args in tasks:
+                self.pickled += len(pickle.dumps((fn, args), pickle.HIGHEST_PROTOCOL))
+            for ret in super().imap(fn, tasks, progress, chunksize):
+                self.pickled += len(pickle.dumps(ret, pickle.HIGHEST_PROTOCOL))
+                yield ret
+
+    return CountingExecutor(cores)
+
+
+def setup(case: str, name: str, trades: int, cores: int):
+    '''
+    return: fn timed without args, num of trades it plays, executor or None
+    '''
+    import numpy as np
+
+    if case in ('run', 'run-batch', 'run-kernel', 'stat'):
+        sim = strategy(name, max(1, int(trades / gameLength(name))))
+        batch, kernel = case == 'run-batch', case == 'run-kernel'
+        sim.run(batch=batch or case == 'stat', kernel=kernel)
+        ## whole games are played, count the trades
+        played = len(sim._balances) - 1
+        if case == 'stat':
+            return sim.getStat, played, None
+        return lambda: sim.run(batch=batch, kernel=kernel), played, None
+    if case == 'call':
+        sim = strategy(name, 1)
+        return lambda: sim(trades + 1), trades, None
+    if case == 'gdf':
+        sim = strategy(name, 1)
+        executor = countingExecutor(cores)
+        rows = max(2, trades // GDF_STRATEGIES)
+        return lambda: sim.generateGDF(GDF_STRATEGIES, rows, executor=executor), rows * GDF_STRATEGIES, executor
+    if case == 'df':
+        n = max(1, trades // DF_STRATEGIES)
+        sim = strategy(name, n)
+        return lambda: sim.generateDF(DF_STRATEGIES, {}), n * DF_STRATEGIES, None
+    if case == 'perf':
+        from simulation.utils import calcPerformance
+
+        balances = 10000 + np.cumsum(np.random.default_rng(1).normal(0, 20, trades))
+        return lambda: calcPerformance(balances), trades, None
+    if case == 'kaili':
+        from kaili import KaliSimu
+        from simulation.ragged import Ragged
+        from simulation.rng import generator
+
+        k = KaliSimu(simu_count=trades, seed=1)
+        rng = generator(1)
+
+        def game():
+            out = Ragged()
+            out.start()
+            k.game(rng, out)
+        return game, trades, None
+    if case == 'portfolio':
+        sim = strategy('simv4', 1)
+        rows = max(2, trades // PORTFOLIO_STRATEGIES)
+        return lambda: sim.generatePortfolio(PORTFOLIO_STRATEGIES, rows, corr=0.3), rows * PORTFOLIO_STRATEGIES, None
+    raise ValueError('unknown case {}'.format(case))
+
+
+def measure(case: str, name: str, trades: int, cores: int, repeat: int) -> dict:
+    '''child side: time one case after a warm up call, the peak RSS includes it'''
+    import logging
+    import resource
+
+    ## the performance reports are logged as warnings
+    logging.disable(logging.WARNING)
+    fn, played, executor = setup(case, name, trades, cores)
+    fn()
+    if executor is not None:
+        ## the warm up call starts the pool and ships the strategy, count the steady state
+        executor.pickled = 0
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    pickled = 0
+    if executor is not None:
+        pickled = executor.pickled // repeat
+        executor.close()
+    ## KiB on linux, bytes on macOS
+    scale = 1 << 20 if sys.platform == 'darwin' else 1 << 10
+    return {'case': case, 'strategy': name, 'trades': played, 'cores': cores, 'seconds': best,
+            'trades_per_sec': played / best if best > 0 else float('inf'),
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            'worker_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+            'pickled_bytes': pickled}
+
+
+def probe(case: str, name: str, trades: int, cores: int, repeat: int) -> dict:
+    '''run one case in a fresh interpreter, its result is the last line of stdout'''
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get('PYTHONPATH', '')]), MPLBACKEND='Agg')
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', case, name, str(trades), str(cores), str(repeat)]
+    out = subprocess.run(cmd, cwd=ROOT, env=env, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def key(r: dict) -> str:
+    return '{case}/{strategy}/{scale}/{cores}'.format(**r)
+
+
+def short(results: list) -> list:
+    '''messages of the cases below their target throughput'''
+    ret = []
+    for r in results:
+        target = TARGETS.get(r['case'])
+        if target and r['scale'] >= 10 ** 6 and r['trades_per_sec'] < target:
+            ret.append('{} plays {:.0f} trades/s, the target is {:.0f}'.format(key(r), r['trades_per_sec'], target))
+    return ret
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    '''messages of the cases worse than the baseline by more than tolerance'''
+    base = {key(r): r for r in baseline['results']}
+    ret = []
+    for r in results:
+        b = base.get(key(r))
+        if b is None:
+            continue
+        speed = r['trades_per_sec'] / b['trades_per_sec']
+        print('{:<28} {:>12.0f} trades/s  x{:.2f} of baseline'.format(key(r), r['trades_per_sec'], speed))
+        if speed < 1 - tolerance:
+            ret.append('{} is {:.0%} slower'.format(key(r), 1 - speed))
+        for field in ('peak_rss_mb', 'pickled_bytes'):
+            if b[field] and r[field] > b[field] * (1 + tolerance):
+                ret.append('{} {} grew from {:.0f} to {:.0f}'.format(key(r), field, b[field], r[field]))
+    return ret
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', default=CASES, choices=CASES)
+    parser.add_argument('--strategies', nargs='+', default=STRATEGIES, choices=STRATEGIES)
+    parser.add_argument('--min-trades', type=float, default=1e3)
+    parser.add_argument('--max-trades', type=float, default=1e6, help='scales are the powers of 10 in between')
+    parser.add_argument('--cores', type=int, nargs='+', default=[1, os.cpu_count() or 1], help='cores of gdf')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', default='bench.json', help='machine readable results')
+    parser.add_argument('--baseline', default=None, help='results file to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results to ' + BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--child', nargs=5, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        case, name, trades, cores, repeat = args.child
+        print(json.dumps(measure(case, name, int(trades), int(cores), int(repeat))))
+        return 0
+
+    import numpy as np
+
+    scales = [int(10 ** e) for e in range(int(np.log10(args.min_trades)), int(np.log10(args.max_trades)) + 1)]
+    results = []
+    for case in args.cases:
+        for name in (['-'] if case in GENERIC else args.strategies):
+            for scale in scales:
+                for cores in (sorted(set(args.cores)) if case == 'gdf' else [1]):
+                    r = probe(case, name, scale, cores, args.repeat)
+                    r['scale'] = scale
+                    print('{:<28} {:>12.0f} trades/s {:>8.1f} MB {:>10} pickled'.format(
+                        key(r), r['trades_per_sec'], max(r['peak_rss_mb'], r['worker_rss_mb']), r['pickled_bytes']))
+                    results.append(r)
+
+    report = {'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                       'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+              'results': results}
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(BASELINE, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    problems = short(results)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            problems += compare(results, json.load(f), args.tolerance)
+    for p in problems:
+        print(p)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
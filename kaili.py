@@ -2,10 +2,12 @@
 import logging
 import numpy as np
 import pandas as pd
-from typing import List
-from matplotlib import pyplot as plt
 
-from simulation import MCSimulation, utils
+from simulation import MCSimulation, setupLogging, utils
+from simulation.compound import compoundBalance
+from simulation.plot import figure, output, series
+from simulation.ragged import Ragged
+from simulation.rng import child, spawn
 
 class KaliSimu(MCSimulation):
 
@@ -15,46 +17,169 @@ class KaliSimu(MCSimulation):
                 winning_rate: float = 0.52,
                 profit_rtn: float = 1.5,
                 loss_rtn: float = -1.0,
+                seed: int = None,
                 ) -> None:
-        super().__init__(init_balance, 0.0, simu_count, 100)
+        super().__init__(init_balance, 0.0, simu_count, 100, seed)
         self.__p = winning_rate
         self.__profit_rtn = profit_rtn
         self.__loss_rtn = loss_rtn
         self._balance = init_balance
         self._total_cnt = simu_count
+        ##  win / loss return of a trade as simulated, shared by the kelly analysis
+        self.__win, self.__loss = (float(x) for x in self.outcome(np.array([0.0, 1.0])))
         self.__best_pos = self.__p + self.__loss_rtn * (1 - self.__p) / (self.__profit_rtn)
+        ##  kelly fraction of those returns, no stake with a negative edge
+        self.__kelly_pos = max(self.__p / -self.__loss - (1 - self.__p) / self.__win, 0.0)
 
-    def simu(self) -> float:
+    def simu(self, rng) -> float:
         '''
         random generate pnl
         '''
+        return self.outcome(rng.random())
+
+    def outcome(self, u: np.ndarray) -> np.ndarray:
         pr = self.__profit_rtn
         lr = self.__loss_rtn
-        return (lr + (pr - lr) * np.random.binomial(1, self.__p)) * 0.01
-    
-    def game(self) -> List[float]:
-        
+        return (lr + (pr - lr) * (u < self.__p)) * 0.01
+
+    def game(self, rng, out: Ragged) -> None:
+        '''
+        pnl of simu_count trades staking best_pos into the last row of out, see path
+        '''
+        out.extend(np.diff(self.path(rng)))
+
+    def path(self, rng) -> np.ndarray:
+        '''
+        balance path of simu_count trades staking best_pos,
+        of the init balance or of the current balance when compound is set
+        '''
         pos = self.__best_pos
         balance = self._balance
-        pnl = [balance]
-        for _ in range(self._total_cnt):
-            pnl.append(balance * self.simu() * pos)
-        ret = np.cumsum(pnl)
+        r = self.outcome(rng.random(self._total_cnt))
+        if self.compound:
+            ret = np.insert(compoundBalance(pos * r, balance, self.ruin * balance), 0, balance)
+        else:
+            ret = np.cumsum(np.insert(balance * r * pos, 0, balance))
         logging.info('return trade')
         return ret
 
     def set_best_pos(self, pos: float) -> None:
         self.__best_pos = pos
 
-    def run(self, cnt: int=5) -> None:
+    @property
+    def best_pos(self) -> float:
+        return self.__best_pos
+
+    @property
+    def kelly_pos(self) -> float:
+        '''kelly fraction of the outcome() returns, the stake maximizing growth, 0 without an edge'''
+        return self.__kelly_pos
+
+    @property
+    def feasible(self) -> float:
+        '''fractions below it survive a loss'''
+        return -1.0 / self.__loss
+
+    def growth(self, pos: float) -> float:
+        '''
+        expected log growth per trade when pos of the balance is staked,
+        with the win / loss returns of outcome(), profit_rtn and loss_rtn percent of the stake
+        '''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.__p * np.log1p(pos * self.__win) + (1 - self.__p) * np.log1p(pos * self.__loss)
+
+    def outcomes(self, paths: int, trades: int, seed: int = None) -> np.ndarray:
+        '''
+        win / loss matrix (paths, trades) drawn in one call,
+        shared by every position fraction (common random numbers)
+        '''
+        rng = self.generator(child(self.seed, 1) if seed is None else seed)
+        return rng.random((paths, trades)) < self.__p
+
+    def __logGrowth(self, wins: np.ndarray, trades: int, pos: float) -> np.ndarray:
+        '''log balance after trades with wins wins, for every path'''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = np.log1p(pos * self.__win)
+            b = np.log1p(pos * self.__loss) if pos * self.__loss > -1 else -np.inf
+        return wins * a + (trades - wins) * b
+
+    def optimize(self, win: np.ndarray, bounds: tuple = None, tol: float = 1e-6) -> float:
+        '''
+        empirically optimal fraction on the outcome matrix, golden section search within bounds,
+        the mean log growth is concave in the fraction so the search is exact up to tol
+        '''
+        trades = win.shape[1]
+        wins = np.sum(win, axis=1)
+        lo, hi = bounds if bounds else (0.0, self.feasible * (1 - 1e-9))
+        g = lambda pos: np.mean(self.__logGrowth(wins, trades, pos))
+        r = (np.sqrt(5) - 1) / 2
+        x1, x2 = hi - r * (hi - lo), lo + r * (hi - lo)
+        g1, g2 = g(x1), g(x2)
+        while hi - lo > tol:
+            if g1 < g2:
+                lo, x1, g1 = x1, x2, g2
+                x2 = lo + r * (hi - lo)
+                g2 = g(x2)
+            else:
+                hi, x2, g2 = x2, x1, g1
+                x1 = hi - r * (hi - lo)
+                g1 = g(x1)
+        return (lo + hi) / 2
+
+    def kelly(self, fractions: np.ndarray = None, paths: int = 100, trades: int = None, ruin: float = 0.5,
+              seed: int = None) -> pd.DataFrame:
+        '''
+        compare position fractions on one shared outcome matrix, the balance compounds
+        fractions: default 0.25x to 2x kelly_pos, eighths of the feasible fractions [0, feasible)
+                   without an edge
+        paths: num of simulated paths
+        trades: num of trades per path, default simu_count
+        ruin: a path is ruined once its balance falls to ruin times the init balance
+        return: per fraction the expected log growth per trade (empirical and theory),
+                mean / 95% max drawdown and ruin probability, plus the empirical optimum
+        '''
+        trades = trades or self._total_cnt
+        win = self.outcomes(paths, trades, seed)
+        best = self.optimize(win)
+        if fractions is None:
+            top = min(2 * self.__kelly_pos, self.feasible) if self.__kelly_pos > 0 else self.feasible
+            fractions = top * np.arange(1, 9) / 8
+            fractions = fractions[fractions < self.feasible]
+        fractions = np.append(np.asarray(fractions, dtype=float), best)
+
+        wins = np.cumsum(win, axis=1)
+        n = np.arange(1, trades + 1)
+        rows = []
+        for pos in fractions:
+            logeq = self.__logGrowth(wins, n, pos)
+            peak = np.maximum.accumulate(np.maximum(logeq, 0), axis=1)
+            with np.errstate(invalid='ignore'):
+                mdd = np.max(1 - np.exp(logeq - peak), axis=1)
+            rows.append({'fraction': pos, 'growth': np.mean(logeq[:, -1]) / trades, 'theory': self.growth(pos),
+                         'mdd': np.mean(mdd), 'mdd95': np.quantile(mdd, 0.95),
+                         'ruin': np.mean(np.min(logeq, axis=1) <= np.log(ruin))})
+        ret = pd.DataFrame(rows)
+        ret['optimal'] = np.arange(len(ret)) == len(ret) - 1
+        logging.info('kelly pos: {:.4f}, empirical optimum: {:.4f}'.format(self.__kelly_pos, best))
+        return ret
+
+    def run(self, cnt: int=5, plot: str = None) -> None:
+        '''
+        cnt balance paths of simu_count trades
+        plot: image file of the paths, SHOW for the window, None for no plot
+        '''
 
-        ret = [self.game() for _ in range(cnt)]
-        dat = pd.DataFrame(ret).T
+        simulate = lambda: {'balances': np.column_stack([self.path(self.generator(ss)) for ss in spawn(child(self.seed, 0), cnt)])}
+        ret, _ = self.cached('run', {'cnt': cnt, 'compound': self.compound, 'ruin': self.ruin}, simulate)
+        dat = pd.DataFrame(ret['balances'])
         dat.columns = ['simu_{}'.format(i) for i in range(cnt)]
         utils.calcPerformance(dat.mean(axis=1))
-        dat.plot(grid='on')
-        plt.legend(ncol=5)
-        plt.show()
+        if plot is not None:
+            fig, ax = figure(plot, 1, 1)
+            series(ax, dat.values, labels=list(dat.columns))
+            ax.legend(ncol=5)
+            output(fig, plot)
+        ##  position fractions around best pos, see kelly()
         # pos_range = (self.__best_pos + delta * n for n in range(-cnt, cnt+1))
         # pos_range = [x for x in pos_range if x > 0]
         # ret = []
@@ -69,6 +194,8 @@ class KaliSimu(MCSimulation):
         # plt.show()
 
 if __name__ == '__main__':
+    setupLogging()
     k = KaliSimu(simu_count=50000, winning_rate=0.52)
-    k.run(20)
+    k.run(20, plot='kaili.png')
+    # print(k.kelly(paths=200))
 
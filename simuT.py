@@ -1,20 +1,21 @@
 # coding=utf-8
-import logging
 import numpy as np
 from enum import Enum
-from typing import List
 
-from simulation import MCSimulation
+from simulation import MCSimulation, setupLogging
+from simulation.kernel import njit, playKernel
+from simulation.ragged import Ragged
+from simulation.spec import Spec, SpecGame
 
 
 WRatio = 1                      ## 百分比 止盈率
 LRatio = -1                     ## 百分比 止损率
 WLRatio = 0.5                  ## 胜率
 
-def simu() -> float:
-    return (LRatio + (WRatio - LRatio) * np.random.binomial(1, WLRatio)) * 0.01
-    # return (LRatio + (WRatio - LRatio) * np.random.binomial(1, WLRatio)) * 0.01
-    # return np.random.uniform(-1, 1) * 0.01
+def outcome(u, wratio: float = WRatio, lratio: float = LRatio, p: float = WLRatio):
+    '''map uniform draws to pnl rate, works on floats and arrays'''
+    return (lratio + (wratio - lratio) * (u < p)) * 0.01
+    # return (2 * u - 1) * 0.01
 
 
 class FLAG(Enum):
@@ -22,7 +23,181 @@ class FLAG(Enum):
     PROFIT = 1
 
 
-class childSim1_0(MCSimulation):
+##  compiled game kernels, same loops as the game() methods over a pre-drawn uniform buffer
+##  u: (games, block) uniforms, pnl[i, :n[i]] trades of game i, n[i] = -1 when it needs more than block draws
+##  the pnl rate is the outcome() formula inlined
+
+@njit(cache=True)
+def _exitKernel(u, balance, pos0, wratio, lratio, p, A, X, profit, pnl, n):
+    block = u.shape[1]
+    for i in range(u.shape[0]):
+        pos = pos0
+        a = balance * pos * (lratio + (wratio - lratio) * (u[i, 0] < p)) * 0.01
+        pnl[i, 0] = a
+        t = 1
+        count = 0
+        while (profit and a > 0) or (not profit and a < 0):
+            count += 1
+            pos *= X
+            if count > A:
+                break
+            if t == block:
+                t = -1
+                break
+            a = balance * pos * (lratio + (wratio - lratio) * (u[i, t] < p)) * 0.01
+            pnl[i, t] = a
+            t += 1
+        n[i] = t
+
+
+@njit(cache=True)
+def _streakKernel(u, balance, pos0, wratio, lratio, p, A, B, X, profit, reset, pnl, n):
+    block = u.shape[1]
+    for i in range(u.shape[0]):
+        pos = pos0
+        a = balance * pos * (lratio + (wratio - lratio) * (u[i, 0] < p)) * 0.01
+        pnl[i, 0] = a
+        t = 1
+        count = 0
+        while B < 0 or t < B:
+            if (profit and a > 0) or (not profit and a < 0):
+                count += 1
+                pos *= X
+            else:
+                count = 0
+                if reset:
+                    pos = pos0
+            if count > A:
+                break
+            if t == block:
+                t = -1
+                break
+            a = balance * pos * (lratio + (wratio - lratio) * (u[i, t] < p)) * 0.01
+            pnl[i, t] = a
+            t += 1
+        n[i] = t
+
+
+@njit(cache=True)
+def _recoverKernel(u, balance, pos0, wratio, lratio, p, X, pnl, n):
+    block = u.shape[1]
+    for i in range(u.shape[0]):
+        a = balance * pos0 * (lratio + (wratio - lratio) * (u[i, 0] < p)) * 0.01
+        total = balance + a
+        pnl[i, 0] = a
+        t = 1
+        if not a > 0:
+            pos = pos0 * X
+            while True:
+                if t == block:
+                    t = -1
+                    break
+                a = balance * pos * (lratio + (wratio - lratio) * (u[i, t] < p)) * 0.01
+                total += a
+                pnl[i, t] = a
+                t += 1
+                if a < 0:
+                    pos *= X
+                elif total > balance:
+                    break
+        n[i] = t
+
+
+@njit(cache=True)
+def _multiKernel(u, balance, pos0, wratio, lratio, p, factors, default, pnl, n):
+    block = u.shape[1]
+    for i in range(u.shape[0]):
+        pos = pos0
+        a = balance * pos * (lratio + (wratio - lratio) * (u[i, 0] < p)) * 0.01
+        pnl[i, 0] = a
+        t = 1
+        cnt = 0
+        while a < 0:
+            cnt += 1
+            pos *= factors[cnt] if cnt < len(factors) else default
+            if t == block:
+                t = -1
+                break
+            a = balance * pos * (lratio + (wratio - lratio) * (u[i, t] < p)) * 0.01
+            pnl[i, t] = a
+            t += 1
+        n[i] = t
+
+
+class BinarySim(MCSimulation):
+    '''
+    两点分布收益: 以 WLRatio 概率盈利 WRatio%, 否则亏损 LRatio%
+    参数随实例传入, 不读取模块全局变量
+    设置 source (Bootstrap) 时改为从历史交易收益中重抽样, 加仓逻辑不变
+
+    WRatio: 百分比 止盈率
+    LRatio: 百分比 止损率
+    WLRatio: 胜率
+    '''
+    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, Seed: int = None,
+                 WRatio: float = WRatio, LRatio: float = LRatio, WLRatio: float = WLRatio) -> None:
+        super().__init__(InitBalance, InitPos, N, K, Seed)
+        self.__WRatio = WRatio
+        self.__LRatio = LRatio
+        self.__WLRatio = WLRatio
+
+    @property
+    def wRatio(self) -> float:
+        return self.__WRatio
+
+    @property
+    def lRatio(self) -> float:
+        return self.__LRatio
+
+    @property
+    def wlRatio(self) -> float:
+        return self.__WLRatio
+
+    @property
+    def rates(self) -> tuple:
+        '''(WRatio, LRatio, WLRatio) as floats for the kernels'''
+        return float(self.__WRatio), float(self.__LRatio), float(self.__WLRatio)
+
+    @property
+    def bootstrappable(self) -> bool:
+        return True
+
+    def simu(self, rng) -> float:
+        return self.outcome(rng.random())
+
+    def outcome(self, u: np.ndarray) -> np.ndarray:
+        if self.source is not None:
+            return self.source.outcome(u)
+        return outcome(u, self.__WRatio, self.__LRatio, self.__WLRatio)
+
+    def tilted(self, p: float) -> 'BinarySim':
+        '''same strategy and seed with winning ratio p, see importance.tailRisk'''
+        if self.source is not None:
+            raise ValueError('no winning ratio to tilt, the returns come from {}'.format(self.source))
+        return type(self)(**dict(self.params, WLRatio=p))
+
+    def outcomeMean(self) -> float:
+        if self.source is not None:
+            return self.source.mean
+        return (self.__WLRatio * self.__WRatio + (1 - self.__WLRatio) * self.__LRatio) * 0.01
+
+    def rate(self, pnl: np.ndarray) -> np.ndarray:
+        if self.source is not None:
+            raise ValueError('the return of a resampled trade is not recovered from its pnl')
+        return np.where(pnl > 0, self.__WRatio, self.__LRatio) * 0.01
+
+    def play(self, stream, batch: bool = False, kernel: bool = False):
+        if kernel and self.source is not None and not isinstance(self, SpecGame):
+            ## the kernels above inline the two point outcome, the spec kernel plays the same games over outcome()
+            return playKernel(self, stream, lambda u, pnl, n: SpecGame.kernel(self, u, pnl, n))
+        return super().play(stream, batch, kernel)
+
+
+def condition(Flag: FLAG) -> str:
+    return 'profit' if Flag == FLAG.PROFIT else 'loss'
+
+
+class childSim1_0(BinarySim):
     '''
     子类实现相关加仓算法
     盈利情况下，出现亏损或达到最大连续加仓次数退出
@@ -35,29 +210,24 @@ class childSim1_0(MCSimulation):
     A: 最大连续加仓次数
     X: 加仓倍数
     Flag: 盈利 (PROFIT) 亏损情况(LOSS)
+    Seed: 随机种子
+    WRatio/LRatio/WLRatio: 见 BinarySim
     '''
-    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, A: int, X: int, Flag: FLAG) -> None:
-        super().__init__(InitBalance, InitPos, N, K)
+    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, A: int, X: int, Flag: FLAG, Seed: int = None,
+                 WRatio: float = WRatio, LRatio: float = LRatio, WLRatio: float = WLRatio) -> None:
+        super().__init__(InitBalance, InitPos, N, K, Seed, WRatio, LRatio, WLRatio)
         self.__A = A
         self.__X = X
         self.__Flag = Flag
 
-    def simu(self) -> float:
-        '''
-        随机产生投资收益  暂时使用全局 simu 函数
-        '''
-        # return np.random.uniform(-1, 1) * 0.01
-        return (LRatio + (WRatio - LRatio) * np.random.binomial(1, WLRatio)) * 0.01
-        # return (-2 + 4 * np.random.binomial(1, 0.5)) * 0.01
-    
-    def game(self) -> List[float]:
-        a = self.balance * self.initPos * simu()
+    def game(self, rng, out: Ragged) -> None:
+        a = self.balance * self.initPos * self.simu(rng)
         count = 0
         balance = self.balance + a
         pos = self.initPos
-        logging.info('first trade')
-        logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
-        ret = [a]
+        if self.trace is not None:
+            self.trace.record(0, pos, a, balance)
+        out.append(a)
 
         if self.__Flag == FLAG.PROFIT:
             while(a > 0):
@@ -65,27 +235,45 @@ class childSim1_0(MCSimulation):
                 pos *= self.__X
                 if count > self.__A:
                     break
-                a = self.balance * pos * simu()
+                a = self.balance * pos * self.simu(rng)
                 balance += a
-                ret.append(a)
-                logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+                out.append(a)
+                if self.trace is not None:
+                    self.trace.record(out.count - 1, pos, a, balance)
         else:
             while(a < 0):
                 count += 1
                 pos *= self.__X    
                 if count > self.__A:
                     break
-                a = self.balance * pos * simu()
+                a = self.balance * pos * self.simu(rng)
                 balance += a
-                ret.append(a)
-                logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+                out.append(a)
+                if self.trace is not None:
+                    self.trace.record(out.count - 1, pos, a, balance)
         
-        logging.info('return total pnl: {:.2f}'.format(balance - self.balance))
         # return balance - self.balance
-        return ret
 
+    def batchInit(self, n: int) -> dict:
+        return {'pos': np.full(n, self.initPos, dtype=float), 'count': np.zeros(n, dtype=int)}
+
+    def batchStep(self, state: dict, a: np.ndarray, t: int) -> np.ndarray:
+        hit = a > 0 if self.__Flag == FLAG.PROFIT else a < 0
+        state['count'] += 1
+        state['pos'] *= self.__X
+        return hit & (state['count'] <= self.__A)
+
+    def kernel(self, u: np.ndarray, pnl: np.ndarray, n: np.ndarray) -> None:
+        _exitKernel(u, float(self.balance), float(self.initPos), *self.rates, self.__A, float(self.__X),
+                    self.__Flag == FLAG.PROFIT, pnl, n)
+
+    @property
+    def spec(self) -> Spec:
+        '''same games as a SpecSim'''
+        return Spec(condition(self.__Flag), self.__X, onMiss='exit', maxStreak=self.__A)
 
-class childSim1_1(MCSimulation):
+
+class childSim1_1(BinarySim):
 
     '''
     子类实现相关加仓算法
@@ -98,28 +286,33 @@ class childSim1_1(MCSimulation):
     A: 最大连续加仓次数
     X: 加仓倍数
     Flag: 盈利 (PROFIT) 亏损情况(LOSS)
+    Seed: 随机种子
+    WRatio/LRatio/WLRatio: 见 BinarySim
     '''
-    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, A: int, X: int, Flag: FLAG) -> None:
-        super().__init__(InitBalance, InitPos, N, K)
+    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, A: int, X: int, Flag: FLAG, Seed: int = None,
+                 WRatio: float = WRatio, LRatio: float = LRatio, WLRatio: float = WLRatio) -> None:
+        super().__init__(InitBalance, InitPos, N, K, Seed, WRatio, LRatio, WLRatio)
         self.__A = A
         self.__X = X
         self.__Flag = Flag
 
-    def simu(self) -> float:
+    def simu(self, rng) -> float:
         '''
-        暂时使用全局 simu 函数
+        generateDF 的随机收益: 胜率 55% 的 ±2%, 与 game() 的 WRatio/LRatio/WLRatio 不同
+        设置 source 时同样从历史交易收益中抽样
         '''
-        # return np.random.uniform(-1, 1) / 100
-        return (-2 + 4 * np.random.binomial(1, 0.55)) * 0.01
-    
-    def game(self) -> List[float]:
-        a = self.balance * self.initPos * simu()
+        if self.source is not None:
+            return super().simu(rng)
+        return outcome(rng.random(), 2, -2, 0.55)
+
+    def game(self, rng, out: Ragged) -> None:
+        a = self.balance * self.initPos * self.outcome(rng.random())
         count = 0
         balance = self.balance + a
         pos = self.initPos
-        ret = [a]
-        logging.info('first trade')
-        logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+        out.append(a)
+        if self.trace is not None:
+            self.trace.record(0, pos, a, balance)
 
         if self.__Flag == FLAG.PROFIT:
             while(True):
@@ -131,14 +324,14 @@ class childSim1_1(MCSimulation):
                     pos = self.initPos
                 
                 if count > self.__A:    ##  or balance < 0
-                    logging.info('return total pnl: {:.2f}'.format(balance - self.balance))
                     # return balance - self.balance
-                    return ret
+                    return
                 
-                a = self.balance * pos * simu()
+                a = self.balance * pos * self.outcome(rng.random())
                 balance += a
-                ret.append(a)
-                logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+                out.append(a)
+                if self.trace is not None:
+                    self.trace.record(out.count - 1, pos, a, balance)
         else:
             while(True):
                 if a < 0:
@@ -149,17 +342,26 @@ class childSim1_1(MCSimulation):
                     pos = self.initPos
                 
                 if count > self.__A:    ##  or balance < 0
-                    logging.info('return total pnl: {:.2f}'.format(balance - self.balance))
                     # return balance - self.balance
-                    return ret
+                    return
                 
-                a = self.balance * pos * simu()
+                a = self.balance * pos * self.outcome(rng.random())
                 balance += a
-                ret.append(a)
-                logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+                out.append(a)
+                if self.trace is not None:
+                    self.trace.record(out.count - 1, pos, a, balance)
+
+    def kernel(self, u: np.ndarray, pnl: np.ndarray, n: np.ndarray) -> None:
+        _streakKernel(u, float(self.balance), float(self.initPos), *self.rates, self.__A, -1, float(self.__X),
+                      self.__Flag == FLAG.PROFIT, True, pnl, n)
 
+    @property
+    def spec(self) -> Spec:
+        '''same games as a SpecSim'''
+        return Spec(condition(self.__Flag), self.__X, onMiss='reset', maxStreak=self.__A)
 
-class childSim1_2(MCSimulation):
+
+class childSim1_2(BinarySim):
 
     '''
     子类实现相关加仓算法
@@ -172,29 +374,24 @@ class childSim1_2(MCSimulation):
     A: 最大连续加仓次数
     X: 加仓倍数
     Flag: 盈利 (PROFIT) 亏损情况(LOSS)
+    Seed: 随机种子
+    WRatio/LRatio/WLRatio: 见 BinarySim
     '''
-    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, A: int, X: int, Flag: FLAG) -> None:
-        super().__init__(InitBalance, InitPos, N, K)
+    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, A: int, X: int, Flag: FLAG, Seed: int = None,
+                 WRatio: float = WRatio, LRatio: float = LRatio, WLRatio: float = WLRatio) -> None:
+        super().__init__(InitBalance, InitPos, N, K, Seed, WRatio, LRatio, WLRatio)
         self.__A = A
         self.__X = X
         self.__Flag = Flag
 
-    def simu(self) -> float:
-        '''
-        暂时使用全局 simu 函数
-        '''
-        return (LRatio + (WRatio - LRatio) * np.random.binomial(1, WLRatio)) * 0.01
-        # return np.random.uniform(-1, 1) / 100
-        # return (-2 + 4 * np.random.binomial(1, 0.55)) * 0.01
-    
-    def game(self) -> List[float]:
-        a = self.balance * self.initPos * simu()
+    def game(self, rng, out: Ragged) -> None:
+        a = self.balance * self.initPos * self.simu(rng)
         count = 0
         balance = self.balance + a
         pos = self.initPos
-        ret = [a]
-        logging.info('first trade')
-        logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+        out.append(a)
+        if self.trace is not None:
+            self.trace.record(0, pos, a, balance)
 
         if self.__Flag == FLAG.PROFIT:
             while(True):
@@ -206,14 +403,14 @@ class childSim1_2(MCSimulation):
                     # pos = self.initPos    ## 仓位不回归
                 
                 if count > self.__A:    ##  or balance < 0
-                    logging.info('return total pnl: {:.2f}'.format(balance - self.balance))
                     # return balance - self.balance
-                    return ret
+                    return
                 
-                a = self.balance * pos * simu()
+                a = self.balance * pos * self.simu(rng)
                 balance += a
-                ret.append(a)
-                logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+                out.append(a)
+                if self.trace is not None:
+                    self.trace.record(out.count - 1, pos, a, balance)
         else:
             while(True):
                 if a < 0:
@@ -224,17 +421,26 @@ class childSim1_2(MCSimulation):
                     # pos = self.initPos    ## 仓位不回归
                 
                 if count > self.__A:    ##  or balance < 0
-                    logging.info('return total pnl: {:.2f}'.format(balance - self.balance))
                     # return balance - self.balance
-                    return ret
+                    return
                 
-                a = self.balance * pos * simu()
+                a = self.balance * pos * self.simu(rng)
                 balance += a
-                ret.append(a)
-                logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+                out.append(a)
+                if self.trace is not None:
+                    self.trace.record(out.count - 1, pos, a, balance)
+
+    def kernel(self, u: np.ndarray, pnl: np.ndarray, n: np.ndarray) -> None:
+        _streakKernel(u, float(self.balance), float(self.initPos), *self.rates, self.__A, -1, float(self.__X),
+                      self.__Flag == FLAG.PROFIT, False, pnl, n)
 
+    @property
+    def spec(self) -> Spec:
+        '''same games as a SpecSim'''
+        return Spec(condition(self.__Flag), self.__X, onMiss='resetStreak', maxStreak=self.__A)
 
-class childSim2(MCSimulation):
+
+class childSim2(BinarySim):
 
     '''
     子类实现相关加仓算法
@@ -248,29 +454,25 @@ class childSim2(MCSimulation):
     B: 最大开仓次数
     X: 加仓倍数
     Flag: 盈利 (PROFIT) 亏损情况(LOSS)
+    Seed: 随机种子
+    WRatio/LRatio/WLRatio: 见 BinarySim
     '''
-    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, A: int, B: int, X: int, Flag: FLAG) -> None:
-        super().__init__(InitBalance, InitPos, N, K)
+    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, A: int, B: int, X: int, Flag: FLAG, Seed: int = None,
+                 WRatio: float = WRatio, LRatio: float = LRatio, WLRatio: float = WLRatio) -> None:
+        super().__init__(InitBalance, InitPos, N, K, Seed, WRatio, LRatio, WLRatio)
         self.__A = A
         self.__B = B
         self.__X = X
         self.__Flag = Flag
 
-    def simu(self) -> float:
-        '''
-        暂时使用全局 simu 函数
-        '''
-        return (LRatio + (WRatio - LRatio) * np.random.binomial(1, WLRatio)) * 0.01
-        # return np.random.uniform(-1, 1) / 100
-    
-    def game(self) -> List[float]:
-        a = self.balance * self.initPos * simu()
+    def game(self, rng, out: Ragged) -> None:
+        a = self.balance * self.initPos * self.simu(rng)
         count = 0
         balance = self.balance + a
         pos = self.initPos
-        ret = [a]
-        logging.info('first trade')
-        logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+        out.append(a)
+        if self.trace is not None:
+            self.trace.record(0, pos, a, balance)
 
         if self.__Flag == FLAG.PROFIT:
             for _ in range(1, self.__B):
@@ -284,10 +486,11 @@ class childSim2(MCSimulation):
                 if count > self.__A:
                     break
                 
-                a = self.balance * pos * simu()
+                a = self.balance * pos * self.simu(rng)
                 balance += a
-                ret.append(a)
-                logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+                out.append(a)
+                if self.trace is not None:
+                    self.trace.record(out.count - 1, pos, a, balance)
         else:
             for _ in range(1, self.__B):
                 if a < 0:
@@ -300,92 +503,162 @@ class childSim2(MCSimulation):
                 if count > self.__A:
                     break
                 
-                a = self.balance * pos * simu()
+                a = self.balance * pos * self.simu(rng)
                 balance += a
-                ret.append(a)
-                logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+                out.append(a)
+                if self.trace is not None:
+                    self.trace.record(out.count - 1, pos, a, balance)
         
-        logging.info('return total pnl: {:.2f}'.format(balance - self.balance))
         # return balance - self.balance
-        return ret
 
+    def batchInit(self, n: int) -> dict:
+        return {'pos': np.full(n, self.initPos, dtype=float), 'count': np.zeros(n, dtype=int)}
+
+    def batchStep(self, state: dict, a: np.ndarray, t: int) -> np.ndarray:
+        hit = a > 0 if self.__Flag == FLAG.PROFIT else a < 0
+        state['count'] = np.where(hit, state['count'] + 1, 0)
+        state['pos'] = np.where(hit, state['pos'] * self.__X, self.initPos)
+        return (state['count'] <= self.__A) & (t + 1 < self.__B)
 
-class SimV3(MCSimulation):
-    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, X: int) -> None:
-        super().__init__(InitBalance, InitPos, N, K)
+    def kernel(self, u: np.ndarray, pnl: np.ndarray, n: np.ndarray) -> None:
+        _streakKernel(u, float(self.balance), float(self.initPos), *self.rates, self.__A, self.__B, float(self.__X),
+                      self.__Flag == FLAG.PROFIT, True, pnl, n)
+
+    @property
+    def spec(self) -> Spec:
+        '''same games as a SpecSim'''
+        return Spec(condition(self.__Flag), self.__X, onMiss='reset', maxStreak=self.__A, maxTrades=max(self.__B, 1))
+
+
+class SimV3(BinarySim):
+    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, X: int, Seed: int = None,
+                 WRatio: float = WRatio, LRatio: float = LRatio, WLRatio: float = WLRatio) -> None:
+        super().__init__(InitBalance, InitPos, N, K, Seed, WRatio, LRatio, WLRatio)
         self.__X = X
     
-    def simu(self) -> float:
-        return (LRatio + (WRatio - LRatio) * np.random.binomial(1, WLRatio)) * 0.01
-    
-    def game(self) -> List[float]:
-        a = self.balance * self.initPos * simu()
+    def game(self, rng, out: Ragged) -> None:
+        a = self.balance * self.initPos * self.simu(rng)
         balance = self.balance + a
         pos = self.initPos
-        ret = [a]
-        logging.info('first trade')
-        logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+        out.append(a)
+        if self.trace is not None:
+            self.trace.record(0, pos, a, balance)
 
         if a > 0:
-            logging.info('return total pnl: {:.2f}'.format(balance - self.balance))
-            return ret
+            return
         
         pos = self.initPos * self.__X
         while (True):
 
-            a = self.balance * pos * simu()
+            a = self.balance * pos * self.simu(rng)
             balance += a
-            ret.append(a)
-            logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+            out.append(a)
+            if self.trace is not None:
+                self.trace.record(out.count - 1, pos, a, balance)
 
             if a < 0:
                 pos *= self.__X
             elif balance > self.balance:
-                logging.info('return total pnl: {:.2f}'.format(balance - self.balance))
-                return ret
+                return
+
+    def batchInit(self, n: int) -> dict:
+        return {'pos': np.full(n, self.initPos, dtype=float), 'balance': np.full(n, self.balance, dtype=float)}
+
+    def batchStep(self, state: dict, a: np.ndarray, t: int) -> np.ndarray:
+        state['balance'] += a
+        if not t:
+            state['pos'] *= self.__X
+            return ~(a > 0)
+        state['pos'] = np.where(a < 0, state['pos'] * self.__X, state['pos'])
+        return (a < 0) | ~(state['balance'] > self.balance)
+
+    def kernel(self, u: np.ndarray, pnl: np.ndarray, n: np.ndarray) -> None:
+        _recoverKernel(u, float(self.balance), float(self.initPos), *self.rates, float(self.__X), pnl, n)
 
+    @property
+    def spec(self) -> Spec:
+        '''same games as a SpecSim, unless a trade has pnl 0 (WRatio or LRatio 0)'''
+        return Spec('loss', self.__X, onMiss='hold', recover=True)
 
-class SimV4(MCSimulation):
+
+class SimV4(BinarySim):
 
     multi = {1: 0.1, 2: 0.1, 3: 10}
 
-    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int) -> None:
-        super().__init__(InitBalance, InitPos, N, K)
-    
-    def simu(self) -> float:
-        return (LRatio + (WRatio - LRatio) * np.random.binomial(1, WLRatio)) * 0.01
+    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, Seed: int = None,
+                 WRatio: float = WRatio, LRatio: float = LRatio, WLRatio: float = WLRatio) -> None:
+        super().__init__(InitBalance, InitPos, N, K, Seed, WRatio, LRatio, WLRatio)
     
-    def game(self) -> List[float]:
-        a = self.balance * self.initPos * simu()
+    def game(self, rng, out: Ragged) -> None:
+        a = self.balance * self.initPos * self.simu(rng)
         balance = self.balance + a
         pos = self.initPos
-        ret = [a]
-        logging.info('first trade')
-        logging.info('pos: {:.1%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
+        out.append(a)
+        if self.trace is not None:
+            self.trace.record(0, pos, a, balance)
         
         cnt = 0
         while (a < 0):
             cnt += 1
             pos *= (SimV4.multi.get(cnt, 2) + 1)
-            a = self.balance * pos * simu()
+            a = self.balance * pos * self.simu(rng)
             balance += a
-            ret.append(a)
-            logging.info('pos: {:.2%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
-    
-        logging.info('return total pnl: {:.2f}'.format(balance - self.balance))
-        return ret
+            out.append(a)
+            if self.trace is not None:
+                self.trace.record(out.count - 1, pos, a, balance)
+
+    def batchInit(self, n: int) -> dict:
+        return {'pos': np.full(n, self.initPos, dtype=float), 'cnt': np.zeros(n, dtype=int)}
+
+    def batchStep(self, state: dict, a: np.ndarray, t: int) -> np.ndarray:
+        state['cnt'] += 1
+        factor = np.full(len(a), 3.0)
+        for k, v in SimV4.multi.items():
+            factor[state['cnt'] == k] = v + 1
+        state['pos'] *= factor
+        return a < 0
+
+    def kernel(self, u: np.ndarray, pnl: np.ndarray, n: np.ndarray) -> None:
+        factors = np.array([SimV4.multi.get(c, 2) + 1 for c in range(max(SimV4.multi) + 1)], dtype=float)
+        _multiKernel(u, float(self.balance), float(self.initPos), *self.rates, factors, 2 + 1.0, pnl, n)
+
+    @property
+    def spec(self) -> Spec:
+        '''same games as a SpecSim'''
+        return Spec('loss', 2 + 1, table={k: v + 1 for k, v in SimV4.multi.items()}, onMiss='exit')
+
+
+class SpecSim(SpecGame, BinarySim):
+    '''
+    声明式加仓策略, 由 Spec 描述 (见 simulation.spec), 无需手写 game() 循环
+    python / batch / kernel 三种模式结果一致
+
+    Strategy: Spec, 例如 SimV3(...).spec 或
+              Spec('loss', 2, onMiss='reset', maxStreak=5, maxTrades=20)
+    其余参数见 BinarySim
+    '''
+    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, Strategy: Spec, Seed: int = None,
+                 WRatio: float = WRatio, LRatio: float = LRatio, WLRatio: float = WLRatio) -> None:
+        super().__init__(InitBalance, InitPos, N, K, Seed, WRatio, LRatio, WLRatio)
+        self.spec = Strategy
 
 
 if __name__ == '__main__':
 
+    setupLogging()
+
     c  = childSim1_0(10000, 0.002, 10000, 100, 30, 2, FLAG.LOSS)
     # c  = childSim1_1(10000, 0.002, 1000, 100, 3, 2, FLAG.PROFIT)
     # c  = childSim1_2(10000, 0.002, 1000, 100, 2, 2, FLAG.PROFIT)
     # c  = childSim2(10000, 0.002, 10000, 100, 10, 20, 2, FLAG.LOSS)
     # c  = SimV3(10000, 0.002, 1000, 100, 2)
     # c  = SimV4(10000, 0.002, 10000, 100)
-    # c.getStat()
+    # c.getStat(plot='stat.png')
     kws = {'max_contious_buy_cnt': 2, 'winning_rate': WLRatio, 'WRatio': WRatio, 'LRatio': -LRatio, 
             'multiple': 2, 'flag': FLAG.PROFIT, 'total_strategy_num': 20}
     # c.generateDF(20, kws)
-    c.generateGDF(20, 10000, 2, kws)
\ No newline at end of file
+    c.generateGDF(20, 10000, 2, kws, plot='gdf.png')
+
+    # from simulation.sweep import grid, sweep
+    # cells = grid(InitBalance=10000, InitPos=[0.001, 0.002], N=10000, K=100, X=[2, 3], WLRatio=[0.5, 0.55])
+    # print(sweep(SimV3, cells, replicates=4, seed=0))
\ No newline at end of file
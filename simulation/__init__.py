@@ -7,10 +7,19 @@ from simulation.utils import *
 
 '''Config for global logger
 LOG_FORMAT: format for the logger
-FILE_NAME: file name for the logger output
 
-filter the log level below INFO level 
+importing the package has no side effect, call setupLogging to write the log file
 '''
 LOG_FORMAT = '%(asctime)s [%(levelname)s] [%(filename)s:%(lineno)d] [%(funcName)s] %(message)s'
-FILE_NAME = '{}.log'.format(datetime.now().strftime('%m%d.%H%M%S.%f'))
-logging.basicConfig(filename=FILE_NAME, level=logging.WARNING, format=LOG_FORMAT)
\ No newline at end of file
+
+
+def setupLogging(filename: str = None, level: int = logging.WARNING) -> str:
+    '''configure the root logger, filter the log level below level
+
+    filename: file name for the logger output, default a new timestamped .log file
+    return: file name of the log
+    '''
+    if filename is None:
+        filename = '{}.log'.format(datetime.now().strftime('%m%d.%H%M%S.%f'))
+    logging.basicConfig(filename=filename, level=level, format=LOG_FORMAT)
+    return filename
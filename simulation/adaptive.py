@@ -0,0 +1,298 @@
+# coding=utf-8
+import logging
+import re
+import time
+from statistics import NormalDist
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from simulation.engine import OutcomeStream
+from simulation.executor import Executor, getExecutor
+from simulation.rng import child, seedSequence
+from simulation.utils import performanceKernel
+
+'''Adaptive Monte Carlo with confidence interval targets
+
+instead of a fixed N the games are played one chunk (batch) at a time and the
+running estimates are checked after every batch. Simulation stops as soon as
+the confidence interval half width of every targeted metric is below its
+target, or when the budget of games / seconds is spent.
+
+Game metrics are means of iid games. Path metrics use batch means: every batch
+of `chunk` games is one balance path from the init balance, its per-trade
+pnl, return and max drawdown are one sample. Quantiles (mdd95, rtn05, ...) get
+a distribution free interval from the order statistics, which only exists once
+there are QuantileEstimate.minSamples samples: 110 batches for mdd95 at
+the 0.95 level, so minBatches / minCurves are raised to that and a budget too
+small for it is warned about.
+
+Batch c plays the same games as the chunk c of run() with the same seed, so
+an adaptive run is a prefix of the fixed one.
+'''
+
+QUANTILE = re.compile(r'^(\w+?)(\d\d)$')
+
+
+class MeanEstimate(object):
+    '''running mean and standard error of iid samples, chunks merged with Chan/Welford'''
+    def __init__(self) -> None:
+        self.__n = 0
+        self.__mean = 0.0
+        self.__m2 = 0.0
+
+    @property
+    def n(self) -> int:
+        return self.__n
+
+    @property
+    def value(self) -> float:
+        return self.__mean if self.__n else np.nan
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self.__m2 / (self.__n - 1)) if self.__n > 1 else np.nan
+
+    def update(self, x: np.ndarray) -> None:
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        if not len(x):
+            return
+        n, mean = len(x), x.mean()
+        total = self.__n + n
+        delta = mean - self.__mean
+        self.__mean += delta * n / total
+        self.__m2 += np.sum((x - mean) ** 2) + delta ** 2 * self.__n * n / total
+        self.__n = total
+
+    def halfWidth(self, z: float) -> float:
+        return z * self.std / np.sqrt(self.__n) if self.__n > 1 else np.inf
+
+
+class QuantileEstimate(object):
+    '''q quantile of iid samples with the order statistic interval of level z'''
+    def __init__(self, q: float) -> None:
+        if not 0 < q < 1:
+            raise ValueError('quantile {} out of (0, 1)'.format(q))
+        self.__q = q
+        self.__samples: List[np.ndarray] = []
+        self.__n = 0
+
+    @property
+    def n(self) -> int:
+        return self.__n
+
+    @property
+    def value(self) -> float:
+        return np.quantile(np.concatenate(self.__samples), self.__q) if self.__n else np.nan
+
+    def update(self, x: np.ndarray) -> None:
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        self.__samples.append(x)
+        self.__n += len(x)
+
+    def __bounds(self, n: int, z: float) -> tuple:
+        q = self.__q
+        d = z * np.sqrt(n * q * (1 - q))
+        return int(np.floor(n * q - d)), int(np.ceil(n * q + d))
+
+    def minSamples(self, z: float) -> int:
+        '''num of samples from which on the order statistic interval exists, the half width is inf below'''
+        n = 2
+        while True:
+            lo, hi = self.__bounds(n, z)
+            if lo >= 0 and hi <= n - 1:
+                return n
+            n += 1
+
+    def halfWidth(self, z: float) -> float:
+        n = self.__n
+        if n < 2:
+            return np.inf
+        lo, hi = self.__bounds(n, z)
+        if lo < 0 or hi > n - 1:
+            return np.inf
+        x = np.sort(np.concatenate(self.__samples))
+        return (x[hi] - x[lo]) / 2
+
+
+def estimate(name: str):
+    '''MeanEstimate, or QuantileEstimate for names ending with 2 digits, mdd95 is the 95% quantile of mdd'''
+    m = QUANTILE.match(name)
+    return QuantileEstimate(int(m.group(2)) / 100) if m else MeanEstimate()
+
+
+def base(name: str) -> str:
+    m = QUANTILE.match(name)
+    return m.group(1) if m else name
+
+
+class AdaptiveResult(object):
+    '''
+    estimates: running estimate of every metric
+    level: confidence level of the half widths
+    batches, games, trades: work done
+    reason: target, budget or time
+    '''
+    def __init__(self, estimates: dict, level: float, batches: int, games: int, trades: int, reason: str,
+                 elapsed: float) -> None:
+        self.__estimates = estimates
+        self.__z = NormalDist().inv_cdf((1 + level) / 2)
+        self.batches = batches
+        self.games = games
+        self.trades = trades
+        self.reason = reason
+        self.elapsed = elapsed
+
+    @property
+    def estimates(self) -> dict:
+        return self.__estimates
+
+    @property
+    def converged(self) -> bool:
+        return self.reason == 'target'
+
+    def value(self, name: str) -> float:
+        return self.__estimates[name].value
+
+    def halfWidth(self, name: str) -> float:
+        return self.__estimates[name].halfWidth(self.__z)
+
+    def summary(self) -> dict:
+        '''value and half width of every metric plus the work done'''
+        ret = {}
+        for name in self.__estimates:
+            ret[name] = self.value(name)
+            ret[name + '_hw'] = self.halfWidth(name)
+        ret.update(batches=self.batches, games=self.games, trades=self.trades, reason=self.reason,
+                   elapsed=self.elapsed)
+        return ret
+
+
+def _floor(estimates: dict, targets: Dict[str, float], z: float, least: int, per: Dict[str, int], budget: int,
+           unit: str) -> int:
+    '''least num of batches / curves before the targets are checked, raised to where the quantile intervals exist
+    per: samples added per batch of a metric, 1 when not given
+    '''
+    ret = least
+    for k in targets:
+        e = estimates[k]
+        if isinstance(e, QuantileEstimate):
+            ret = max(ret, -(-e.minSamples(z) // per.get(base(k), 1)))
+    if ret > budget:
+        logging.warning('the targets need {} {} before they can be met, the budget is {}'.format(ret, unit, budget))
+    return ret
+
+
+def _done(estimates: dict, targets: Dict[str, float], z: float) -> bool:
+    return all(estimates[k].halfWidth(z) <= v for k, v in targets.items())
+
+
+def _log(estimates: dict, z: float, prefix: str) -> None:
+    logging.info(prefix + ', '.join('{}: {:.6g} +- {:.3g}'.format(k, e.value, e.halfWidth(z)) for k, e in estimates.items()))
+
+
+def runAdaptive(sim, targets: Dict[str, float], maxGames: int, level: float = 0.95, batch: bool = False,
+                kernel: bool = False, seed: int = None, size: int = None, minBatches: int = 10,
+                maxTime: float = None) -> AdaptiveResult:
+    '''play batches of games until the targets are met
+
+    sim: MCSimulation
+    targets: max confidence interval half width per metric, metrics are
+             game: mean game pnl, pnl: mean per-trade pnl, rtn: return of a batch path,
+             mdd: max drawdown of a batch path, and their quantiles like mdd95
+    maxGames: budget of games, rounded up to a batch
+    level: confidence level
+    size: num of games per batch, default sim.chunk which plays the games of run()
+    minBatches: num of batches before the targets are checked, batch means need a few,
+                raised for the quantiles of the path metrics, mdd95 at level 0.95 needs 110
+    maxTime: budget of seconds
+    '''
+    z = NormalDist().inv_cdf((1 + level) / 2)
+    names = ['game', 'pnl', 'rtn', 'mdd'] + [k for k in targets if k not in ('game', 'pnl', 'rtn', 'mdd')]
+    estimates = {k: estimate(k) for k in names}
+    for k in targets:
+        if base(k) not in ('game', 'pnl', 'rtn', 'mdd'):
+            raise ValueError('unknown metric {}'.format(k))
+    if kernel and not sim.compiled:
+        logging.warning('no compiled kernel, fall back to python game()')
+        kernel = False
+
+    sim.checkSource()
+    root = child(sim.seed if seed is None else seedSequence(seed), 0)
+    size = size or sim.chunk
+    per = {'game': size // 2 if sim.antithetic else size}
+    minBatches = _floor(estimates, targets, z, minBatches, per, -(-maxGames // size), 'batches')
+    start = time.perf_counter()
+    games = trades = c = 0
+    reason = 'budget'
+    while games < maxGames:
+        stream = OutcomeStream(child(root, c), size, antithetic=sim.antithetic, source=sim.source)
+        pnl, counts = sim.play(stream, batch, kernel)
+        c += 1
+        games += len(counts)
+        trades += len(pnl)
+        b = sim.curve(pnl)
+        g = np.add.reduceat(pnl, np.cumsum(counts) - counts)
+        if sim.antithetic:
+            ## antithetic pairs are one sample
+            m = stream.n - stream.half
+            g = (g[:m] + g[stream.half:stream.half + m]) / 2
+        sample = {'game': g, 'pnl': pnl.mean(),
+                  'rtn': b[-1] / b[0] - 1, 'mdd': np.max(1 - b / np.maximum.accumulate(b))}
+        for k, e in estimates.items():
+            e.update(sample[base(k)])
+        if c >= minBatches and _done(estimates, targets, z):
+            reason = 'target'
+            break
+        if maxTime and time.perf_counter() - start > maxTime:
+            reason = 'time'
+            break
+    _log(estimates, z, 'adaptive run: {} batches, {} games, stop on {}, '.format(c, games, reason))
+    return AdaptiveResult(estimates, level, c, games, trades, reason, time.perf_counter() - start)
+
+
+def _curveTask(sim, rows: int, seed: np.random.SeedSequence) -> tuple:
+    avg, _, _, mdd, rtn = performanceKernel(sim(rows, seed), dd=False)
+    return avg, mdd, rtn
+
+
+def curvesAdaptive(sim, rows: int, targets: Dict[str, float], maxCurves: int, level: float = 0.95, step: int = None,
+                   minCurves: int = 10, maxTime: float = None, executor: Executor = None, cores: int = 2,
+                   progress: Callable[[int, int], None] = None) -> AdaptiveResult:
+    '''generateGDF counterpart, strategy curves of rows trades are added step at a time until the targets are met
+
+    targets: max half width per metric, metrics are avg: mean per-trade return of a curve,
+             rtn: total return of a curve, mdd: max drawdown of a curve, and their quantiles like mdd95
+    maxCurves: budget of curves, curve i is the strategy i of generateGDF
+    step: num of curves per round, default 4 per worker
+    minCurves: num of curves before the targets are checked, raised for the quantiles as minBatches of runAdaptive
+    '''
+    z = NormalDist().inv_cdf((1 + level) / 2)
+    for k in targets:
+        if base(k) not in ('avg', 'rtn', 'mdd'):
+            raise ValueError('unknown metric {}'.format(k))
+    names = ['avg', 'rtn', 'mdd'] + [k for k in targets if k not in ('avg', 'rtn', 'mdd')]
+    estimates = {k: estimate(k) for k in names}
+    executor = executor or getExecutor(cores)
+    step = step or 4 * executor.cores
+    root = child(sim.seed, 1)
+    minCurves = _floor(estimates, targets, z, minCurves, {}, maxCurves, 'curves')
+
+    start = time.perf_counter()
+    n = 0
+    reason = 'budget'
+    while n < maxCurves:
+        tasks = [(sim, rows, child(root, i)) for i in range(n, min(n + step, maxCurves))]
+        ret = executor.map(_curveTask, tasks, progress)
+        n += len(tasks)
+        sample = dict(zip(('avg', 'mdd', 'rtn'), np.array(ret).T))
+        for k, e in estimates.items():
+            e.update(sample[base(k)])
+        if n >= minCurves and _done(estimates, targets, z):
+            reason = 'target'
+            break
+        if maxTime and time.perf_counter() - start > maxTime:
+            reason = 'time'
+            break
+    _log(estimates, z, 'adaptive curves: {} curves, stop on {}, '.format(n, reason))
+    return AdaptiveResult(estimates, level, n, n, n * rows, reason, time.perf_counter() - start)
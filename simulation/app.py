@@ -1,9 +1,8 @@
 # coding=utf-8
-import logging
 import numpy as np
-from typing import List
 
 from simulation import MCSimulation
+from simulation.ragged import Ragged
 
 
 ##  Example for call simulation
@@ -21,34 +20,36 @@ class childSim(MCSimulation):
     A: 最大连续加仓次数
     X: 加仓倍数
     Flag: 盈利 (PROFIT) 亏损情况(LOSS)
+    Seed: 随机种子
     '''
-    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, A: int, X: int) -> None:
-        super().__init__(InitBalance, InitPos, N, K)
+    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, A: int, X: int, Seed: int = None) -> None:
+        super().__init__(InitBalance, InitPos, N, K, Seed)
         self.__A = A
         self.__X = X
 
-    def simu(self) -> float:
+    def simu(self, rng) -> float:
         '''
         '''
-        return np.random.uniform(-1, 1) * 0.01
+        return self.outcome(rng.random())
+
+    def outcome(self, u: np.ndarray) -> np.ndarray:
+        return (2 * u - 1) * 0.01
     
-    def game(self) -> List[float]:
-        a = self.balance * self.initPos * self.simu()
+    def game(self, rng, out: Ragged) -> None:
+        a = self.balance * self.initPos * self.simu(rng)
         count = 0
         balance = self.balance + a
         pos = self.initPos
-        logging.info('first trade')
-        logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
-        ret = [a]
+        if self.trace is not None:
+            self.trace.record(0, pos, a, balance)
+        out.append(a)
         while(a < 0):
             count += 1
             pos *= self.__X    
             if count > self.__A:
                 break
-            a = self.balance * pos * self.simu()
+            a = self.balance * pos * self.simu(rng)
             balance += a
-            ret.append(a)
-            logging.info('pos: {:.0%}, pnl: {:.2f}, balance: {:.2f}.'.format(pos, a, balance))
-    
-        logging.info('return total pnl: {:.2f}'.format(balance - self.balance))
-        return ret
\ No newline at end of file
+            out.append(a)
+            if self.trace is not None:
+                self.trace.record(out.count - 1, pos, a, balance)
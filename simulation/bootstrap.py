@@ -0,0 +1,255 @@
+# coding=utf-8
+import logging
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+
+from simulation.kernel import HAS_NUMBA, njit
+
+'''Bootstrap resampling of historical trade returns
+
+a Bootstrap replaces the synthetic return distribution of a strategy by the
+return rates of real trades (pnl / stake, the unit of outcome()). The file is
+memory mapped once per process, workers and copies of a strategy reopen the
+same mapping, nothing is read into memory but the pages the draws hit.
+
+draws stay the uniform buffers of the engine, drawn in bulk: iid maps a draw u
+to the trade floor(u * n), one fancy index per buffer, looked up inside the
+spec kernel for the draws the games reach. The block methods turn every
+(games, block) buffer into index arrays in one compiled pass over the rows (a
+few vectorized passes without numba) and hand them on encoded as the draws
+(i + 0.5) / n, so outcome() stays one lookup and the scalar, batch and kernel
+modes read the same trades.
+
+    stationary  blocks of geometric length with mean blockSize (Politis & Romano):
+                a draw u < p = 1 / blockSize starts a new block at the trade
+                floor(u / p * n), otherwise the next trade follows
+    block       circular blocks of blockSize trades, each from a uniform start
+
+blocks wrap around the end of the history and never cross the start of a game,
+the strategy curves of __call__ / generateDF / compoundPath are one long path
+each. generatePortfolio maps its copula draws through outcome(), iid.
+'''
+
+METHODS = ('iid', 'stationary', 'block')
+## path, dtype, column -> (returns, mean) of the open mappings of the process
+_MAPS: Dict[tuple, Tuple[np.ndarray, float]] = {}
+
+
+@njit(cache=True)
+def _resampleKernel(u, stationary, size, n, t0, prev, out):
+    ## same draws as the numpy path of Bootstrap.resample, prev -1 at the start of a game
+    p = 1.0 / size
+    for i in range(u.shape[0]):
+        k = prev[i]
+        ## position in the fixed block
+        j = t0 % size
+        for t in range(u.shape[1]):
+            x = u[i, t]
+            if stationary and x < p:
+                k = min(int(x / p * n), n - 1)
+            elif k < 0:
+                k = min(int((x - p) / (1 - p) * n), n - 1) if stationary else min(int(x * n), n - 1)
+            elif not stationary and j == 0:
+                k = min(int(x * n), n - 1)
+            else:
+                k += 1
+                if k == n:
+                    k = 0
+            j += 1
+            if j == size:
+                j = 0
+            out[i, t] = (k + 0.5) / n
+
+
+def load(path: str, dtype: str = 'float64', column: int = None) -> Tuple[np.ndarray, float]:
+    '''
+    memory mapped returns of a .npy file, or a raw binary file of dtype values, and their mean
+    column: column of a 2-D file
+    '''
+    path = os.path.abspath(os.path.expanduser(path))
+    key = (path, np.dtype(dtype).str, column)
+    ret = _MAPS.get(key)
+    if ret is not None:
+        return ret
+    if path.endswith('.npy'):
+        data = np.load(path, mmap_mode='r')
+    else:
+        data = np.memmap(path, dtype=dtype, mode='r')
+    if column is not None:
+        data = data[:, column]
+    if data.ndim != 1 or not len(data):
+        raise ValueError('{} holds no 1-D returns, shape {}, give a column'.format(path, data.shape))
+    ## plain ndarray view on the mapping, cheaper to index than the memmap subclass
+    data = data.view(np.ndarray)
+    ## one pass over the file in chunks
+    total = 0.0
+    for s in range(0, len(data), 1 << 20):
+        x = np.asarray(data[s:s + (1 << 20)], dtype=float)
+        if not np.all(np.isfinite(x)):
+            raise ValueError('{} holds non finite returns after {}'.format(path, s))
+        total += x.sum()
+    ret = _MAPS[key] = (data, total / len(data))
+    logging.info('bootstrap: mapped {} returns of {}'.format(len(data), path))
+    return ret
+
+
+class Bootstrap(object):
+    '''
+    path: .npy file, or a raw binary file of dtype values, of per-trade return rates
+    method: iid, stationary or block
+    blockSize: mean (stationary) or fixed (block) num of trades per block
+    dtype: value type of a raw file
+    column: column of a 2-D file
+    scale: factor of the returns, e.g. 0.01 for a file in percent
+    '''
+    def __init__(self, path: str, method: str = 'iid', blockSize: int = 10, dtype: str = 'float64',
+                 column: int = None, scale: float = 1.0) -> None:
+        if method not in METHODS:
+            raise ValueError('unknown method {}, use one of {}'.format(method, list(METHODS)))
+        if method != 'iid' and blockSize < 1:
+            raise ValueError('block size {} below 1'.format(blockSize))
+        if method == 'block' and blockSize != int(blockSize):
+            raise ValueError('fixed block size {} is not a num of trades'.format(blockSize))
+        self.__path = path
+        self.__method = method
+        self.__blockSize = blockSize
+        self.__dtype = dtype
+        self.__column = column
+        self.__scale = scale
+        self.__open()
+
+    def __open(self) -> None:
+        self.__data, self.__mean = load(self.__path, self.__dtype, self.__column)
+        self.__n = len(self.__data)
+
+    def __getstate__(self) -> dict:
+        ## the mapping is reopened, not pickled
+        return {'path': self.__path, 'method': self.__method, 'blockSize': self.__blockSize, 'dtype': self.__dtype,
+                'column': self.__column, 'scale': self.__scale}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+
+    def __repr__(self) -> str:
+        return 'Bootstrap({!r}, method={!r}, blockSize={!r}, dtype={!r}, column={!r}, scale={!r})'.format(
+            self.__path, self.__method, self.__blockSize, self.__dtype, self.__column, self.__scale)
+
+    def describe(self) -> dict:
+        '''json metadata, the size and mtime of the file stand for its content'''
+        st = os.stat(os.path.expanduser(self.__path))
+        ret = self.__getstate__()
+        ret.update(n=self.__n, bytes=st.st_size, mtime=st.st_mtime_ns)
+        return ret
+
+    @property
+    def n(self) -> int:
+        '''num of historical trades'''
+        return self.__n
+
+    @property
+    def method(self) -> str:
+        return self.__method
+
+    @property
+    def blocked(self) -> bool:
+        '''the draws of a game depend on each other, streams go through resample'''
+        return self.__method != 'iid'
+
+    @property
+    def returns(self) -> np.ndarray:
+        '''read-only mapped returns, unscaled'''
+        return self.__data
+
+    @property
+    def scale(self) -> float:
+        return self.__scale
+
+    @property
+    def mean(self) -> float:
+        return self.__mean * self.__scale
+
+    def indices(self, u: np.ndarray) -> np.ndarray:
+        '''historical trade of the draws u in [0, 1)'''
+        return np.minimum((u * self.__n).astype(np.int64), self.__n - 1)
+
+    def outcome(self, u: np.ndarray) -> np.ndarray:
+        '''return rate of the draws, float for a float draw'''
+        if isinstance(u, float):
+            return float(self.__data[min(int(u * self.__n), self.__n - 1)]) * self.__scale
+        ret = self.__data[self.indices(u)].astype(float, copy=False)
+        return ret * self.__scale if self.__scale != 1 else ret
+
+    def resample(self, u: np.ndarray, t0: int = 0, prev: np.ndarray = None) -> np.ndarray:
+        '''encode the block bootstrap of the trades t0.. of every game as draws, iid draws are returned as they are
+        u: (games, T) uniforms, row i the draws of game i
+        t0: trade of the first column
+        prev: (games, ) trade index of the draw before the first column, None at the start of the games
+        '''
+        if self.__method == 'iid':
+            return u
+        n, size = self.__n, self.__blockSize
+        if HAS_NUMBA:
+            out = np.empty(u.shape)
+            prev = np.full(len(u), -1, dtype=np.int64) if prev is None else np.asarray(prev, dtype=np.int64)
+            stationary = self.__method == 'stationary'
+            _resampleKernel(np.ascontiguousarray(u, dtype=float), stationary, float(size) if stationary else int(size),
+                            n, t0, prev, out)
+            return out
+        t = np.arange(u.shape[1])
+        if self.__method == 'stationary':
+            p = 1.0 / size
+            restart = u < p
+            ## uniform on [0, 1) given either side of p, the forced start of a game is uniform too
+            start = self.indices(np.where(restart, u / p, (u - p) / (1 - p)) if p < 1 else u)
+        else:
+            restart = np.broadcast_to((t0 + t) % size == 0, u.shape)
+            start = self.indices(u)
+        if prev is None:
+            restart = restart | (t == 0)
+            prev = np.zeros(len(u), dtype=np.int64)
+        ## column of the last block start, -1 continues the block of prev
+        last = np.maximum.accumulate(np.where(restart, t, -1), axis=1)
+        base = np.where(last >= 0, np.take_along_axis(start, np.maximum(last, 0), axis=1), np.asarray(prev)[:, None])
+        return ((base + (t - last)) % n + 0.5) / n
+
+    def wrap(self, rng) -> 'Resampled':
+        '''generator drawing the encoded resampled draws of rng, rng itself for iid'''
+        return Resampled(rng, self) if self.blocked else rng
+
+
+class Resampled(object):
+    '''one long bootstrap path over a np.random.Generator
+
+    exposes random() / random(size) like np.random.Generator, drawn `block` at a
+    time, for the strategy curves of __call__ / generateDF and compoundPath
+    '''
+    def __init__(self, rng: np.random.Generator, source: Bootstrap, block: int = 1024) -> None:
+        self.__rng = rng
+        self.__source = source
+        self.__block = block
+        self.__buf = np.empty(0)
+        self.__k = 0
+        self.__t = 0
+        self.__prev = None
+
+    def __draw(self, n: int) -> np.ndarray:
+        u = self.__source.resample(self.__rng.random((1, n)), self.__t, self.__prev)
+        self.__t += n
+        self.__prev = self.__source.indices(u[:, -1])
+        return u[0]
+
+    def random(self, size: int = None):
+        if size is None:
+            if self.__k == len(self.__buf):
+                self.__buf = self.__draw(self.__block)
+                self.__k = 0
+            self.__k += 1
+            return float(self.__buf[self.__k - 1])
+        rest = self.__buf[self.__k:]
+        if len(rest) >= size:
+            self.__k += size
+            return rest[:size].copy()
+        self.__k = len(self.__buf)
+        return np.concatenate([rest, self.__draw(size - len(rest))])
@@ -0,0 +1,165 @@
+# coding=utf-8
+import functools
+import hashlib
+import importlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import sys
+from collections import OrderedDict
+from typing import Dict
+
+import numpy as np
+
+from simulation.store import META, ResultStore, jsonable
+
+'''Content-addressed result cache
+
+the result arrays of run / generateGDF / generateDF are keyed by a hash of the
+strategy class, its constructor params (distribution params included), the
+seed, its settings, the call arguments and the code version. The settings are
+every class level setting as seen by the instance (MCSimulation.settings):
+chunk, compound, ruin, antithetic, the return source (its file by path, size
+and mtime) and the `version` bumped by hand to drop the cached results of a
+strategy on purpose, but also e.g. SimV4.multi, a new one is keyed without
+touching the cache; MCSimulation.unkeyed lists the ones left out. The code
+version hashes the source of the modules defining the strategy and its base
+classes together with the engine modules the draws and the cached curves go
+through (ENGINE).
+
+Two LRU tiers bounded in bytes: arrays in memory, and ResultStore directories
+on disk named by the key, reopened as memmaps on a hit.
+
+    MCSimulation.cache = ResultCache('~/.cache/simulation')
+'''
+
+ENGINE = ('simulation.engine', 'simulation.rng', 'simulation.kernel', 'simulation.bootstrap', 'simulation.spec',
+          'simulation.compound', 'simulation.stream', 'simulation.shared')
+
+
+@functools.lru_cache(maxsize=None)
+def codeVersion(cls) -> str:
+    '''hash of the source of the modules defining cls and its bases, plus the engine modules'''
+    names = sorted(set([c.__module__ for c in cls.__mro__ if c.__module__ != 'builtins'] + list(ENGINE)))
+    h = hashlib.sha256()
+    for name in names:
+        try:
+            module = sys.modules.get(name) or importlib.import_module(name)
+            h.update(inspect.getsource(module).encode())
+        except (ImportError, TypeError, OSError):
+            logging.warning('cache: no source for module {}, not part of the code version'.format(name))
+    return h.hexdigest()[:16]
+
+
+def nbytes(arrays: Dict[str, np.ndarray]) -> int:
+    return sum(x.nbytes for x in arrays.values())
+
+
+class ResultCache(object):
+    '''
+    path: directory of the disk tier, None for memory only
+    memory: max bytes of the memory tier
+    disk: max bytes of the disk tier
+    '''
+    def __init__(self, path: str = None, memory: int = 1 << 28, disk: int = 1 << 32) -> None:
+        self.__path = os.path.expanduser(path) if path else None
+        self.__memory = memory
+        self.__disk = disk
+        self.__entries: 'OrderedDict[str, Dict[str, np.ndarray]]' = OrderedDict()
+        self.__size = 0
+        self.hits = 0
+        self.misses = 0
+        if self.__path:
+            os.makedirs(self.__path, exist_ok=True)
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def size(self) -> int:
+        '''bytes held in memory'''
+        return self.__size
+
+    def key(self, sim, method: str, args: dict = None) -> str:
+        '''content address of method(**args) of the strategy sim'''
+        desc = sim.describe()
+        content = {'class': desc['class'], 'params': desc['params'], 'seed': desc['seed'],
+                   'settings': desc['settings'], 'method': method, 'args': jsonable(args or {}),
+                   'code': codeVersion(type(sim))}
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()[:32]
+
+    def get(self, key: str) -> Dict[str, np.ndarray]:
+        '''read-only arrays of the entry, None on a miss'''
+        ret = self.__entries.get(key)
+        if ret is not None:
+            self.__entries.move_to_end(key)
+        elif self.__path and os.path.exists(os.path.join(self.__path, key, META)):
+            store = ResultStore(os.path.join(self.__path, key))
+            os.utime(store.file(META))
+            ret = {name: store[name] for name in store.columns}
+            if nbytes(ret) <= self.__memory:
+                self.__remember(key, {k: np.array(v) for k, v in ret.items()})
+        if ret is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        logging.info('cache hit {}'.format(key))
+        return ret
+
+    def put(self, key: str, arrays: Dict[str, np.ndarray], meta: dict = None) -> None:
+        '''
+        arrays: result arrays of the entry
+        meta: kept in the meta of the disk entry, e.g. MCSimulation.describe()
+        '''
+        self.__remember(key, arrays)
+        if not self.__path:
+            return
+        with ResultStore(os.path.join(self.__path, key), 'w', meta) as store:
+            for name, arr in arrays.items():
+                store.put(name, arr)
+        self.__evictDisk()
+
+    def __remember(self, key: str, arrays: Dict[str, np.ndarray]) -> None:
+        size = nbytes(arrays)
+        if size > self.__memory:
+            return
+        self.__drop(key)
+        for arr in arrays.values():
+            arr.flags.writeable = False
+        self.__entries[key] = arrays
+        self.__size += size
+        while self.__size > self.__memory:
+            self.__drop(next(iter(self.__entries)))
+
+    def __drop(self, key: str) -> None:
+        arrays = self.__entries.pop(key, None)
+        if arrays is not None:
+            self.__size -= nbytes(arrays)
+
+    def __evictDisk(self) -> None:
+        entries = []
+        for key in os.listdir(self.__path):
+            meta = os.path.join(self.__path, key, META)
+            if os.path.exists(meta):
+                folder = os.path.join(self.__path, key)
+                size = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+                entries.append((os.path.getmtime(meta), size, folder))
+        total = sum(x[1] for x in entries)
+        for _, size, folder in sorted(entries):
+            if total <= self.__disk:
+                break
+            logging.info('cache evict {}'.format(folder))
+            shutil.rmtree(folder, ignore_errors=True)
+            total -= size
+
+    def clear(self) -> None:
+        '''drop every entry, in memory and on disk'''
+        self.__entries.clear()
+        self.__size = 0
+        if self.__path:
+            for key in os.listdir(self.__path):
+                if os.path.exists(os.path.join(self.__path, key, META)):
+                    shutil.rmtree(os.path.join(self.__path, key), ignore_errors=True)
@@ -0,0 +1,42 @@
+# coding=utf-8
+import numpy as np
+
+'''Compounding balance curves
+
+with compounding the stake of a trade is a fraction of the current equity
+instead of the init balance, so trade t multiplies the equity by 1 + r_t where
+r_t is its return on equity. The curve is one pass in log space:
+balance = init * exp(cumsum(log1p(r))), a trade losing all the equity
+(r <= -1) sends the log balance to -inf. Ruin is absorbing: once the balance
+falls to the ruin level trading stops and the balance stays there.
+'''
+
+
+def logReturns(r: np.ndarray) -> np.ndarray:
+    '''log1p of the returns on equity, -inf for a total loss'''
+    r = np.asarray(r, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(r > -1, np.log1p(np.maximum(r, -1)), -np.inf)
+
+
+def compoundBalance(r: np.ndarray, init: float = 1.0, ruin: float = 0.0, out: np.ndarray = None) -> np.ndarray:
+    '''
+    r: per-trade returns on the current equity, e.g. position fraction * outcome
+    init: balance before the first trade, chained from the last balance of the previous chunk
+    ruin: absolute ruin level, the balance is frozen at the first trade reaching it, 0 for bankruptcy only
+    out: write the balances into out instead of a new array
+    return: balance after each trade
+    '''
+    if init <= max(ruin, 0):
+        ## already ruined in a previous chunk
+        ret = np.empty(len(r)) if out is None else out
+        ret[:] = init
+        return ret
+    c = np.cumsum(logReturns(r), out=out)
+    c += np.log(init)
+    if ruin > 0:
+        hit = c <= np.log(ruin)
+        if hit.any():
+            k = np.argmax(hit)
+            c[k + 1:] = c[k]
+    return np.exp(c, out=c)
@@ -0,0 +1,135 @@
+# coding=utf-8
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from simulation.rng import child, generator, spawn
+
+
+class OutcomeStream(object):
+    '''uniform outcome buffer shared by the scalar and the batch path
+
+    the first `block` draws of every game come from one (n, block) matrix drawn
+    in a single Generator call, game i reads row i. Games outliving the first
+    block continue on their own tail generator, created lazily from the seed,
+    so the draws of one game never depend on how many other games are running.
+
+    antithetic: game half + i replays the draws 1 - u of game i, i < n - half
+    source: a block bootstrap turns every block of draws of a game into its
+    resampled draws, continuing the block of the last trade, see bootstrap
+
+    seed: int or np.random.SeedSequence
+    n: num of games
+    block: num of draws per game taken in one call
+    antithetic: draw the first half of the games only and mirror them
+    source: Bootstrap resampling the draws, None or iid keeps them
+    '''
+    def __init__(self, seed, n: int, block: int = 32, antithetic: bool = False, source=None) -> None:
+        head, self.__tail = spawn(seed, 2)
+        self.__n = n
+        self.__block = block
+        self.__half = -(-n // 2) if antithetic else n
+        self.__head = generator(head).random((self.__half, block))
+        if antithetic:
+            self.__head = np.concatenate([self.__head, 1 - self.__head])[:n]
+        self.__source = source if source is not None and source.blocked else None
+        if self.__source is not None:
+            self.__head = self.__source.resample(self.__head)
+        self.__tails = {}
+        ## game -> trade of the next tail block, trade index of its last draw
+        self.__resampled: Dict[int, Tuple[int, int]] = {}
+
+    @property
+    def n(self) -> int:
+        return self.__n
+
+    @property
+    def block(self) -> int:
+        return self.__block
+
+    @property
+    def half(self) -> int:
+        '''num of games with their own draws, n unless antithetic'''
+        return self.__half
+
+    def tail(self, i: int) -> np.random.Generator:
+        '''tail generator of game i, the mirrored game of an antithetic pair has its own copy'''
+        g = self.__tails.get(i)
+        if g is None:
+            g = generator(child(self.__tail, i % self.__half))
+            self.__tails[i] = g
+        return g
+
+    def draws(self, i: int) -> np.ndarray:
+        '''next `block` tail draws of game i'''
+        u = self.tail(i).random(self.__block)
+        u = u if i < self.__half else 1 - u
+        if self.__source is None:
+            return u
+        t, prev = self.__resampled.get(i) or (self.__block, self.__source.indices(self.__head[i, -1]))
+        u = self.__source.resample(u[None], t, np.array([prev]))[0]
+        self.__resampled[i] = (t + self.__block, self.__source.indices(u[-1]))
+        return u
+
+    def head(self, idx: np.ndarray, t: int) -> np.ndarray:
+        '''draws at step t (< block) for the games idx'''
+        return self.__head[idx, t]
+
+    def game(self, i: int) -> 'GameStream':
+        return GameStream(self, i)
+
+
+class GameStream(object):
+    '''scalar view of one game of an OutcomeStream
+
+    exposes `random()` like np.random.Generator, so simu()/game() accept either
+    '''
+    def __init__(self, stream: OutcomeStream, i: int) -> None:
+        self.__stream = stream
+        self.__i = i
+        self.__buf = stream.head(i, slice(None))
+        self.__t = 0
+
+    def random(self) -> float:
+        k = self.__t % self.__stream.block
+        if self.__t and not k:
+            self.__buf = self.__stream.draws(self.__i)
+        self.__t += 1
+        return float(self.__buf[k])
+
+
+def playBatch(sim, stream: OutcomeStream) -> Tuple[np.ndarray, np.ndarray]:
+    '''advance all games of the stream at once with numpy masks
+
+    sim: MCSimulation implementing outcome/batchInit/batchStep
+    return: flat per-trade pnl in game order, num of trades per game
+    '''
+    n, block = stream.n, stream.block
+    idx = np.arange(n)
+    state = sim.batchInit(n)
+    ids: List[np.ndarray] = []
+    pnls: List[np.ndarray] = []
+    tails: Dict[int, np.ndarray] = {}
+    t = 0
+    while len(idx):
+        k = t % block
+        if t < block:
+            u = stream.head(idx, t)
+        else:
+            if not k:
+                tails = {i: stream.draws(i) for i in idx.tolist()}
+            u = np.array([tails[i][k] for i in idx.tolist()])
+        a = sim.balance * state['pos'] * sim.outcome(u)
+        ids.append(idx)
+        pnls.append(a)
+        keep = sim.batchStep(state, a, t)
+        idx = idx[keep]
+        state = {key: val[keep] for key, val in state.items()}
+        t += 1
+    logging.info('batch done: {} games, {} steps.'.format(n, t))
+
+    ids = np.concatenate(ids)
+    order = np.argsort(ids, kind='stable')
+    counts = np.bincount(ids, minlength=n)
+    return np.concatenate(pnls)[order], counts
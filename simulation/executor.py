@@ -0,0 +1,104 @@
+# coding=utf-8
+import atexit
+import logging
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from typing import Callable, Iterator, List, Sequence
+
+'''Reusable worker pool
+
+one pool is kept alive and reused by back to back calls instead of starting a
+new Pool every time. process backend for the python game loops, thread
+backend once the inner loop is vectorized and releases the GIL.
+'''
+
+BACKENDS = {'process': Pool, 'thread': ThreadPool}
+
+
+def _star(task: tuple):
+    fn, args = task
+    return fn(*args)
+
+
+class Executor(object):
+    '''
+    cores: num of workers
+    backend: process or thread
+    chunksize: num of tasks sent to a worker at once
+    '''
+    def __init__(self, cores: int = 2, backend: str = 'process', chunksize: int = 1) -> None:
+        if backend not in BACKENDS:
+            raise ValueError('unknown backend {}, use one of {}'.format(backend, list(BACKENDS)))
+        self.__cores = cores
+        self.__backend = backend
+        self.chunksize = chunksize
+        self.__pool = None
+
+    @property
+    def cores(self) -> int:
+        return self.__cores
+
+    @property
+    def backend(self) -> str:
+        return self.__backend
+
+    @property
+    def pool(self):
+        if self.__pool is None:
+            logging.info('start {} pool with {} workers'.format(self.__backend, self.__cores))
+            self.__pool = BACKENDS[self.__backend](processes=self.__cores)
+        return self.__pool
+
+    def imap(self, fn: Callable, tasks: Sequence[tuple], progress: Callable[[int, int], None] = None,
+             chunksize: int = None) -> Iterator:
+        '''
+        run fn(*args) for every args of tasks, yield results as soon as they finish (unordered)
+        progress: called with (done, total) after every finished task
+        '''
+        total = len(tasks)
+        it = self.pool.imap_unordered(_star, [(fn, args) for args in tasks], chunksize or self.chunksize)
+        for done, ret in enumerate(it, 1):
+            if progress:
+                progress(done, total)
+            yield ret
+
+    def map(self, fn: Callable, tasks: Sequence[tuple], progress: Callable[[int, int], None] = None,
+            chunksize: int = None) -> List:
+        '''unordered list of fn(*args)'''
+        return list(self.imap(fn, tasks, progress, chunksize))
+
+    def close(self) -> None:
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+
+    def __enter__(self) -> 'Executor':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __getstate__(self) -> dict:
+        # pools can not cross processes, a copy starts its own when used
+        state = self.__dict__.copy()
+        state['_Executor__pool'] = None
+        return state
+
+
+_executors = {}
+
+
+def getExecutor(cores: int = 2, backend: str = 'process') -> Executor:
+    '''module level executor, shared by every simulation asking for the same cores/backend'''
+    key = (cores, backend)
+    if key not in _executors:
+        _executors[key] = Executor(cores, backend)
+    return _executors[key]
+
+
+@atexit.register
+def shutdown() -> None:
+    for e in _executors.values():
+        e.close()
+    _executors.clear()
@@ -0,0 +1,107 @@
+# coding=utf-8
+import logging
+from typing import Dict, Tuple
+
+import numpy as np
+
+from simulation.engine import OutcomeStream
+from simulation.rng import child, seedSequence
+from simulation.variance import Reduction
+
+'''Importance sampling of the ruin / drawdown tail of a game
+
+a ruinous game of SimV3 / SimV4 is a long losing streak, plain monte carlo
+almost never plays one. The games are played with the winning ratio tilted
+down to q < p and every game is weighted by its likelihood ratio
+(p / q) ** wins * ((1 - p) / (1 - q)) ** losses, which keeps the estimates
+unbiased while the rare streaks become common.
+
+works for BinarySim strategies: sim.wlRatio is p, sim.tilted(q) is the same
+strategy with winning ratio q, a trade with pnl > 0 is a win. The tilt is
+chosen on a pilot run by the smallest relative variance when not given.
+'''
+
+
+def _paths(pnl: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''per game: num of wins, lowest running pnl, max drawdown of the running pnl from 0'''
+    n = len(counts)
+    starts = np.cumsum(counts) - counts
+    col = np.arange(len(pnl)) - np.repeat(starts, counts)
+    m = np.zeros((n, counts.max()))
+    m[np.repeat(np.arange(n), counts), col] = pnl
+    ## padded with 0, the running pnl stays flat after the end of a game
+    run = np.cumsum(m, axis=1)
+    peak = np.maximum.accumulate(np.maximum(run, 0), axis=1)
+    wins = np.add.reduceat((pnl > 0).astype(float), starts)
+    return wins, run.min(axis=1), np.max(peak - run, axis=1)
+
+
+def _weights(wins: np.ndarray, counts: np.ndarray, p: float, q: float) -> np.ndarray:
+    return np.exp(wins * np.log(p / q) + (counts - wins) * np.log((1 - p) / (1 - q)))
+
+
+def _sample(sim, q: float, streams, batch: bool, kernel: bool, loss: float, drawdown: float) -> Tuple[np.ndarray, ...]:
+    '''weights and ruin / drawdown indicators of the games of the streams played with winning ratio q'''
+    twin = sim.tilted(q)
+    ws, ruin, dd = [], [], []
+    for stream in streams:
+        pnl, counts = twin.play(stream, batch, kernel)
+        wins, low, mdd = _paths(pnl, counts)
+        ws.append(_weights(wins, counts, sim.wlRatio, q))
+        ruin.append(low <= -loss * sim.balance)
+        dd.append(mdd >= drawdown * sim.balance if drawdown is not None else np.zeros(len(counts), dtype=bool))
+    return np.concatenate(ws), np.concatenate(ruin), np.concatenate(dd)
+
+
+def chooseTilt(sim, loss: float = 1.0, pilot: int = 10000, grid: int = 10, batch: bool = None, kernel: bool = False,
+               seed: int = None) -> float:
+    '''winning ratio in (0, p] with the smallest relative variance of the ruin estimate on pilot games,
+    all candidates play the same pilot draws
+
+    batch: use the batch engine, default when the strategy supports it
+    '''
+    batch = sim.batchable if batch is None else batch
+    p = sim.wlRatio
+    root = child(sim.seed if seed is None else seedSequence(seed), 4)
+    best, ret = np.inf, p / grid
+    for q in p * np.arange(1, grid + 1) / grid:
+        w, hit, _ = _sample(sim, q, [OutcomeStream(root, pilot)], batch, kernel, loss, None)
+        est = np.mean(w * hit)
+        if est > 0:
+            rel = np.var(w * hit) / est ** 2
+            if rel < best:
+                best, ret = rel, q
+    if not np.isfinite(best):
+        logging.warning('tail: no ruin in the pilot run at any tilt, use winning ratio {:.4f}'.format(ret))
+    logging.info('tail: winning ratio {} tilted to {:.4f}'.format(p, ret))
+    return ret
+
+
+def tailRisk(sim, loss: float = 1.0, drawdown: float = None, tilt: float = None, batch: bool = None,
+             kernel: bool = False, seed: int = None, pilot: int = 10000) -> Dict[str, Reduction]:
+    '''probability that a game loses loss times the init balance at some point (ruin),
+    and that its drawdown from its running peak reaches drawdown times the init balance
+
+    sim: BinarySim, its N games are played tilted
+    tilt: winning ratio played, default chooseTilt on pilot games
+    batch: use the batch engine, default when the strategy supports it
+    return: Reduction per estimate, naiveSe is the plain monte carlo standard error
+            of the same probability on the same num of games, relErr the relative error
+    '''
+    batch = sim.batchable if batch is None else batch
+    if tilt is None:
+        tilt = chooseTilt(sim, loss, pilot, batch=batch, kernel=kernel, seed=seed)
+    w, ruin, dd = _sample(sim, tilt, sim.streams(seed), batch, kernel, loss, drawdown)
+    n = len(w)
+    logging.info('tail: mean likelihood ratio {:.4f} over {} games'.format(np.mean(w), n))
+
+    ret = {}
+    for name, hit in (('ruin', ruin), ('drawdown', dd)):
+        if name == 'drawdown' and drawdown is None:
+            continue
+        x = w * hit
+        est = np.mean(x)
+        r = Reduction(est, np.std(x, ddof=1) / np.sqrt(n), np.sqrt(est * (1 - est) / n), n)
+        logging.info('tail {}: {}, relative error {:.3g}'.format(name, r, r.relErr))
+        ret[name] = r
+    return ret
@@ -0,0 +1,74 @@
+# coding=utf-8
+import functools
+import importlib.util
+import logging
+from typing import Callable, Tuple
+
+import numpy as np
+
+from simulation.ragged import Ragged
+
+'''Compiled game kernels
+
+a kernel plays many games per call over the uniform head buffer of an
+OutcomeStream: kernel(u, pnl, n) writes the trades of game i to pnl[i, :n[i]],
+or n[i] = -1 when the game outlives the buffer, those few games are replayed by
+the python game() on the same stream so both paths give identical results.
+
+numba is optional, without it njit is a no-op and run(kernel=True) falls back
+to the python game() loop. numba itself is only imported when a kernel is first
+called, kernels must not call other jitted functions.
+'''
+
+HAS_NUMBA = importlib.util.find_spec('numba') is not None
+
+
+def njit(*args, **kwargs):
+    '''numba.njit compiled on the first call, used as @njit or @njit(cache=True)'''
+    def wrap(fn):
+        if not HAS_NUMBA:
+            return fn
+        compiled = []
+
+        @functools.wraps(fn)
+        def call(*a):
+            if not compiled:
+                import numba
+                compiled.append(numba.njit(**kwargs)(fn))
+            return compiled[0](*a)
+        return call
+
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return wrap(args[0])
+    return wrap
+
+
+def playKernel(sim, stream, kernel: Callable = None) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    sim: MCSimulation implementing kernel
+    kernel: kernel(u, pnl, n) used instead of sim.kernel, playing the same games
+    return: flat per-trade pnl in game order, num of trades per game
+    '''
+    u = stream.head(slice(None), slice(None))
+    pnl = np.empty_like(u)
+    n = np.empty(stream.n, dtype=np.int64)
+    (sim.kernel if kernel is None else kernel)(u, pnl, n)
+
+    over = np.flatnonzero(n < 0)
+    replay = Ragged()
+    for i in over.tolist():
+        sim.playGame(stream.game(i), replay)
+    if len(over):
+        logging.info('kernel: {} games outlived the buffer, replayed in python'.format(len(over)))
+    counts = n.copy()
+    counts[over] = replay.counts
+
+    starts = np.cumsum(counts) - counts
+    ret = np.empty(np.sum(counts))
+    normal = n >= 0
+    inner = n[normal]
+    offset = np.repeat(starts[normal] - (np.cumsum(inner) - inner), inner)
+    ret[offset + np.arange(len(offset))] = pnl[np.arange(u.shape[1]) < n[:, None]]
+    for i, x in zip(over.tolist(), replay):
+        ret[starts[i]:starts[i] + len(x)] = x
+    return ret, counts
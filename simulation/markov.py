@@ -0,0 +1,165 @@
+# coding=utf-8
+import logging
+from typing import List, Tuple
+
+import numpy as np
+
+'''Exact evaluator for position sizing games on a discrete return distribution
+
+the batch hooks (batchInit/batchStep) of a strategy already describe its game as
+a state machine. Instead of sampling, every state is branched on every outcome
+with its probability and identical (state, pnl) rows are merged, which is the
+finite-state Markov chain of the game. Games that can run forever (SimV3,
+SimV4) are cut at maxSteps and the unfinished mass is reported.
+
+rows are merged on their values rounded to `decimals`, exact while they stay
+below 2 ** 53 / 10 ** decimals. Deep loss chains grow the position past that
+(and on to inf), their pnl loses every digit, so a row whose pnl, stake or
+state leaves the range is not followed and its mass is counted as truncated.
+'''
+
+
+class GameDistribution(object):
+    '''
+    pnl: distinct game pnl, ascending
+    prob: probability of each pnl
+    low: lowest running pnl within the game, per finished row
+    lowProb: probability of each low row
+    length: probability of game length 1, 2, ...
+    truncated: probability of games not finished within maxSteps (or dropped by tol)
+    '''
+    def __init__(self, pnl: np.ndarray, prob: np.ndarray, low: np.ndarray, lowProb: np.ndarray,
+                 length: np.ndarray, truncated: float) -> None:
+        self.__pnl = pnl
+        self.__prob = prob
+        self.__low = low
+        self.__lowProb = lowProb
+        self.__length = length
+        self.__truncated = truncated
+
+    @property
+    def pnl(self) -> np.ndarray:
+        return self.__pnl
+
+    @property
+    def prob(self) -> np.ndarray:
+        return self.__prob
+
+    @property
+    def length(self) -> np.ndarray:
+        return self.__length
+
+    @property
+    def truncated(self) -> float:
+        return self.__truncated
+
+    @property
+    def mean(self) -> float:
+        '''expected game pnl of the finished games'''
+        return np.sum(self.__pnl * self.__prob) / np.sum(self.__prob)
+
+    @property
+    def var(self) -> float:
+        return np.sum((self.__pnl - self.mean) ** 2 * self.__prob) / np.sum(self.__prob)
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self.var)
+
+    @property
+    def meanLength(self) -> float:
+        n = np.arange(1, len(self.__length) + 1)
+        return np.sum(n * self.__length) / np.sum(self.__length)
+
+    def cdf(self, x: float) -> float:
+        '''P(game pnl <= x)'''
+        return np.sum(self.__prob[self.__pnl <= x])
+
+    def tail(self, loss: float) -> float:
+        '''P(game pnl <= -loss)'''
+        return self.cdf(-loss)
+
+    def ruin(self, loss: float) -> float:
+        '''P(running pnl within the game reaches -loss), lower bound when truncated'''
+        return np.sum(self.__lowProb[self.__low <= -loss])
+
+
+def _merge(cols: List[np.ndarray], prob: np.ndarray, decimals: int) -> Tuple[np.ndarray, np.ndarray]:
+    '''merge identical rows, return index of a representative row and the summed prob'''
+    keys = np.column_stack([np.round(c, decimals) for c in cols])
+    _, idx, inv = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return idx, np.bincount(inv.ravel(), weights=prob, minlength=len(idx))
+
+
+def _exact(x: np.ndarray, limit: float) -> np.ndarray:
+    '''finite and below limit, where the rounding of _merge is exact'''
+    with np.errstate(invalid='ignore'):
+        return np.abs(x) < limit
+
+
+def evaluate(sim, maxSteps: int = 1000, tol: float = 0.0, outcomes: List[Tuple[float, float]] = None,
+             decimals: int = 8) -> GameDistribution:
+    '''exact game pnl distribution of a batchable strategy
+
+    sim: MCSimulation with batchInit/batchStep, e.g. childSim1_0, childSim2, SimV3, SimV4
+    maxSteps: max trades per game followed
+    tol: drop paths with probability below tol, counted in truncated
+    outcomes: (prob, pnl rate) of each outcome, default the two outcomes of a BinarySim
+    decimals: pnl rounding used to merge identical states, rows beyond 2 ** 53 / 10 ** decimals are truncated
+    '''
+    if outcomes is None:
+        if sim.source is not None:
+            raise ValueError('give the outcomes of the returns of {}'.format(sim.source))
+        rates = sim.outcome(np.array([0.0, 1.0]))
+        outcomes = [(sim.wlRatio, rates[0]), (1 - sim.wlRatio, rates[1])]
+
+    state = sim.batchInit(1)
+    prob, pnl, low = np.ones(1), np.zeros(1), np.zeros(1)
+    done = []
+    length = []
+    truncated = 0.0
+    limit = 2.0 ** 53 / 10.0 ** decimals
+    for t in range(maxSteps):
+        if not len(prob):
+            break
+        nxt = []
+        finished = 0.0
+        for q, r in outcomes:
+            st = {key: val.copy() for key, val in state.items()}
+            a = sim.balance * st['pos'] * r
+            keep = sim.batchStep(st, a, t)
+            p, v = prob * q, pnl + a
+            lo = np.minimum(low, v)
+            exact = _exact(v, limit)
+            follow = keep & exact & _exact(sim.balance * st['pos'], limit)
+            for val in st.values():
+                follow &= _exact(val, limit)
+            end = ~keep & exact
+            truncated += np.sum(p[~(end | follow)])
+            done.append((v[end], lo[end], p[end]))
+            finished += np.sum(p[end])
+            nxt.append(({key: val[follow] for key, val in st.items()}, p[follow], v[follow], lo[follow]))
+        length.append(finished)
+
+        state = {key: np.concatenate([x[0][key] for x in nxt]) for key in state}
+        prob = np.concatenate([x[1] for x in nxt])
+        pnl = np.concatenate([x[2] for x in nxt])
+        low = np.concatenate([x[3] for x in nxt])
+        if len(prob):
+            idx, prob = _merge(list(state.values()) + [pnl, low], prob, decimals)
+            state = {key: val[idx] for key, val in state.items()}
+            pnl, low = pnl[idx], low[idx]
+        if tol:
+            small = prob < tol
+            truncated += np.sum(prob[small])
+            state = {key: val[~small] for key, val in state.items()}
+            prob, pnl, low = prob[~small], pnl[~small], low[~small]
+    truncated += np.sum(prob)
+    logging.info('markov: {} steps, {} open states, truncated mass {:.3e}'.format(len(length), len(prob), truncated))
+
+    v = np.concatenate([x[0] for x in done])
+    lo = np.concatenate([x[1] for x in done])
+    p = np.concatenate([x[2] for x in done])
+    idx, vp = _merge([v], p, decimals)
+    order = np.argsort(v[idx])
+    return GameDistribution(v[idx][order], vp[order], lo, p, np.array(length), truncated)
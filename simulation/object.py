@@ -1,16 +1,35 @@
 # coding=utf-8
+import copy
+import inspect
 import logging
-from typing import List
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Tuple
 from abc import ABC, abstractmethod
 
 import numpy as np
-import pandas as pd
-from multiprocessing import Pool
+
+from simulation.adaptive import AdaptiveResult, curvesAdaptive, runAdaptive
+from simulation.bootstrap import Bootstrap
+from simulation.compound import compoundBalance
+from simulation.engine import OutcomeStream, playBatch
+from simulation.executor import Executor, getExecutor
+from simulation.kernel import HAS_NUMBA, playKernel
+from simulation.plot import POINTS, figure, output, series
+from simulation.portfolio import PortfolioResult
+from simulation.portfolio import simulate as simulatePortfolio
+from simulation.profiler import NULL, Profiler
+from simulation.ragged import Ragged
+from simulation.rng import child, generator, seedSequence, spawn
+from simulation.shared import release, sharedMatrix, sharedPath
+from simulation.store import ResultStore, jsonable
+from simulation.stream import RunStat
+from simulation.utils import calcPerformance, calcPerformances
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+##  pandas is imported by the DataFrame methods and matplotlib by simulation.plot once a figure is drawn, to keep the package import light
 #import matplotlib as mpl
 #mpl.use('Tkagg')
-import matplotlib.pyplot as plt
-
-from simulation.utils import calcPerformance
 
 
 
@@ -19,18 +38,57 @@ class MCSimulation(ABC):
 
     balance: init balance 
     initPos: init position
+    seed: root SeedSequence, children: 0 games of run, 1 strategies of
+          __call__/generateGDF, 2 strategies of generateDF, 3 compoundPath,
+          4 importance sampling pilot, 5 generatePortfolio
+    trace: TraceSink recording every trade of game(), None to disable
+    compound: the trades are still sized off the init balance by the strategy, every curve
+              (run, runStream, __call__, generateDF) compounds their pnl / balance as a return
+              on the current equity instead of adding the pnl
+    ruin: compounding ruin level as a fraction of the init balance, absorbing
+    cache: ResultCache of the results of run/generateGDF/generateDF, None to disable
+    version: part of the cache key, bump it to drop the cached results of a strategy
+    antithetic: the second half of the games of every chunk replay the draws 1 - u of the first half,
+                see variance.antithetic
+    profiler: Profiler timing the phases of run/getStat/__call__/generateGDF/generateDF, None to disable
+    source: Bootstrap of historical trade returns the outcome()/simu() of the strategy draw from instead
+            of its own distribution, None for the synthetic one, see bootstrap. Only strategies whose
+            outcome() decodes the resampled draws replay it (bootstrappable, e.g. BinarySim), the
+            others raise instead of treating the draws as plain uniforms
     '''
-    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int) -> None:
+    chunk = 10000   ## num of games per outcome stream, fixed so results do not depend on cores
+    trace = None
+    compound = False
+    ruin = 0.0
+    cache = None
+    version = 0
+    antithetic = False
+    profiler = None
+    source: Bootstrap = None
+    unkeyed = ('trace', 'cache', 'profiler')    ## class settings that do not change the results, see settings
+
+    def __new__(cls, *args, **kwargs):
+        ## keep the constructor params of any child class, see params
+        obj = super().__new__(cls)
+        bound = inspect.signature(cls.__init__).bind_partial(obj, *args, **kwargs)
+        bound.apply_defaults()
+        obj.__params = dict(list(bound.arguments.items())[1:])
+        return obj
+
+    def __init__(self, InitBalance: float, InitPos: float, N: int, K: int, Seed: int = None) -> None:
         '''
         InitBalance: init balance
         InitPos: init position
         N: total num of simulation
         K: local cum num of trading
+        Seed: random seed, None for fresh entropy
         '''
         self.__balance = InitBalance
         self.__initPos = InitPos
         self.__totalCount = N
         self.__accmuCount = K
+        self.__seed = seedSequence(Seed)
+        self.__reproducible = Seed is not None
 
     @property
     def balance(self) -> float:
@@ -40,115 +98,437 @@ class MCSimulation(ABC):
     def initPos(self) -> float:
         return self.__initPos
 
+    @property
+    def seed(self) -> np.random.SeedSequence:
+        return self.__seed
+
+    @property
+    def params(self) -> dict:
+        '''constructor params of the instance, defaults included'''
+        return dict(self.__params)
+
+    @property
+    def reproducible(self) -> bool:
+        '''seeded explicitly, the results can be cached'''
+        return self.__reproducible
+
+    def describe(self) -> dict:
+        '''json metadata of the strategy: class, params and seed'''
+        cls = type(self)
+        return {'class': '{}.{}'.format(cls.__module__, cls.__qualname__), 'params': jsonable(self.__params),
+                'seed': jsonable(self.__seed), 'settings': self.settings()}
+
+    def settings(self) -> dict:
+        '''json values of every public class level setting of the strategy and its bases, as seen by the instance,
+        except unkeyed, e.g. chunk, compound, ruin, antithetic, source, version, SimV4.multi
+        '''
+        ret = {}
+        for cls in type(self).__mro__:
+            for k, v in vars(cls).items():
+                if (k.startswith('_') or k in ret or k in self.unkeyed or k == 'unkeyed' or callable(v)
+                        or isinstance(v, (property, classmethod, staticmethod))):
+                    continue
+                v = getattr(self, k)
+                ret[k] = jsonable(v.describe() if hasattr(v, 'describe') else v)
+        return dict(sorted(ret.items()))
+
+    @property
+    def batchable(self) -> bool:
+        '''child class implements the batch mode hooks'''
+        return type(self).batchStep is not MCSimulation.batchStep
+
+    @property
+    def compiled(self) -> bool:
+        '''child class implements a game kernel and numba is available'''
+        return HAS_NUMBA and type(self).kernel is not MCSimulation.kernel
+
+    @property
+    def bootstrappable(self) -> bool:
+        '''child class maps its draws through source, see bootstrap'''
+        return False
+
+    def checkSource(self) -> None:
+        '''raise when a source is set on a strategy that does not replay it'''
+        if self.source is not None and not self.bootstrappable:
+            raise ValueError('{} draws from its own distribution, it does not replay {}'.format(
+                type(self).__name__, self.source))
+
+    def streams(self, seed: int = None) -> Iterator[OutcomeStream]:
+        '''outcome streams of the N games, one per `chunk` games
+        seed: overrides the instance seed
+        '''
+        self.checkSource()
+        root = self.__seed if seed is None else seedSequence(seed)
+        n = self.__totalCount
+        for c, ss in enumerate(spawn(child(root, 0), -(-n // self.chunk))):
+            yield OutcomeStream(ss, min(self.chunk, n - c * self.chunk), antithetic=self.antithetic, source=self.source)
+
+    def strategySeeds(self, cnt: int) -> List[np.random.SeedSequence]:
+        '''seeds of the strategy curves of __call__/generateGDF'''
+        return spawn(child(self.__seed, 1), cnt)
+
+    def generator(self, seed) -> np.random.Generator:
+        '''generator of a strategy curve, drawing one bootstrap path when the source resamples blocks'''
+        self.checkSource()
+        rng = generator(seed)
+        return rng if self.source is None else self.source.wrap(rng)
+
     @abstractmethod
-    def simu(self) -> float:
+    def simu(self, rng) -> float:
         # abstract method implemented in the child class
+        # rng: np.random.Generator or GameStream, draw with rng.random()
         logging.error('not implemented func for child class')
         raise NotImplementedError('Need implemented for child class')
 
     @abstractmethod
-    def game(self) -> List[float]:
+    def game(self, rng, out: Ragged) -> None:
         # abstract method implemented in the child class
+        # append the pnl of every trade of one game to out with out.append
         logging.error('not implemented func for child class')
         raise NotImplementedError('Need implemented for child class')
 
-    def run(self) -> None:
+    def playGame(self, rng, out: Ragged) -> None:
+        '''play one game into a new row of out, game() returning its trades as a list still works'''
+        out.start()
+        ret = self.game(rng, out)
+        if ret is not None:
+            out.extend(ret)
+
+    def outcome(self, u: np.ndarray) -> np.ndarray:
+        '''return distribution for the batch engine
+        u: uniform draws in [0, 1), same draw simu() maps for a single trade
+        '''
+        logging.error('not implemented func for batch mode')
+        raise NotImplementedError('Need implemented for batch mode')
+
+    def outcomeMean(self) -> float:
+        '''mean of the return distribution, midpoint rule over outcome(), child class may give it exactly'''
+        m = 1 << 16
+        return float(np.mean(self.outcome((np.arange(m) + 0.5) / m)))
+
+    def rate(self, pnl: np.ndarray) -> np.ndarray:
+        '''return rate of each trade recovered from its pnl, pnl / rate is the stake, see variance.controlVariate'''
+        logging.error('not implemented func for control variates')
+        raise NotImplementedError('Need implemented for control variates')
+
+    def batchInit(self, n: int) -> dict:
+        '''position sizing state for n games, a dict of arrays, 'pos' is required'''
+        logging.error('not implemented func for batch mode')
+        raise NotImplementedError('Need implemented for batch mode')
+
+    def batchStep(self, state: dict, a: np.ndarray, t: int) -> np.ndarray:
+        '''update state in place after trade t with pnl a
+        return: mask of the games still running
+        '''
+        logging.error('not implemented func for batch mode')
+        raise NotImplementedError('Need implemented for batch mode')
+
+    def kernel(self, u: np.ndarray, pnl: np.ndarray, n: np.ndarray) -> None:
+        '''compiled game loop over the uniform buffer u (games, block)
+        write the trades of game i to pnl[i, :n[i]], n[i] = -1 when game i needs more than block draws
+        '''
+        logging.error('not implemented func for kernel mode')
+        raise NotImplementedError('Need implemented for kernel mode')
+
+    def games(self, batch: bool = False, seed: int = None, kernel: bool = False) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        '''play the N games chunk by chunk
+        kernel: use the compiled kernel, python game() when numba is not installed
+        yield: flat per-trade pnl of the chunk, num of trades per game
+        '''
+        if kernel and not self.compiled:
+            logging.warning('no compiled kernel, fall back to python game()')
+            kernel = False
+        for stream in self.streams(seed):
+            yield self.play(stream, batch, kernel)
+
+    def play(self, stream: OutcomeStream, batch: bool = False, kernel: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        '''play every game of one outcome stream
+        return: flat per-trade pnl, num of trades per game
+        '''
+        if kernel:
+            return playKernel(self, stream)
+        if batch:
+            return playBatch(self, stream)
+        ret = Ragged()
+        for i in range(stream.n):
+            self.playGame(stream.game(i), ret)
+        return ret.data, ret.counts
+
+    def run(self, batch: bool = False, seed: int = None, kernel: bool = False, store: ResultStore = None) -> None:
         '''public method to get internal pnl and balance
         calc data in the method
+
+        batch: advance all games at once with outcome/batchInit/batchStep
+        seed: overrides the instance seed, same seed gives the same per-trade pnl in all modes
+        kernel: play the games with the compiled kernel
+        store: also save the pnl, trade counts and balance curves into the store
+        '''
+        def play() -> dict:
+            chunks = list(self.games(batch, seed, kernel))
+            return {'pnl': np.concatenate([x for x, _ in chunks]), 'counts': np.concatenate([x for _, x in chunks])}
+        ## batch and kernel give the same pnl so they share the key, antithetic changes the draws;
+        ## compound is keyed through settings() although only the rebuilt balances depend on it
+        with self.phase('simulate'):
+            res, hit = self.cached('run', {'seed': seed, 'antithetic': self.antithetic}, play)
+        pnl, counts = res['pnl'], res['counts']
+        if self.profiler is not None and not hit:
+            self.profiler.count(len(counts), len(pnl))
+
+        with self.phase('aggregate'):
+            self._pnl = Ragged.fromCounts(pnl, counts)
+            self.__pnl = np.add.reduceat(pnl, np.cumsum(counts) - counts)
+            self._balances = self.curve(pnl)                                                ## each trading
+            if self.compound:
+                self.__balances = self._balances[np.insert(np.cumsum(counts), 0, 0)]
+            else:
+                self.__balances = np.cumsum(np.insert(self.__pnl, 0, self.__balance))       ## each gamer
+
+        with self.phase('partial'):
+            self.__groupInt = len(pnl) // self.__accmuCount
+            partialPnL = pnl[:self.__groupInt * self.__accmuCount].reshape(self.__groupInt, self.__accmuCount)
+            self._partialPnL = np.mean(partialPnL, axis=1)
+            self._partialBalance = self.curve(self._partialPnL)
+
+        if store is not None:
+            for name, arr in (('pnl', pnl), ('counts', counts), ('gamePnL', self.__pnl), ('balances', self._balances),
+                              ('gamerBalances', self.__balances), ('partialPnL', self._partialPnL),
+                              ('partialBalances', self._partialBalance)):
+                store.put(name, arr)
+            store.flush()
+
+    def runAdaptive(self, targets: Dict[str, float], maxGames: int = None, level: float = 0.95, batch: bool = False,
+                    kernel: bool = False, seed: int = None, minBatches: int = 10, maxTime: float = None) -> AdaptiveResult:
+        '''play chunks of games until the confidence interval of every targeted metric is narrow enough,
+        see adaptive.runAdaptive
+
+        targets: max half width per metric, e.g. {'pnl': 0.01, 'mdd95': 0.005}
+        maxGames: budget of games, default 10 N
         '''
-        self._pnl = [self.game() for _ in range(self.__totalCount)]
-        self.__pnl = np.array([sum(x) for x in self._pnl])
-        self._balances = np.cumsum(np.insert(sum(self._pnl, []), 0, self.__balance))    ## each trading
-        self.__balances = np.cumsum(np.insert(self.__pnl, 0, self.__balance))           ## each gamer
-
-        pnl = np.array(sum(self._pnl, []))
-        cnt = len(pnl)
-        self.__groupInt = cnt // self.__accmuCount
-        if cnt % self.__accmuCount:
-            subsetInt = self.__groupInt * self.__accmuCount
-            partialPnL = np.split(pnl[:subsetInt], self.__groupInt)
-        else:
-            partialPnL = np.split(pnl, self.__groupInt)
-        
-        self._partialPnL = np.mean(partialPnL, axis=1)
-        self._partialBalance = np.cumsum(np.insert(self._partialPnL, 0, self.__balance))
-
-    def getStat(self) -> None:
+        return runAdaptive(self, targets, maxGames or 10 * self.__totalCount, level, batch, kernel, seed,
+                           minBatches=minBatches, maxTime=maxTime)
+
+    def curvesAdaptive(self, rows: int, targets: Dict[str, float], maxCurves: int = 1000, level: float = 0.95,
+                       cores: int = 2, executor: Executor = None, maxTime: float = None) -> AdaptiveResult:
+        '''add generateGDF strategy curves until the targets are met, see adaptive.curvesAdaptive'''
+        return curvesAdaptive(self, rows, targets, maxCurves, level, executor=executor, cores=cores, maxTime=maxTime)
+
+    def phase(self, name: str):
+        '''context timing the phase name when the profiler is set'''
+        return NULL if self.profiler is None else self.profiler.phase(name)
+
+    def profile(self, method: str = 'run', *args, cprofile: bool = False, memory: bool = False, **kwargs) -> dict:
+        '''call the method with a new profiler, see profiler.Profiler
+
+        method: name of the method, e.g. run, getStat, generateGDF
+        cprofile: also run cProfile, the report keeps the top functions
+        memory: trace the allocations with tracemalloc, the report gets the peak bytes of every phase
+        return: report of the call, the whole call is the phase total, the generateGDF workers are under workers
+        '''
+        prev = vars(self).pop('profiler', None)
+        self.profiler = Profiler(cprofile, memory)
+        try:
+            with self.phase('total'):
+                getattr(self, method)(*args, **kwargs)
+            self.profiler.log()
+            return self.profiler.report()
+        finally:
+            del self.profiler
+            if prev is not None:
+                self.profiler = prev
+
+    def cached(self, method: str, args: dict, fn: Callable[[], dict]) -> Tuple[dict, bool]:
+        '''result arrays of fn() through the cache, when set and the instance is seeded
+        method, args: name and arguments of the cached call, part of the key
+        return: arrays, whether they come from the cache
+        '''
+        if self.cache is None or not self.__reproducible:
+            return fn(), False
+        key = self.cache.key(self, method, args)
+        ret = self.cache.get(key)
+        if ret is not None:
+            return ret, True
+        ret = fn()
+        self.cache.put(key, ret, self.describe())
+        return ret, False
+
+    def runStream(self, batch: bool = False, seed: int = None, keep: bool = False, every: int = 1,
+                  kernel: bool = False, store: ResultStore = None) -> RunStat:
+        '''run() in constant memory, games are consumed chunk by chunk
+        and all statistics are updated incrementally
+
+        keep: keep the balance series
+        every: keep one point out of every, to downsample for plotting
+        kernel: play the games with the compiled kernel
+        store: stream the per-trade pnl, trade counts and game pnl into the store, see loadStream
+        '''
+        if store is not None:
+            for name in ('pnl', 'counts', 'gamePnL'):
+                if name in store:
+                    del store[name]
+        stat = RunStat(self.__balance, self.__accmuCount, keep, every, self.compound, self.ruin)
+        for pnl, counts in self.games(batch, seed, kernel):
+            stat.update(pnl, counts)
+            if store is not None:
+                store.append('pnl', pnl)
+                store.append('counts', counts)
+                store.append('gamePnL', np.add.reduceat(pnl, np.cumsum(counts) - counts))
+        if store is not None:
+            store.flush()
+        return self.__logStat(stat)
+
+    def loadStream(self, store: ResultStore, keep: bool = False, every: int = 1) -> RunStat:
+        '''runStream statistics of the games saved in a store, read chunk by chunk
+        from the memmapped columns, nothing is simulated again
+        '''
+        me = self.describe()
+        if store.meta.get('class') != me['class'] or store.meta.get('params') != me['params']:
+            logging.warning('store {} was written by another strategy: {}'.format(store.path, store.meta))
+        pnl, counts = store['pnl'], store['counts']
+        ends = np.cumsum(counts)
+        stat = RunStat(self.__balance, self.__accmuCount, keep, every, self.compound, self.ruin)
+        for g in range(0, len(counts), self.chunk):
+            s = ends[g - 1] if g else 0
+            c = np.asarray(counts[g:g + self.chunk])
+            stat.update(np.asarray(pnl[s:s + np.sum(c)]), c)
+        return self.__logStat(stat)
+
+    def __logStat(self, stat: RunStat) -> RunStat:
+        logging.info('{} games, {} trades, partial winning ratio: {:.4f}, profit loss ratio: {:.4f}'.format(
+                        stat.games, stat.trades, stat.partialWRatio, stat.partialPLR))
+        self._stat = stat
+        return stat
+
+    def curve(self, pnl: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        '''balance curve of the pnl, the init balance first
+        additive cumsum, or compounded on the current equity when compound is set
+        out: write the balances into out instead of a new array
+        '''
+        if not self.compound:
+            return np.cumsum(np.insert(pnl, 0, self.__balance), out=out)
+        if out is None:
+            out = np.empty(len(pnl) + 1)
+        out[0] = self.__balance
+        compoundBalance(pnl / self.__balance, self.__balance, self.ruin * self.__balance, out=out[1:])
+        return out
+
+    def compoundPath(self, rows: int, seed: np.random.SeedSequence = None, pos: float = None,
+                     out: np.ndarray = None, chunk: int = 1 << 20) -> np.ndarray:
+        '''compounding curve of a fixed fraction of the equity staked on every trade,
+        drawn with outcome() and built in log space chunk by chunk, for strategies
+        whose sizing does not depend on the path
+
+        rows: num of points, the init balance first
+        seed: default the child 3 of the instance seed
+        pos: staked fraction of the equity, default initPos
+        out: write the balances into out instead of a new array
+        chunk: num of trades drawn at once
+        '''
+        rng = self.generator(child(self.__seed, 3) if seed is None else seed)
+        pos = self.__initPos if pos is None else pos
+        if out is None:
+            out = np.empty(rows)
+        ruin = self.ruin * self.__balance
+        out[0] = last = self.__balance
+        for s in range(1, rows, chunk):
+            e = min(s + chunk, rows)
+            compoundBalance(pos * self.outcome(rng.random(e - s)), last, ruin, out=out[s:e])
+            last = out[e - 1]
+        if last <= max(ruin, 0):
+            logging.info('compound path ruined at trade {}'.format(np.argmax(out <= max(ruin, 0))))
+        return out
+
+    def getStat(self, plot: str = None, points: int = POINTS) -> None:
         '''get performance for the simulation
         plot for the PnL and Drawdown
-        
-        #TODO(): update the plots
+
+        plot: image file of the PnL / drawdown plots, SHOW for the window, None for no plot
+        points: num of points per plotted series, see plot.decimate
         '''
         if not hasattr(self, '_pnl'):
             self.run()
-        logging.info('calc performance:')
-        p = calcPerformance(self._balances)
-        logging.info('calc gamer performance:')
-        ps = calcPerformance(self.__balances)
-        logging.info('calc partial performance:')
-        partialP = calcPerformance(self._partialBalance)
-        partialWRatio = np.sum(self._partialPnL > 0) / self.__groupInt
-        if np.sum(self._partialPnL < 0) < 1:
-            partialPLR = np.Infinity
-        else:
-            partialPLR = -np.sum(self._partialPnL[self._partialPnL > 0]) / np.sum(self._partialPnL[self._partialPnL < 0])
-        logging.info('partial winning ratio: {:.4f}, profit loss ratio: {:.4f}'.format(partialWRatio, partialPLR))
-
-        ax1 = plt.subplot(231)
-        ax1.plot(self._balances)
-        plt.xlim(0, len(self._balances))
-        plt.grid(axis='y')
-        plt.title('PnL')
-
-        ax2 = plt.subplot(232)
-        ax2.plot(self.__balances)
-        plt.xlim(0, self.__totalCount)
-        plt.grid(axis='y')
-        plt.title('Gamer PnL')
-        
-        ax3 = plt.subplot(233)
-        ax3.plot(self._partialBalance)
-        plt.xlim(0, self.__groupInt)
-        plt.grid(axis='y')
-        plt.title('Partial PnL')
-
-        ax4 = plt.subplot(234)
-        ax4.plot(-p.dd)
-        plt.xlim(0, len(p.dd))
-        plt.grid(axis='y')
-        plt.title('MaxDrawDown')
-
-        ax5 = plt.subplot(235)
-        ax5.plot(-ps.dd)
-        plt.xlim(0, self.__totalCount)
-        plt.grid(axis='y')
-        plt.title('Gamer MaxDrawDown')
-
-        ax6 = plt.subplot(236)
-        ax6.plot(-partialP.dd)
-        plt.xlim(0, self.__totalCount // self.__accmuCount)
-        plt.grid(axis='y')
-        plt.title('Partial MaxDrawDown')
-        plt.show()
+        with self.phase('performance'):
+            logging.info('calc performance:')
+            p = calcPerformance(self._balances)
+            logging.info('calc gamer performance:')
+            ps = calcPerformance(self.__balances)
+            logging.info('calc partial performance:')
+            partialP = calcPerformance(self._partialBalance)
+            partialWRatio = np.sum(self._partialPnL > 0) / self.__groupInt
+            if np.sum(self._partialPnL < 0) < 1:
+                partialPLR = np.inf
+            else:
+                partialPLR = -np.sum(self._partialPnL[self._partialPnL > 0]) / np.sum(self._partialPnL[self._partialPnL < 0])
+            logging.info('partial winning ratio: {:.4f}, profit loss ratio: {:.4f}'.format(partialWRatio, partialPLR))
+        if plot is None:
+            return
+
+        with self.phase('plot'):
+            fig, axes = figure(plot, 2, 3)
+            series(axes[0, 0], self._balances, 'PnL', points)
+            series(axes[0, 1], self.__balances, 'Gamer PnL', points)
+            series(axes[0, 2], self._partialBalance, 'Partial PnL', points)
+            series(axes[1, 0], -p.dd, 'MaxDrawDown', points)
+            series(axes[1, 1], -ps.dd, 'Gamer MaxDrawDown', points)
+            series(axes[1, 2], -partialP.dd, 'Partial MaxDrawDown', points)
+            output(fig, plot)
     
-    def __call__(self, rows: int) -> np.array:
-        n = 0
+    def __call__(self, rows: int, seed: np.random.SeedSequence = None, out: np.ndarray = None) -> np.array:
+        '''
+        rows: num of trade
+        seed: seed of the strategy, default the first of strategySeeds
+        out: write the balances into out instead of a new array
+        '''
         print('start to call.')
-        pnl = [self.__balance]
-        while(n < rows):
-            a = self.game()
-            n += len(a)
-            pnl.extend(a)
-        balances = np.cumsum(np.array(pnl[:rows]))
-        return balances
+        rng = self.generator(self.strategySeeds(1)[0] if seed is None else seed)
+        pnl = Ragged()
+        with self.phase('simulate'):
+            while(pnl.size < rows - 1):
+                self.playGame(rng, pnl)
+        if self.profiler is not None:
+            self.profiler.count(len(pnl), rows - 1)
+        with self.phase('aggregate'):
+            return self.curve(pnl.data[:rows - 1], out=out)
+
+    def fill(self, path: str, shape: tuple, col: int, rows: int, seed: np.random.SeedSequence) -> Tuple[int, dict]:
+        '''worker side of generateGDF, write one strategy into its column of the shared matrix
+        return: column, profiler report of the strategy or None
+        '''
+        sim = self
+        if self.profiler is not None:
+            ## own profiler per task, thread workers share the instance
+            sim = copy.copy(self)
+            sim.profiler = self.profiler.fresh()
+        data = sharedMatrix(path, *shape)
+        sim(rows, seed, out=data[:, col])
+        data.flush()
+        return col, (None if sim.profiler is None else sim.profiler.report())
+
+    def iterGDF(self, path: str, shape: tuple, cnt: int, executor: Executor, chunksize: int = None,
+                progress: Callable[[int, int], None] = None) -> Iterator[int]:
+        '''fill the first cnt columns of the shared matrix, yield the column of each strategy as soon as it is done
+        path, shape: shared matrix of sharedMatrix, shape[0] is the num of trade
+        '''
+        tasks = [(path, shape, i, shape[0], ss) for i, ss in enumerate(self.strategySeeds(cnt))]
+        for col, report in executor.imap(self.fill, tasks, progress, chunksize):
+            if report is not None and self.profiler is not None:
+                self.profiler.merge(report)
+            yield col
 
-    def generateGDF(self, cnt: int, rows: int, cores: int = 2, kwargs: dict = None) -> pd.DataFrame:
+    def generateGDF(self, cnt: int, rows: int, cores: int = 2, kwargs: dict = None, executor: Executor = None,
+                    chunksize: int = None, progress: Callable[[int, int], None] = None,
+                    store: ResultStore = None, plot: str = None, points: int = POINTS) -> 'pd.DataFrame':
         '''
         generate cnt random simulation profit curves(with game), and combined them into one new strategy
         cnt: num of strategy simulation
         rows: num of trade
-        cores: num of cpu process
+        cores: num of cpu process, used by the module level executor when no executor is given
         kwargs: params of plot
+        executor: pool to run the strategies on, kept alive between calls
+        chunksize: num of strategies sent to a worker at once
+        progress: called with (done, cnt) whenever a strategy is finished
+        store: the workers write the curves straight into its 'balances' column instead of a temporary file
+        plot: image file of the curves, SHOW for the window, None for no plot
+        points: num of points per plotted curve, see plot.decimate
 
         data = []
         pool = Pool(processes=cores)
@@ -165,60 +545,126 @@ class MCSimulation(ABC):
         pool.close()
         pool.join()
         '''
-        pool = Pool(processes=cores)
-        data = pool.map(self, [rows for _ in range(cnt)])
-        pool.close()
-        pool.join()
-        print('done')
-        ret = pd.DataFrame(data).T
-        cols = ['strategy{}'.format(i) for i in range(cnt)]
-        ret.columns = cols
-        logging.info(ret.corr())
-        ret = pd.concat([ret, ret.mean(axis=1)], axis=1)
-        cols = list(ret.columns)
-        cols[-1] = 'strategyM'
-        ret.columns = cols
-        ret.apply(calcPerformance)
-
-        _, axes = plt.subplots(2, 1, sharex=True)
-        params = ''
-        if kwargs:
-            params = 'initiative balance: {}, initiative position: {:.2%}, winning_rate: {:.0%}, WRatio/LRatio: {}/{}\nmax continous buy cnt: {}, flag: {}, total_strategy_num: {}.'.format(self.balance,
-                        self.initPos, kwargs.get('winning_rate', 0), kwargs.get('WRatio', 0), kwargs.get('LRatio', 0), 
-                        kwargs.get('max_contious_buy_cnt', 0), kwargs.get('flag', None), kwargs.get('total_strategy_num', None))
-        # fig = plt.figure(figsize=(29, 16))
-        ret.plot(grid='on', ax=axes[0], title='all game strategys\n' + params, legend=False)
-        # axes[0].legend(ncol=5, loc='best')
-        ret[['strategyM']].plot(grid='on', ax=axes[1], title='combined game strategy')
-        plt.show()
-        # plt.savefig('test.png', dpi=500, bbox_inches='tight')
+        import pandas as pd
+
+        shape = (rows, cnt + 1)
+        cols = ['strategy{}'.format(i) for i in range(cnt)] + ['strategyM']
+
+        def simulate() -> dict:
+            if store is None:
+                path = sharedPath()
+                data = sharedMatrix(path, *shape, mode='w+')
+            else:
+                path = store.file('balances')
+                data = store.create('balances', shape, labels=cols)
+            try:
+                for _ in self.iterGDF(path, shape, cnt, executor or getExecutor(cores), chunksize, progress):
+                    pass
+            finally:
+                if store is None:
+                    release(path)
+            print('done')
+            np.mean(data[:, :cnt], axis=1, out=data[:, cnt])
+            if store is not None:
+                data.flush()
+            return {'balances': data}
+        with self.phase('simulate'):
+            res, hit = self.cached('generateGDF', {'cnt': cnt, 'rows': rows, 'compound': self.compound,
+                                                   'ruin': self.ruin, 'antithetic': self.antithetic}, simulate)
+        data = res['balances']
+        if hit and store is not None:
+            store.put('balances', data, labels=cols)
+        with self.phase('aggregate'):
+            ret = pd.DataFrame(data, columns=cols, copy=False)
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info(ret.iloc[:, :cnt].corr())
+        with self.phase('performance'):
+            calcPerformances(data)
+        if plot is not None:
+            with self.phase('plot'):
+                self.__plotCurves(data, cols, 'all game strategys', 'combined game strategy', kwargs, plot, points)
         return ret
 
-    def generateDF(self, cnt: int, kwargs: dict) -> pd.DataFrame:
+    def generateDF(self, cnt: int, kwargs: dict, store: ResultStore = None, plot: str = None,
+                   points: int = POINTS) -> 'pd.DataFrame':
         '''
         generate cnt random simulation profit curves(no game), and combined them into one new strategy
+        store: also save the curves into its 'balances' column
+        plot, points: see generateGDF
         '''
-        data = []
-        for _ in range(cnt):
-            pnls = self.balance * self.initPos *  np.array([self.simu() for _ in range(self.__totalCount)])
-            balances = np.cumsum(np.insert(pnls, 0, self.balance))
-            data.append(balances)
-        ret = pd.DataFrame(data).T
-        cols = ['strategy{}'.format(i) for i in range(cnt)]
-        ret.columns = cols
-        logging.info(ret.corr())
-        ret = pd.concat([ret, ret.mean(axis=1)], axis=1)
-        cols = list(ret.columns)
-        cols[-1] = 'strategyM'
-        ret.columns = cols
-        ret.apply(calcPerformance)
-
-        # plt.figure(1)
-        _, axes = plt.subplots(2, 1, sharex=True)
-        params = 'initiative balance: {}, initiative position: {:.2%}, winning_rate: {:.0%}, WRatio/LRatio: {}/{}\nmax continous buy cnt: {}, flag: {}, total_strategy_num: {}.'.format(self.balance,
-                    self.initPos, kwargs.get('winning_rate', 0), kwargs.get('WRatio', 0), kwargs.get('LRatio', 0), 
-                    kwargs.get('max_contious_buy_cnt', 0), kwargs.get('flag', None), kwargs.get('total_strategy_num', None))
-        ret.plot(grid='on', ax=axes[0], title='all strategys\n' + params, legend=False)
-        # axes[0].legend(ncol=5, loc='best')
-        ret[['strategyM']].plot(grid='on', ax=axes[1], title='combined strategy')
+        import pandas as pd
+
+        def simulate() -> dict:
+            data = []
+            for ss in spawn(child(self.__seed, 2), cnt):
+                rng = self.generator(ss)
+                pnls = self.balance * self.initPos *  np.array([self.simu(rng) for _ in range(self.__totalCount)])
+                balances = self.curve(pnls)
+                data.append(balances)
+            return {'balances': np.column_stack(data)}
+        with self.phase('simulate'):
+            res, hit = self.cached('generateDF', {'cnt': cnt, 'compound': self.compound, 'ruin': self.ruin,
+                                                  'antithetic': self.antithetic}, simulate)
+        if self.profiler is not None and not hit:
+            self.profiler.count(0, cnt * self.__totalCount)
+        with self.phase('aggregate'):
+            ret = pd.DataFrame(res['balances'])
+            cols = ['strategy{}'.format(i) for i in range(cnt)]
+            ret.columns = cols
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info(ret.corr())
+            ret = pd.concat([ret, ret.mean(axis=1)], axis=1)
+            cols = list(ret.columns)
+            cols[-1] = 'strategyM'
+            ret.columns = cols
+        if store is not None:
+            store.put('balances', ret.values, labels=cols)
+            store.flush()
+        with self.phase('performance'):
+            calcPerformances(ret.values)
+        if plot is not None:
+            with self.phase('plot'):
+                self.__plotCurves(ret.values, cols, 'all strategys', 'combined strategy', kwargs, plot, points)
+        return ret
+
+    def generatePortfolio(self, cnt: int, rows: int, corr=0.0, loadings: np.ndarray = None,
+                          weights: np.ndarray = None, sizing: np.ndarray = None, seed: int = None,
+                          correlation: bool = True, plot: str = None, points: int = POINTS) -> PortfolioResult:
+        '''
+        generate cnt strategy curves with correlated trades, and combine them by weights into one portfolio,
+        generateDF with joint outcomes from a gaussian copula, in O(cnt ** 2) memory whatever rows, see portfolio,
+        about 1.7 * 10 ** 7 strategy-trades per second and core, 500 strategies over 10 ** 6 rows take about 30s
+        rows: num of trade
+        corr: equicorrelation of the copula, or a (cnt, cnt) correlation matrix
+        loadings: (cnt, K) factor loadings of the copula instead of corr
+        weights: capital weight per strategy, default equal
+        sizing: position per strategy, default initPos
+        correlation: track the pnl correlation matrix of the strategies
+        plot: image file of the portfolio equity, SHOW for the window, None for no plot
+        '''
+        with self.phase('simulate'):
+            ret = simulatePortfolio([self] * cnt, rows, corr, loadings, weights, sizing, self.compound, seed,
+                                    correlation, keep=plot is not None, every=max(1, rows // (8 * points)))
+        if self.profiler is not None:
+            self.profiler.count(0, cnt * rows)
+        with self.phase('performance'):
+            ret.performance()
+        if plot is not None:
+            with self.phase('plot'):
+                fig, ax = figure(plot, 1, 1)
+                series(ax, ret.equity.series, 'portfolio of {} strategies'.format(cnt), points)
+                output(fig, plot)
         return ret
+
+    def __plotCurves(self, data: np.ndarray, cols: List[str], title: str, combined: str, kwargs: dict, plot: str,
+                     points: int) -> None:
+        '''all strategy curves on top, the last (strategyM) below'''
+        params = ''
+        if kwargs:
+            params = 'initiative balance: {}, initiative position: {:.2%}, winning_rate: {:.0%}, WRatio/LRatio: {}/{}\nmax continous buy cnt: {}, flag: {}, total_strategy_num: {}.'.format(self.balance,
+                        self.initPos, kwargs.get('winning_rate', 0), kwargs.get('WRatio', 0), kwargs.get('LRatio', 0), 
+                        kwargs.get('max_contious_buy_cnt', 0), kwargs.get('flag', None), kwargs.get('total_strategy_num', None))
+        fig, axes = figure(plot, 2, 1, sharex=True)
+        series(axes[0], data, title + '\n' + params, points)
+        series(axes[1], data[:, -1], combined, points, labels=cols[-1:], legend=True)
+        output(fig, plot)
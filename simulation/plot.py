@@ -0,0 +1,85 @@
+# coding=utf-8
+from typing import List, Tuple
+
+import numpy as np
+
+'''Plotting of long balance / drawdown series
+
+series are decimated to about screen resolution before they reach matplotlib:
+every bucket keeps its min and its max point in order, plus the first and the
+last point of the series, so the peaks and the drawdown extremes of a 10^7
+point curve are drawn exactly with a few thousand points. Figures are rendered headless with the Agg canvas into a file, without
+pyplot and without blocking; plot='show' opens the interactive window instead,
+and no figure is created at all when no output is asked for.
+'''
+
+SHOW = 'show'
+POINTS = 2000
+
+
+def decimate(y: np.ndarray, points: int = POINTS) -> Tuple[np.ndarray, np.ndarray]:
+    '''min/max preserving downsampling
+    y: series
+    points: max num of points kept, 2 per bucket, plus the first and the last point, at least 2
+    return: index and value of the kept points
+    '''
+    if points < 2:
+        raise ValueError('{} points leave no bucket, keep at least 2'.format(points))
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= points:
+        return np.arange(n), y
+    size = -(-n // (points // 2))
+    cnt = -(-n // size)
+    pad = np.full(cnt * size, np.nan)
+    pad[:n] = y
+    buckets = pad.reshape(cnt, size)
+    base = np.arange(cnt) * size
+    lo = base + np.argmin(np.where(np.isnan(buckets), np.inf, buckets), axis=1)
+    hi = base + np.argmax(np.where(np.isnan(buckets), -np.inf, buckets), axis=1)
+    ## the curve starts at the real init balance and ends at the final one
+    idx = np.unique(np.concatenate([[0], lo, hi, [n - 1]]))
+    idx = idx[idx < n]
+    return idx, y[idx]
+
+
+def figure(plot: str, rows: int, cols: int, sharex: bool = False, figsize: tuple = (16, 9)):
+    '''
+    plot: file name, or SHOW for the interactive window
+    return: figure, axes
+    '''
+    if plot == SHOW:
+        import matplotlib.pyplot as plt
+
+        return plt.subplots(rows, cols, sharex=sharex, figsize=figsize)
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    return fig, fig.subplots(rows, cols, sharex=sharex)
+
+
+def output(fig, plot: str) -> None:
+    '''write the figure into the file plot, or show it'''
+    if plot == SHOW:
+        import matplotlib.pyplot as plt
+
+        plt.show()
+        return
+    fig.savefig(plot, dpi=150, bbox_inches='tight')
+
+
+def series(ax, y: np.ndarray, title: str = None, points: int = POINTS, labels: List[str] = None,
+           legend: bool = False) -> None:
+    '''decimated line of a series, or of every column of a (T, M) matrix
+    labels: one label per column
+    '''
+    y = np.asarray(y)
+    cols = y.reshape(len(y), -1)
+    for i in range(cols.shape[1]):
+        ax.plot(*decimate(cols[:, i], points), label=labels[i] if labels else None)
+    ax.set_xlim(0, max(len(y) - 1, 1))
+    ax.grid(True, axis='y')
+    if title:
+        ax.set_title(title)
+    if legend:
+        ax.legend(loc='best')
@@ -0,0 +1,219 @@
+# coding=utf-8
+import logging
+import math
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from simulation.kernel import HAS_NUMBA, njit
+from simulation.rng import child, generator, seedSequence
+from simulation.stream import CurveStat
+from simulation.utils import Performance
+
+'''Correlated multi-strategy portfolio
+
+generateDF / generateGDF play independent strategies and average them. Here
+the trade t outcomes of M strategies are drawn jointly from a gaussian copula:
+z = L f + s e with K common factors f and an own noise e per strategy, the
+uniform u = Phi(z) goes through the outcome() of each strategy, so every
+strategy keeps its own return distribution while their trades are
+correlated. corr gives one factor with loadings sqrt(corr) (equicorrelation),
+loadings any (M, K) factor model, a full (M, M) matrix is factored by
+Cholesky (slow for large M).
+
+trades are simulated block rows at a time: balances, the weighted portfolio
+equity, the per-strategy and portfolio performance and the pnl correlation
+matrix are all updated per block, memory stays O(block * M + M ** 2)
+whatever the num of trades. BLOCK is fixed, so the results only depend on the seed.
+
+throughput: 500 strategies over 10 ** 6 trades take about 30s on one core (22s
+with correlation=False), some 1.7 * 10 ** 7 strategy-trades per second. The
+normal draws and Phi are most of it, so the target is within a minute per core
+rather than seconds, pinned by the portfolio case of benchmarks/suite.py.
+'''
+
+BLOCK = 2048
+SQRT1_2 = 0.7071067811865476
+
+
+@njit(cache=True)
+def _ndtrKernel(z, out):
+    zf = z.ravel()
+    of = out.ravel()
+    for i in range(zf.size):
+        of[i] = 0.5 * math.erfc(-zf[i] * SQRT1_2)
+
+
+def ndtr(z: np.ndarray) -> np.ndarray:
+    '''standard normal cdf, compiled with numba or math.erfc per element'''
+    z = np.ascontiguousarray(z, dtype=float)
+    out = np.empty_like(z)
+    if HAS_NUMBA:
+        _ndtrKernel(z, out)
+    else:
+        out.ravel()[:] = np.frompyfunc(math.erfc, 1, 1)(-z.ravel() * SQRT1_2).astype(float) * 0.5
+    ## outcome() takes draws in [0, 1)
+    return np.minimum(out, np.nextafter(1.0, 0.0), out=out)
+
+
+class CorrStat(object):
+    '''incremental mean and covariance of M columns, chunks merged with Chan's formula'''
+    def __init__(self, m: int) -> None:
+        self.__n = 0
+        self.__mean = np.zeros(m)
+        self.__c = np.zeros((m, m))
+
+    @property
+    def n(self) -> int:
+        return self.__n
+
+    def update(self, x: np.ndarray) -> None:
+        n = len(x)
+        if not n:
+            return
+        mean = x.mean(axis=0)
+        xc = x - mean
+        total = self.__n + n
+        delta = mean - self.__mean
+        self.__c += xc.T @ xc + np.outer(delta, delta) * (self.__n * n / total)
+        self.__mean += delta * n / total
+        self.__n = total
+
+    @property
+    def cov(self) -> np.ndarray:
+        return self.__c / (self.__n - 1) if self.__n > 1 else np.full_like(self.__c, np.nan)
+
+    @property
+    def corr(self) -> np.ndarray:
+        d = np.sqrt(np.diag(self.__c))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.__c / np.outer(d, d)
+
+
+class PortfolioResult(object):
+    '''
+    equity: CurveStat of the weighted portfolio equity
+    strategies: column-wise CurveStat of the strategy balances
+    corr: correlation matrix of the per-trade pnl of the strategies, None when not tracked
+    weights: weight of every strategy
+    '''
+    def __init__(self, equity: CurveStat, strategies: CurveStat, corr: np.ndarray, weights: np.ndarray,
+                 init: np.ndarray, trades: int, elapsed: float) -> None:
+        self.equity = equity
+        self.strategies = strategies
+        self.corr = corr
+        self.weights = weights
+        self.__init = init
+        self.trades = trades
+        self.elapsed = elapsed
+
+    def performance(self) -> Performance:
+        '''portfolio performance, logged like calcPerformance'''
+        return self.equity.performance()
+
+    @property
+    def rtn(self) -> float:
+        return self.equity.balance / float(self.__init @ self.weights) - 1
+
+    def stats(self) -> Dict[str, np.ndarray]:
+        '''per strategy: avg, std of the returns, mdd, rtn and the final balance'''
+        s = self.strategies
+        return {'avg': s.avg, 'std': s.std, 'mdd': s.mdd, 'rtn': s.balance / self.__init - 1, 'balance': s.balance}
+
+    def frame(self) -> 'pd.DataFrame':
+        '''stats() per strategy as a DataFrame, the portfolio as the last row strategyM'''
+        import pandas as pd
+
+        ret = pd.DataFrame(self.stats(), index=['strategy{}'.format(i) for i in range(len(self.weights))])
+        e = self.equity
+        ret.loc['strategyM'] = [e.avg, e.std, e.mdd, self.rtn, e.balance]
+        return ret
+
+
+def factorModel(m: int, corr=0.0, loadings: np.ndarray = None) -> np.ndarray:
+    '''
+    (M, K) loadings of the copula factors from corr or loadings, rows with sum of squares <= 1
+    corr: equicorrelation in [0, 1], or an (M, M) correlation matrix
+    '''
+    if loadings is not None:
+        ret = np.asarray(loadings, dtype=float).reshape(m, -1)
+    elif np.ndim(corr):
+        corr = np.asarray(corr, dtype=float)
+        if corr.shape != (m, m):
+            raise ValueError('correlation matrix of shape {} for {} strategies'.format(corr.shape, m))
+        ## z = L f, no own noise
+        ret = np.linalg.cholesky(corr)
+    else:
+        if not 0 <= corr <= 1:
+            raise ValueError('equicorrelation {} out of [0, 1], give loadings or a matrix instead'.format(corr))
+        ret = np.full((m, 1), np.sqrt(corr))
+    if np.any(np.sum(ret ** 2, axis=1) > 1 + 1e-12):
+        raise ValueError('factor loadings explain more than the unit variance')
+    return ret
+
+
+def simulate(sims: Sequence, trades: int, corr=0.0, loadings: np.ndarray = None, weights: np.ndarray = None,
+             sizing: np.ndarray = None, compound: bool = False, seed: int = None, correlation: bool = True,
+             keep: bool = False, every: int = 1) -> PortfolioResult:
+    '''simulate the M strategies trade by trade with correlated outcomes
+
+    sims: MCSimulation per strategy, its outcome() maps the draws, its balance * initPos is the stake
+    trades: num of trades of every strategy
+    corr, loadings: copula, see factorModel
+    weights: capital weight of every strategy, default equal, the equity is the weighted sum of the balances
+    sizing: position of every strategy, default its initPos
+    compound: the trades return pos * outcome on the current balance, a balance at 0 is ruined
+    seed: default the seed of the first strategy
+    correlation: track the pnl correlation matrix, O(M ** 2) per trade
+    keep, every: keep the portfolio equity series, one point of every
+    '''
+    start = time.perf_counter()
+    m = len(sims)
+    for s in {id(s): s for s in sims}.values():
+        s.checkSource()
+    load = factorModel(m, corr, loadings)
+    own = np.sqrt(np.maximum(1 - np.sum(load ** 2, axis=1), 0))
+    noise = bool(np.any(own > 0))
+    w = np.full(m, 1 / m) if weights is None else np.asarray(weights, dtype=float)
+    init = np.array([s.balance for s in sims], dtype=float)
+    pos = np.array([s.initPos for s in sims] if sizing is None else sizing, dtype=float)
+    stake = init * pos
+    ## strategies sharing a sim get one outcome() call
+    groups: Dict[int, List[int]] = {}
+    for j, s in enumerate(sims):
+        groups.setdefault(id(s), []).append(j)
+    groups = [(sims[idx[0]], slice(idx[0], idx[-1] + 1) if idx[-1] - idx[0] == len(idx) - 1 else np.array(idx))
+              for idx in groups.values()]
+
+    strategies = CurveStat(init)
+    equity = CurveStat(float(init @ w), keep, every)
+    cov = CorrStat(m) if correlation else None
+    root = child(sims[0].seed if seed is None else seedSequence(seed), 5)
+    r = np.empty((BLOCK, m))
+    for c, t in enumerate(range(0, trades, BLOCK)):
+        rows = min(BLOCK, trades - t)
+        rng = generator(child(root, c))
+        z = rng.standard_normal((rows, load.shape[1])) @ load.T
+        if noise:
+            z += rng.standard_normal((rows, m)) * own
+        u = ndtr(z)
+        for sim, idx in groups:
+            r[:rows, idx] = sim.outcome(u[:, idx])
+        if compound:
+            ## growth factors, absorbing at 0
+            g = np.maximum(1 + pos * r[:rows], 0)
+            b = strategies.balance * np.cumprod(g, axis=0)
+            pnl = np.diff(np.concatenate([strategies.balance[None], b]), axis=0)
+            strategies.extend(b)
+        else:
+            pnl = stake * r[:rows]
+            b = strategies.update(pnl)
+        equity.extend(b @ w)
+        if cov is not None:
+            cov.update(pnl)
+    ret = PortfolioResult(equity, strategies, cov.corr if cov is not None else None, w, init, trades,
+                          time.perf_counter() - start)
+    logging.info('portfolio: {} strategies, {} trades, return {:.4%}, max drawdown {:.4%}, {:.2f}s'.format(
+                    m, trades, ret.rtn, equity.mdd, ret.elapsed))
+    return ret
@@ -0,0 +1,192 @@
+# coding=utf-8
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List
+
+'''Per-phase timing of a simulation
+
+MCSimulation.profiler is None by default and a phase then costs one attribute
+check. With a Profiler set every phase of run / getStat / __call__ /
+generateGDF / generateDF adds up its wall and cpu seconds, its num of calls
+and the net num of memory blocks it left allocated (sys.getallocatedblocks);
+the simulate phase also counts the games and trades played.
+
+phases: simulate (games or strategy curves played), aggregate (flattening, game
+pnl and balance curves), partial (grouping by K trades), performance
+(calcPerformance), plot; profile() wraps the whole call into total.
+
+cprofile: cProfile runs while any phase is open, the report keeps the top
+functions by cumulative time. memory: tracemalloc runs while any phase is
+open, the report gets the peak of the traced bytes of every phase.
+
+the generateGDF workers play on a fresh copy of the profiler, their reports
+are merged into the 'workers' part of the report of the parent.
+'''
+
+FIELDS = ('wall', 'cpu', 'calls', 'blocks', 'peak')
+NULL = nullcontext()
+
+
+class Profiler(object):
+    '''
+    cprofile: also run cProfile over the phases
+    memory: trace the python allocations with tracemalloc for the peak bytes of every phase
+    top: num of functions kept from cProfile
+    '''
+    def __init__(self, cprofile: bool = False, memory: bool = False, top: int = 30) -> None:
+        self.__cprofile = cprofile
+        self.__memory = memory
+        self.__top = top
+        self.clear()
+
+    def clear(self) -> None:
+        self.__phases: Dict[str, dict] = {}
+        self.__games = 0
+        self.__trades = 0
+        self.__workers = {'tasks': 0, 'games': 0, 'trades': 0, 'phases': {}, 'functions': {}}
+        ## open phases: [start bytes, peak bytes so far] per phase when memory is traced
+        self.__stack: List[list] = []
+        self.__prof = None
+        self.__tracing = False
+
+    def fresh(self) -> 'Profiler':
+        '''empty profiler with the same options'''
+        return Profiler(self.__cprofile, self.__memory, self.__top)
+
+    def __getstate__(self) -> dict:
+        # a copy in a worker starts empty
+        return {'cprofile': self.__cprofile, 'memory': self.__memory, 'top': self.__top}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+
+    @contextmanager
+    def phase(self, name: str):
+        stat = self.__phases.setdefault(name, dict.fromkeys(FIELDS, 0))
+        self.__open()
+        blocks = sys.getallocatedblocks()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            stat['wall'] += time.perf_counter() - wall
+            stat['cpu'] += time.process_time() - cpu
+            stat['calls'] += 1
+            stat['blocks'] += sys.getallocatedblocks() - blocks
+            stat['peak'] = max(stat['peak'], self.__close())
+
+    def __open(self) -> None:
+        if not self.__stack:
+            if self.__cprofile:
+                self.__prof = self.__prof or cProfile.Profile()
+                try:
+                    self.__prof.enable()
+                except ValueError:
+                    ## another profiler is active, e.g. the one of a thread worker
+                    logging.warning('profiler: cProfile is already active, functions are not recorded')
+            if self.__memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.__tracing = True
+        if self.__memory:
+            cur, peak = tracemalloc.get_traced_memory()
+            if self.__stack:
+                self.__stack[-1][1] = max(self.__stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            self.__stack.append([cur, cur])
+        else:
+            self.__stack.append(None)
+
+    def __close(self) -> int:
+        '''peak traced bytes of the phase above its start'''
+        top = self.__stack.pop()
+        ret = 0
+        if top is not None:
+            peak = max(top[1], tracemalloc.get_traced_memory()[1])
+            ret = peak - top[0]
+            if self.__stack:
+                self.__stack[-1][1] = max(self.__stack[-1][1], peak)
+        if not self.__stack:
+            if self.__prof is not None:
+                self.__prof.disable()
+            if self.__tracing:
+                tracemalloc.stop()
+                self.__tracing = False
+        return ret
+
+    def count(self, games: int, trades: int) -> None:
+        '''games and trades played'''
+        self.__games += games
+        self.__trades += trades
+
+    def functions(self) -> Dict[str, list]:
+        '''calls, own seconds and cumulative seconds of every profiled function'''
+        ret: Dict[str, list] = {}
+        if self.__prof is not None:
+            for (path, line, fn), (_, calls, tt, ct, _) in pstats.Stats(self.__prof).stats.items():
+                k = '{}:{}({})'.format(os.path.basename(path), line, fn)
+                v = ret.setdefault(k, [0, 0.0, 0.0])
+                v[0] += calls
+                v[1] += tt
+                v[2] += ct
+        return ret
+
+    def merge(self, report: dict) -> None:
+        '''add the report of a worker into the workers part'''
+        w = self.__workers
+        w['tasks'] += 1
+        w['games'] += report['games']
+        w['trades'] += report['trades']
+        _addPhases(w['phases'], report['phases'])
+        for k, calls, tt, ct in report['functions']:
+            v = w['functions'].setdefault(k, [0, 0.0, 0.0])
+            v[0] += calls
+            v[1] += tt
+            v[2] += ct
+
+    def report(self) -> dict:
+        '''
+        phases: wall, cpu seconds, calls, blocks and peak (bytes, memory only) per phase
+        games, trades: played in the simulate phase, and per second of its wall time
+        functions: top cProfile functions as [name, calls, own seconds, cumulative seconds]
+        workers: the same of the generateGDF workers summed over their tasks, rates per second of their summed
+                 simulate wall time, i.e. per worker
+        '''
+        ret = _rates({'phases': dict((k, dict(v)) for k, v in self.__phases.items()),
+                      'games': self.__games, 'trades': self.__trades,
+                      'functions': _top(self.functions(), self.__top)})
+        w = self.__workers
+        if w['tasks']:
+            ret['workers'] = _rates({'tasks': w['tasks'], 'games': w['games'], 'trades': w['trades'],
+                                     'phases': dict((k, dict(v)) for k, v in w['phases'].items()),
+                                     'functions': _top(w['functions'], self.__top)})
+        return ret
+
+    def log(self) -> None:
+        for k, v in self.report()['phases'].items():
+            logging.info('phase {}: {:.4f}s wall, {:.4f}s cpu, {} calls, {} blocks, {} peak bytes'.format(
+                k, v['wall'], v['cpu'], v['calls'], v['blocks'], v['peak']))
+
+
+def _addPhases(to: dict, phases: dict) -> None:
+    for k, v in phases.items():
+        stat = to.setdefault(k, dict.fromkeys(FIELDS, 0))
+        for f in ('wall', 'cpu', 'calls', 'blocks'):
+            stat[f] += v[f]
+        stat['peak'] = max(stat['peak'], v['peak'])
+
+
+def _top(functions: Dict[str, list], top: int) -> list:
+    return [[k] + v for k, v in sorted(functions.items(), key=lambda x: -x[1][2])[:top]]
+
+
+def _rates(report: dict) -> dict:
+    wall = report['phases'].get('simulate', {}).get('wall', 0)
+    report['games_per_sec'] = report['games'] / wall if wall > 0 else float('nan')
+    report['trades_per_sec'] = report['trades'] / wall if wall > 0 else float('nan')
+    return report
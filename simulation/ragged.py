@@ -0,0 +1,109 @@
+# coding=utf-8
+from array import array
+from typing import Iterator, List
+
+import numpy as np
+
+'''Ragged array of per-game trades
+
+one contiguous float64 buffer with the trades of every game back to back and
+the int64 start offset of every game, instead of one python list per game.
+While games are played the buffers are array.array, grown in C with amortized
+doubling, so game() appends a trade with a single C call; afterwards data /
+offsets are numpy views on the same memory, nothing is flattened or copied.
+'''
+
+
+class Ragged(object):
+    '''
+    row i is data[offsets[i]:offsets[i + 1]], the last row is the one appended to
+
+        out = Ragged()
+        for _ in range(n):
+            out.start()
+            sim.game(rng, out)
+        pnl, counts = out.data, out.counts
+    '''
+    def __init__(self) -> None:
+        self.__buf = array('d')
+        self.__starts = array('q')
+        ## bound C method, the hot path of game()
+        self.append = self.__buf.append
+
+    @classmethod
+    def fromCounts(cls, data: np.ndarray, counts: np.ndarray) -> 'Ragged':
+        '''read-only view of flat values with counts values per row, no copy'''
+        ret = cls.__new__(cls)
+        ret.__buf = np.ascontiguousarray(data, dtype=np.float64)
+        ret.__starts = np.cumsum(counts, dtype=np.int64) - counts
+        return ret
+
+    def append(self, x: float) -> None:
+        '''append x to the last row'''
+        raise TypeError('Ragged from fromCounts is read only')
+
+    def start(self) -> None:
+        '''open a new empty row'''
+        self.__starts.append(len(self.__buf))
+
+    def extend(self, values) -> None:
+        '''append values to the last row'''
+        if isinstance(values, np.ndarray):
+            self.__buf.frombytes(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        else:
+            self.__buf.extend(values)
+
+    @property
+    def count(self) -> int:
+        '''num of values in the last row'''
+        return len(self.__buf) - self.__starts[-1]
+
+    @property
+    def size(self) -> int:
+        '''num of values in all rows'''
+        return len(self.__buf)
+
+    def __len__(self) -> int:
+        return len(self.__starts)
+
+    @property
+    def data(self) -> np.ndarray:
+        '''flat values of all rows, a view on the buffer that pins it:
+        append / extend raise BufferError while a view is alive, copy it to keep playing
+        '''
+        return np.frombuffer(self.__buf, dtype=np.float64) if len(self.__buf) else np.empty(0)
+
+    @property
+    def offsets(self) -> np.ndarray:
+        '''start of every row plus the end of the last, len(self) + 1 values'''
+        starts = np.frombuffer(self.__starts, dtype=np.int64) if len(self.__starts) else np.empty(0, dtype=np.int64)
+        return np.append(starts, len(self.__buf))
+
+    @property
+    def counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.__buf) * 8 + len(self.__starts) * 8
+
+    def sums(self) -> np.ndarray:
+        '''sum of every row'''
+        off = self.offsets
+        counts = np.diff(off)
+        if len(counts) and counts.min() > 0:
+            return np.add.reduceat(self.data, off[:-1])
+        return np.bincount(np.repeat(np.arange(len(counts)), counts), weights=self.data, minlength=len(counts))
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        i = range(len(self))[i]
+        end = self.__starts[i + 1] if i + 1 < len(self) else len(self.__buf)
+        return self.data[self.__starts[i]:end]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        data, off = self.data, self.offsets
+        for i in range(len(self)):
+            yield data[off[i]:off[i + 1]]
+
+    def tolist(self) -> List[List[float]]:
+        return [x.tolist() for x in self]
@@ -0,0 +1,37 @@
+# coding=utf-8
+from typing import List
+
+import numpy as np
+
+'''Seeding helpers
+
+every game chunk / strategy / worker gets its own child SeedSequence, so the
+paths are independent and do not depend on how the work is split across cores
+'''
+
+
+def seedSequence(seed=None) -> np.random.SeedSequence:
+    '''seed: None (fresh entropy), int or SeedSequence'''
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def spawn(seed, n: int) -> List[np.random.SeedSequence]:
+    '''n independent children of seed
+
+    SeedSequence.spawn is stateful, spawn from a copy so the same seed
+    always gives the same children
+    '''
+    ss = seedSequence(seed)
+    return np.random.SeedSequence(ss.entropy, spawn_key=ss.spawn_key, pool_size=ss.pool_size).spawn(n)
+
+
+def child(seed, i: int) -> np.random.SeedSequence:
+    '''i-th child of seed, same as spawn(seed, i + 1)[i]'''
+    ss = seedSequence(seed)
+    return np.random.SeedSequence(ss.entropy, spawn_key=ss.spawn_key + (i, ), pool_size=ss.pool_size)
+
+
+def generator(seed=None) -> np.random.Generator:
+    return np.random.Generator(np.random.PCG64(seedSequence(seed)))
@@ -0,0 +1,38 @@
+# coding=utf-8
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+'''Shared result matrix for the worker pool
+
+the parent preallocates a (rows, cols) float64 matrix in a memory-mapped file,
+on /dev/shm when available, workers reopen it by path and write their own
+column, nothing but the path is pickled. Column-major so that every column is
+one contiguous slice.
+'''
+
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def sharedPath(prefix: str = 'simulation.') -> str:
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix='.f64', dir=SHM_DIR)
+    os.close(fd)
+    return path
+
+
+def sharedMatrix(path: str, rows: int, cols: int, mode: str = 'r+') -> np.memmap:
+    '''
+    path: file backing the matrix
+    mode: w+ to create it in the parent, r+ to reopen it in a worker
+    '''
+    return np.memmap(path, dtype=np.float64, mode=mode, shape=(rows, cols), order='F')
+
+
+def release(path: str) -> None:
+    '''remove the file, mappings already open stay valid'''
+    try:
+        os.remove(path)
+    except OSError as e:
+        logging.warning('can not remove shared file {}: {}'.format(path, e))
@@ -0,0 +1,195 @@
+# coding=utf-8
+from typing import Dict
+
+import numpy as np
+
+from simulation.kernel import njit
+
+'''Declarative position management strategies
+
+the strategies of simuT are one loop: trade, then on a trade extending the
+streak (a loss, or a profit) grow the position, otherwise exit or reset, and
+stop on a streak / trade limit or once the game pnl has recovered. A Spec
+states those choices, SpecGame plays any Spec in all three modes: the python
+game() loop, the numpy batch mode and one compiled state machine kernel, so a
+new variant needs no loop of its own and gives identical games in every mode.
+
+a game, starting with pos = InitPos, streak = 0:
+    trade with pnl balance * pos * outcome
+    stop after maxTrades trades
+    streak trade: streak += 1, stop when streak > maxStreak, grow pos by the factor of the streak
+    other trade: stop on onMiss exit, or with recover once the game pnl is positive,
+                 else reset the streak (and pos) per onMiss
+'''
+
+CONDITIONS = ('loss', 'profit')
+MISSES = ('exit', 'reset', 'resetStreak', 'hold')
+SIZINGS = ('multiply', 'add')
+
+
+class Spec(object):
+    '''
+    condition: trade extending the streak, loss (pnl < 0) or profit (pnl > 0)
+    multiplier: position factor on a streak trade
+    table: {streak length: factor} overriding multiplier, e.g. SimV4.multi
+    sizing: multiply pos *= factor, or add pos += InitPos * factor
+    onMiss: on any other trade, exit the game, reset streak and position, resetStreak only, or hold both
+    maxStreak: exit when the streak gets longer, None for no limit
+    maxTrades: max num of trades of a game, None for no limit
+    recover: exit on a trade off the streak once the game pnl is positive
+    '''
+    def __init__(self, condition: str = 'loss', multiplier: float = 2, table: Dict[int, float] = None,
+                 sizing: str = 'multiply', onMiss: str = 'exit', maxStreak: int = None, maxTrades: int = None,
+                 recover: bool = False) -> None:
+        for name, v, allowed in (('condition', condition, CONDITIONS), ('onMiss', onMiss, MISSES),
+                                 ('sizing', sizing, SIZINGS)):
+            if v not in allowed:
+                raise ValueError('unknown {} {}, use one of {}'.format(name, v, list(allowed)))
+        if onMiss != 'exit' and maxStreak is None and maxTrades is None and not recover:
+            raise ValueError('games never end, set onMiss exit, maxStreak, maxTrades or recover')
+        self.condition = condition
+        self.multiplier = multiplier
+        self.table = dict(table or {})
+        self.sizing = sizing
+        self.onMiss = onMiss
+        self.maxStreak = maxStreak
+        self.maxTrades = maxTrades
+        self.recover = recover
+
+    def __repr__(self) -> str:
+        return ('Spec(condition={!r}, multiplier={!r}, table={!r}, sizing={!r}, onMiss={!r}, maxStreak={!r}, '
+                'maxTrades={!r}, recover={!r})').format(self.condition, self.multiplier, dict(sorted(self.table.items())),
+                                                        self.sizing, self.onMiss, self.maxStreak, self.maxTrades,
+                                                        self.recover)
+
+    def factors(self) -> np.ndarray:
+        '''factor per streak length up to the longest of the table, multiplier beyond'''
+        return np.array([self.table.get(c, self.multiplier) for c in range(max(self.table, default=0) + 1)],
+                        dtype=float)
+
+    def grow(self, pos: np.ndarray, pos0: float, streak: np.ndarray) -> np.ndarray:
+        '''positions after a streak trade of the given streak lengths'''
+        f = self.factors()
+        factor = np.where(streak < len(f), f[np.minimum(streak, len(f) - 1)], float(self.multiplier))
+        return pos * factor if self.sizing == 'multiply' else pos + pos0 * factor
+
+
+@njit(cache=True)
+def _specKernel(r, returns, scale, balance, pos0, loss, miss, maxStreak, maxTrades, recover, add, factors, default,
+                pnl, n):
+    ## miss: index in MISSES, maxStreak / maxTrades -1 for no limit, r: outcome of every draw,
+    ## or with returns the draws of a Bootstrap looked up in its returns as Bootstrap.outcome
+    block = r.shape[1]
+    m = len(returns)
+    for i in range(r.shape[0]):
+        pos = pos0
+        total = balance
+        streak = 0
+        t = 0
+        while True:
+            if t == block:
+                t = -1
+                break
+            x = r[i, t]
+            if m:
+                x = returns[min(int(x * m), m - 1)] * scale
+            a = balance * pos * x
+            total += a
+            pnl[i, t] = a
+            t += 1
+            if maxTrades >= 0 and t >= maxTrades:
+                break
+            if (loss and a < 0) or (not loss and a > 0):
+                streak += 1
+                if maxStreak >= 0 and streak > maxStreak:
+                    break
+                f = factors[streak] if streak < len(factors) else default
+                if add:
+                    pos = pos + pos0 * f
+                else:
+                    pos = pos * f
+            elif miss == 0 or (recover and total > balance):
+                break
+            elif miss == 1:
+                streak = 0
+                pos = pos0
+            elif miss == 2:
+                streak = 0
+        n[i] = t
+
+
+class SpecGame(object):
+    '''game(), batch mode and kernel of the Spec in self.spec, mixed into an MCSimulation giving outcome/simu'''
+    spec: Spec = None
+
+    def game(self, rng, out) -> None:
+        s = self.spec
+        loss, miss, recover = s.condition == 'loss', s.onMiss, s.recover
+        table, multiplier, add = s.table, s.multiplier, s.sizing == 'add'
+        maxStreak = np.inf if s.maxStreak is None else s.maxStreak
+        maxTrades = np.inf if s.maxTrades is None else s.maxTrades
+        pos0 = pos = self.initPos
+        balance = init = self.balance
+        streak = t = 0
+        while True:
+            a = init * pos * self.simu(rng)
+            balance += a
+            out.append(a)
+            if self.trace is not None:
+                self.trace.record(t, pos, a, balance)
+            t += 1
+            if t >= maxTrades:
+                return
+            if (a < 0) if loss else (a > 0):
+                streak += 1
+                if streak > maxStreak:
+                    return
+                f = table.get(streak, multiplier)
+                pos = pos + pos0 * f if add else pos * f
+            elif miss == 'exit' or (recover and balance > init):
+                return
+            elif miss == 'reset':
+                streak = 0
+                pos = pos0
+            elif miss == 'resetStreak':
+                streak = 0
+
+    def batchInit(self, n: int) -> dict:
+        return {'pos': np.full(n, self.initPos, dtype=float), 'streak': np.zeros(n, dtype=int),
+                'balance': np.full(n, self.balance, dtype=float)}
+
+    def batchStep(self, state: dict, a: np.ndarray, t: int) -> np.ndarray:
+        s = self.spec
+        state['balance'] += a
+        hit = a < 0 if s.condition == 'loss' else a > 0
+        streak = state['streak'] + hit
+        keep = np.ones(len(a), dtype=bool)
+        if s.maxTrades is not None:
+            keep &= t + 1 < s.maxTrades
+        if s.maxStreak is not None:
+            keep &= ~hit | (streak <= s.maxStreak)
+        if s.onMiss == 'exit':
+            keep &= hit
+        elif s.recover:
+            keep &= hit | ~(state['balance'] > self.balance)
+        pos = np.where(hit, s.grow(state['pos'], self.initPos, streak), state['pos'])
+        if s.onMiss == 'reset':
+            pos = np.where(hit, pos, self.initPos)
+        if s.onMiss in ('reset', 'resetStreak'):
+            streak = np.where(hit, streak, 0)
+        state['pos'] = pos
+        state['streak'] = streak
+        return keep
+
+    def kernel(self, u: np.ndarray, pnl: np.ndarray, n: np.ndarray) -> None:
+        s = self.spec
+        src = self.source
+        if src is None:
+            r, returns, scale = np.ascontiguousarray(self.outcome(u), dtype=float), np.empty(0), 1.0
+        else:
+            ## only the draws the games reach are looked up
+            r, returns, scale = u, src.returns, float(src.scale)
+        _specKernel(r, returns, scale, float(self.balance), float(self.initPos),
+                    s.condition == 'loss', MISSES.index(s.onMiss), -1 if s.maxStreak is None else s.maxStreak,
+                    -1 if s.maxTrades is None else s.maxTrades, bool(s.recover), s.sizing == 'add', s.factors(),
+                    float(s.multiplier), pnl, n)
@@ -0,0 +1,198 @@
+# coding=utf-8
+import enum
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, BinaryIO, Dict, List
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+'''Columnar on-disk result store
+
+a store is a directory with one raw binary file per column and a meta.json
+holding the dtype / shape of every column plus the strategy params and seed.
+Columns are streamed chunk by chunk with append, or written whole with put, and
+reopened as read-only memmaps, so the analysis of a large run neither reruns
+the games nor loads them into memory.
+
+    with ResultStore('run0', 'w', sim.describe()) as store:
+        sim.runStream(store=store)
+    stat = sim.loadStream(ResultStore('run0'))
+'''
+
+META = 'meta.json'
+
+
+def jsonable(v):
+    '''params and seeds as plain json values'''
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    if isinstance(v, enum.Enum):
+        return '{}.{}'.format(type(v).__name__, v.name)
+    if isinstance(v, np.generic):
+        return v.item()
+    if isinstance(v, np.random.SeedSequence):
+        return {'entropy': v.entropy, 'spawn_key': list(v.spawn_key)}
+    if isinstance(v, dict):
+        return {str(k): jsonable(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple, np.ndarray)):
+        return [jsonable(x) for x in v]
+    return repr(v)
+
+
+class ResultStore(object):
+    '''
+    path: directory of the store
+    mode: r to reopen read only, r+ to add / replace columns, w to create (replaces the columns of an old store)
+    meta: metadata of a new store, e.g. MCSimulation.describe()
+    '''
+    def __init__(self, path: str, mode: str = 'r', meta: dict = None) -> None:
+        if mode not in ('r', 'r+', 'w'):
+            raise ValueError('unknown mode {}, use r, r+ or w'.format(mode))
+        self.__path = path
+        self.__mode = mode
+        self.__files: Dict[str, BinaryIO] = {}
+        if mode == 'w':
+            os.makedirs(path, exist_ok=True)
+            if os.path.exists(self.file(META)):
+                old = ResultStore(path, 'r+')
+                for name in old.columns:
+                    del old[name]
+            self.__info = {'meta': meta or {}, 'columns': {}}
+            self.flush()
+        else:
+            with open(self.file(META)) as f:
+                self.__info = json.load(f)
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def meta(self) -> dict:
+        return self.__info['meta']
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.__info['columns'])
+
+    def file(self, name: str) -> str:
+        '''file of a column, or of the meta for META'''
+        return os.path.join(self.__path, name if name == META else name + '.bin')
+
+    def shape(self, name: str) -> tuple:
+        return tuple(self.__info['columns'][name]['shape'])
+
+    def labels(self, name: str) -> List[str]:
+        '''labels of the columns of a matrix, None if not given'''
+        return self.__info['columns'][name].get('labels')
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__info['columns']
+
+    def __writable(self) -> None:
+        if self.__mode == 'r':
+            raise IOError('store {} is opened read only'.format(self.__path))
+
+    def __column(self, name: str, dtype: np.dtype, shape: tuple, order: str, labels: List[str]) -> None:
+        self.__info['columns'][name] = {'dtype': np.dtype(dtype).str, 'shape': list(shape), 'order': order}
+        if labels is not None:
+            self.__info['columns'][name]['labels'] = list(labels)
+
+    def append(self, name: str, arr: np.ndarray) -> None:
+        '''append a chunk of rows to a column, created by the first chunk'''
+        self.__writable()
+        arr = np.asarray(arr)
+        if name not in self:
+            self.__column(name, arr.dtype, (0, ) + arr.shape[1:], 'C', None)
+            self.__files[name] = open(self.file(name), 'wb')
+        elif name not in self.__files:
+            self.__files[name] = open(self.file(name), 'ab')
+        col = self.__info['columns'][name]
+        if tuple(col['shape'][1:]) != arr.shape[1:]:
+            raise ValueError('chunk of shape {} does not fit column {} of shape {}'.format(arr.shape, name, col['shape']))
+        self.__files[name].write(np.ascontiguousarray(arr, dtype=col['dtype']).tobytes())
+        col['shape'][0] += len(arr)
+
+    def put(self, name: str, arr: np.ndarray, labels: List[str] = None) -> None:
+        '''write a whole column, replacing it
+        labels: names of the columns of a matrix
+        '''
+        self.__writable()
+        self.__close(name)
+        arr = np.asarray(arr)
+        order = 'F' if arr.ndim > 1 and arr.flags.f_contiguous and not arr.flags.c_contiguous else 'C'
+        with open(self.file(name), 'wb') as f:
+            f.write(arr.tobytes(order=order))
+        self.__column(name, arr.dtype, arr.shape, order, labels)
+
+    def create(self, name: str, shape: tuple, dtype: np.dtype = np.float64, order: str = 'F',
+               labels: List[str] = None) -> np.memmap:
+        '''preallocate a column and map it for writing in place, e.g. by the workers of generateGDF'''
+        self.__writable()
+        self.__close(name)
+        self.__column(name, dtype, shape, order, labels)
+        self.flush()
+        return np.memmap(self.file(name), dtype=dtype, mode='w+', shape=tuple(shape), order=order)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        '''read-only memmap of a column'''
+        self.__close(name)
+        col = self.__info['columns'][name]
+        shape = tuple(col['shape'])
+        if not np.prod(shape):
+            return np.empty(shape, dtype=col['dtype'])
+        return np.memmap(self.file(name), dtype=col['dtype'], mode='r', shape=shape, order=col['order'])
+
+    def __delitem__(self, name: str) -> None:
+        self.__writable()
+        self.__close(name)
+        del self.__info['columns'][name]
+        try:
+            os.remove(self.file(name))
+        except FileNotFoundError:
+            pass
+        self.flush()
+
+    def frame(self, name: str) -> 'pd.DataFrame':
+        '''DataFrame view of a matrix column, without a copy'''
+        import pandas as pd
+
+        return pd.DataFrame(self[name], columns=self.labels(name), copy=False)
+
+    def toParquet(self, name: str, path: str) -> None:
+        '''export a column to parquet, needs pyarrow or fastparquet'''
+        import pandas as pd
+
+        arr = self[name]
+        frame = self.frame(name) if arr.ndim > 1 else pd.DataFrame({name: arr}, copy=False)
+        frame.to_parquet(path)
+
+    def __close(self, name: str) -> None:
+        f = self.__files.pop(name, None)
+        if f is not None:
+            f.close()
+
+    def flush(self) -> None:
+        '''write the pending chunks and the meta'''
+        if self.__mode == 'r':
+            return
+        for f in self.__files.values():
+            f.flush()
+        with open(self.file(META), 'w') as f:
+            json.dump(self.__info, f, indent=1)
+
+    def close(self) -> None:
+        self.flush()
+        for name in list(self.__files):
+            self.__close(name)
+        logging.info('store {}: {}'.format(self.__path, {k: self.shape(k) for k in self.columns}))
+
+    def __enter__(self) -> 'ResultStore':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
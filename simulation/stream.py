@@ -0,0 +1,228 @@
+# coding=utf-8
+import logging
+from typing import List
+
+import numpy as np
+
+from simulation.compound import compoundBalance
+from simulation.kernel import HAS_NUMBA, njit
+from simulation.utils import Performance
+
+
+@njit(cache=True)
+def _extendKernel(b, last, mx, mdd, mean, m2, n):
+    ## column-wise CurveStat.extend, row by row like the numpy reductions along axis 0, so the same floats
+    t, m = b.shape
+    s = np.zeros(m)
+    q = np.zeros(m)
+    for k in range(2):
+        for i in range(t):
+            for j in range(m):
+                prev = last[j] if i == 0 else b[i - 1, j]
+                r = b[i, j] / prev - 1 if prev != 0 else 0.0
+                if k == 0:
+                    s[j] += r
+                else:
+                    d = r - s[j]
+                    q[j] += d * d
+        if k == 0:
+            s /= t
+    total = n + t
+    for j in range(m):
+        delta = s[j] - mean[j]
+        mean[j] += delta * t / total
+        m2[j] += q[j] + delta * delta * n * t / total
+        dd = 0.0
+        for i in range(t):
+            mx[j] = max(mx[j], b[i, j])
+            dd = max(dd, 1 - b[i, j] / mx[j]) if i else 1 - b[i, j] / mx[j]
+        mdd[j] = max(mdd[j], dd)
+        last[j] = b[t - 1, j]
+
+
+class CurveStat(object):
+    '''incremental performance of a balance curve fed with pnl chunks
+
+    same numbers as calcPerformance on the full curve: mean/std of the returns
+    (Welford, merged per chunk), running max and max drawdown, in O(1) memory.
+    Column-wise for M curves at once when init is an array of M init balances
+    and the chunks are (T, M), see portfolio.
+
+    init: init balance
+    keep: keep the balance series
+    every: keep one point out of every, to downsample the kept series
+    compound: pnl is sized off init, the balance compounds it as a return on the current equity
+    ruin: compounding ruin level as a fraction of init, absorbing
+    '''
+    def __init__(self, init: float, keep: bool = False, every: int = 1, compound: bool = False,
+                 ruin: float = 0.0) -> None:
+        self.__init = init
+        self.__last = init
+        self.__max = init
+        self.__mdd = 0.0
+        self.__n = 0
+        self.__mean = 0.0
+        self.__m2 = 0.0
+        self.__keep = keep
+        self.__every = every
+        self.__cnt = 1
+        self.__series: List[np.ndarray] = [np.array([init], dtype=float)] if keep else []
+        self.__compound = compound
+        self.__ruin = ruin * init
+
+    @property
+    def balance(self) -> float:
+        return self.__last
+
+    @property
+    def count(self) -> int:
+        '''num of pnl points fed'''
+        return self.__n
+
+    @property
+    def mdd(self) -> float:
+        return self.__mdd
+
+    @property
+    def avg(self) -> float:
+        '''mean return per point'''
+        return self.__mean if self.__n else np.nan * self.__mean
+
+    @property
+    def std(self) -> float:
+        '''standard deviation of the returns'''
+        return np.sqrt(self.__m2 / (self.__n - 1)) if self.__n > 1 else np.nan * self.__m2
+
+    @property
+    def ruined(self) -> bool:
+        '''compounding balance reached the ruin level'''
+        return self.__compound and self.__last <= max(self.__ruin, 0)
+
+    @property
+    def series(self) -> np.ndarray:
+        '''kept balance series, None if not kept'''
+        if not self.__keep:
+            return None
+        return np.concatenate(self.__series)
+
+    def update(self, pnl: np.ndarray) -> np.ndarray:
+        '''feed the pnl of consecutive points
+        return: balance after each point
+        '''
+        if not len(pnl):
+            return np.empty(0)
+        if self.__compound:
+            b = compoundBalance(pnl / self.__init, self.__last, self.__ruin)
+        else:
+            b = np.cumsum(np.concatenate([self.__head(self.__last), pnl]), axis=0)[1:]
+        self.extend(b)
+        return b
+
+    def extend(self, b: np.ndarray) -> None:
+        '''feed the balance after each of consecutive points'''
+        if not len(b):
+            return
+        if HAS_NUMBA and b.ndim == 2 and b.shape[1] > 1:
+            ## M curves, one compiled pass instead of a dozen (T, M) temporaries, a single column sums pairwise
+            state = [np.array(np.broadcast_to(v, b.shape[1]), dtype=float)
+                     for v in (self.__last, self.__max, self.__mdd, self.__mean, self.__m2)]
+            _extendKernel(np.ascontiguousarray(b, dtype=float), *state, self.__n)
+            self.__last, self.__max, self.__mdd, self.__mean, self.__m2 = state
+            self.__n += len(b)
+        else:
+            prev = np.concatenate([self.__head(self.__last), b[:-1]])
+            ## a ruined balance stays flat, its returns are 0
+            r = np.divide(b, prev, out=np.ones(b.shape), where=prev != 0) - 1
+            n, mean = len(r), r.mean(axis=0)
+            m2 = np.sum((r - mean) ** 2, axis=0)
+            total = self.__n + n
+            delta = mean - self.__mean
+            self.__mean += delta * n / total
+            self.__m2 += m2 + delta ** 2 * self.__n * n / total
+            self.__n = total
+
+            ms = np.maximum.accumulate(np.concatenate([self.__head(self.__max), b]), axis=0)[1:]
+            self.__mdd = np.maximum(self.__mdd, np.max(1 - b / ms, axis=0))
+            self.__max = ms[-1]
+            self.__last = b[-1]
+
+        if self.__keep:
+            start = (-self.__cnt) % self.__every
+            self.__series.append(b[start::self.__every])
+            self.__cnt += len(b)
+
+    @staticmethod
+    def __head(v) -> np.ndarray:
+        '''last balance / max as the first row of a chunk'''
+        return np.asarray(v, dtype=float)[None]
+
+    def performance(self) -> Performance:
+        p = Performance(self.avg, self.std, self.series, mdd=self.__mdd)
+        totalRtn = self.__last / self.__init - 1
+        logging.warning('\nreturn: {:20.4%}\naverage return: {:>16.4%}\nstandard deviation: {:>12.4f}\nmax drawdown: {:>18.4%}\n'.format(totalRtn, p.avg, p.std, p.mdd))
+        return p
+
+
+class RunStat(object):
+    '''streaming counterpart of MCSimulation.run
+
+    trade: balance after each trading
+    gamer: balance after each gamer
+    partial: balance of the K-sized partial means of the trading pnl
+    compound, ruin: see CurveStat, the gamer curve is the trade curve at the game ends
+    '''
+    def __init__(self, init: float, K: int, keep: bool = False, every: int = 1, compound: bool = False,
+                 ruin: float = 0.0) -> None:
+        self.trade = CurveStat(init, keep, every, compound, ruin)
+        self.gamer = CurveStat(init, keep, every, compound, ruin)
+        self.partial = CurveStat(init, keep, every, compound, ruin)
+        self.__compound = compound
+        self.__K = K
+        self.__carry = np.empty(0)
+        self.__win = 0
+        self.__lose = 0
+        self.__profit = 0.0
+        self.__loss = 0.0
+
+    @property
+    def games(self) -> int:
+        return self.gamer.count
+
+    @property
+    def trades(self) -> int:
+        return self.trade.count
+
+    @property
+    def groups(self) -> int:
+        return self.partial.count
+
+    @property
+    def partialWRatio(self) -> float:
+        return self.__win / self.groups if self.groups else np.nan
+
+    @property
+    def partialPLR(self) -> float:
+        if self.__lose < 1:
+            return np.inf
+        return -self.__profit / self.__loss
+
+    def update(self, pnl: np.ndarray, counts: np.ndarray) -> None:
+        '''
+        pnl: flat per-trade pnl of some games
+        counts: num of trades per game
+        '''
+        b = self.trade.update(pnl)
+        if self.__compound:
+            self.gamer.extend(b[np.cumsum(counts) - 1])
+        else:
+            self.gamer.update(np.add.reduceat(pnl, np.cumsum(counts) - counts))
+
+        pnl = np.concatenate([self.__carry, pnl])
+        n = len(pnl) // self.__K * self.__K
+        self.__carry = pnl[n:]
+        partial = pnl[:n].reshape(-1, self.__K).mean(axis=1)
+        self.partial.update(partial)
+        self.__win += np.sum(partial > 0)
+        self.__lose += np.sum(partial < 0)
+        self.__profit += np.sum(partial[partial > 0])
+        self.__loss += np.sum(partial[partial < 0])
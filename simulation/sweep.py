@@ -0,0 +1,91 @@
+# coding=utf-8
+import hashlib
+import logging
+from itertools import product
+from typing import TYPE_CHECKING, Callable, List
+
+import numpy as np
+
+from simulation.executor import Executor, getExecutor
+from simulation.rng import child, seedSequence
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+'''Parameter sweep
+
+every (params, replicate) cell builds its own strategy instance with the params
+passed to the constructor, runs it in constant memory and reports one row of
+Performance metrics. The seed of a cell only depends on the root seed, the
+params and the replicate, so a cell gives the same row in any sweep.
+'''
+
+
+def grid(**params) -> List[dict]:
+    '''cartesian product of the param lists, scalars are kept fixed
+    grid(InitPos=[0.001, 0.002], X=[2, 3], Flag=FLAG.LOSS)
+    '''
+    keys = list(params)
+    values = [v if isinstance(v, (list, tuple, range, np.ndarray)) else [v] for v in params.values()]
+    return [dict(zip(keys, x)) for x in product(*values)]
+
+
+def cellKey(params: dict) -> str:
+    return repr(sorted((k, repr(v)) for k, v in params.items()))
+
+
+def cellSeed(seed, params: dict, replicate: int) -> np.random.SeedSequence:
+    h = int(hashlib.md5(cellKey(params).encode()).hexdigest()[:8], 16)
+    return child(child(seed, h), replicate)
+
+
+def runCell(cls, params: dict, replicate: int, seed: np.random.SeedSequence, batch: bool = None) -> dict:
+    '''
+    cls: MCSimulation child class, takes params and Seed as keyword arguments
+    batch: use the batch engine, default when the class supports it
+    '''
+    sim = cls(Seed=seed, **params)
+    stat = sim.runStream(sim.batchable if batch is None else batch)
+    row = dict(params)
+    row['replicate'] = replicate
+    for name, curve in (('', stat.trade), ('gamer_', stat.gamer), ('partial_', stat.partial)):
+        p = curve.performance()
+        row[name + 'avg'] = p.avg
+        row[name + 'std'] = p.std
+        row[name + 'mdd'] = p.mdd
+        row[name + 'rtn'] = curve.balance / sim.balance - 1
+    row['partial_wratio'] = stat.partialWRatio
+    row['partial_plr'] = stat.partialPLR
+    row['games'] = stat.games
+    row['trades'] = stat.trades
+    return row
+
+
+def _runTask(i: int, *args) -> tuple:
+    return i, runCell(*args)
+
+
+def sweep(cls, cells: List[dict], replicates: int = 1, seed: int = None, executor: Executor = None,
+          cores: int = 2, chunksize: int = 1, progress: Callable[[int, int], None] = None,
+          batch: bool = None) -> 'pd.DataFrame':
+    '''
+    cls: strategy class
+    cells: list of constructor params, see grid, identical cells are run once
+    replicates: num of independent runs per cell
+    seed: root seed of the sweep
+    executor: pool to spread the cells on, default the module level one with cores workers
+    return: one row of params and metrics per (cell, replicate)
+    '''
+    import pandas as pd
+
+    unique = {}
+    for params in cells:
+        unique.setdefault(cellKey(params), params)
+    if len(unique) < len(cells):
+        logging.info('sweep: {} duplicated cells dropped'.format(len(cells) - len(unique)))
+
+    root = seedSequence(seed)
+    tasks = [(params, r) for params in unique.values() for r in range(replicates)]
+    tasks = [(i, cls, params, r, cellSeed(root, params, r), batch) for i, (params, r) in enumerate(tasks)]
+    rows = sorted((executor or getExecutor(cores)).map(_runTask, tasks, progress, chunksize), key=lambda x: x[0])
+    return pd.DataFrame([row for _, row in rows])
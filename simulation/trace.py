@@ -0,0 +1,53 @@
+# coding=utf-8
+import numpy as np
+
+'''Per-trade trace of the python game() loops
+
+disabled by default (MCSimulation.trace is None) and then costs one attribute
+check per trade. Set sim.trace = TraceSink() to record every trade of the
+games played in this process as compact columnar records instead of text logs.
+'''
+
+TRACE_DTYPE = np.dtype([('game', np.int64), ('step', np.int32), ('pos', np.float64),
+                        ('pnl', np.float64), ('balance', np.float64)])
+
+
+class TraceSink(object):
+    '''
+    columnar per-trade records: game id, step in the game, pos, pnl, balance
+    backed by one structured numpy buffer with amortized growth
+
+    capacity: initial num of records
+    '''
+    def __init__(self, capacity: int = 1 << 16) -> None:
+        self.__buf = np.empty(capacity, dtype=TRACE_DTYPE)
+        self.__n = 0
+        self.__game = -1
+
+    def __len__(self) -> int:
+        return self.__n
+
+    def record(self, step: int, pos: float, pnl: float, balance: float) -> None:
+        '''step 0 starts a new game'''
+        if not step:
+            self.__game += 1
+        if self.__n == len(self.__buf):
+            self.__buf = np.resize(self.__buf, 2 * len(self.__buf))
+        self.__buf[self.__n] = (self.__game, step, pos, pnl, balance)
+        self.__n += 1
+
+    @property
+    def records(self) -> np.ndarray:
+        '''structured array of the recorded trades'''
+        return self.__buf[:self.__n]
+
+    def columns(self) -> dict:
+        return {name: self.records[name] for name in TRACE_DTYPE.names}
+
+    def save(self, path: str) -> None:
+        '''columns into a npz file'''
+        np.savez(path, **self.columns())
+
+    def clear(self) -> None:
+        self.__n = 0
+        self.__game = -1
@@ -1,20 +1,22 @@
 # coding=utf-8
 import logging
+import warnings
+from typing import List
+
 import numpy as np
-import pandas as pd
 
 class Performance(object):
     '''
     avg: average pnl
     std: standard deviation for pnl
-    dd: drawdown series
-    mdd: max drawdown
+    dd: drawdown series, None when only mdd is tracked
+    mdd: max drawdown, default max of dd
     '''
-    def __init__(self, avg: float, std: float, dd: np.array) -> None:
+    def __init__(self, avg: float, std: float, dd: np.array, mdd: float = None) -> None:
         self.__avg = avg
         self.__std = std
         self.__dd = dd
-        self.__mdd = np.max(dd)
+        self.__mdd = np.max(dd) if mdd is None else mdd
 
     @property
     def avg(self) -> float:
@@ -34,15 +36,54 @@ class Performance(object):
 
 
 
-def calcPerformance(arr: np.array) -> Performance:
+def performanceKernel(arr: np.array, dd: bool = True) -> tuple:
     '''
-    input: balance series
+    pure numpy performance of balance curves, column-wise for 2-D input
+    input: balance series (T, ) or matrix (T, M) of balance series
+    dd: build the drawdown series, otherwise it is None and only mdd is returned
+    return: avg, std, dd, mdd, totalRtn
     '''
-    s = pd.Series(arr)
-    rs = s / s.shift(1) - 1
-    ms = s.cummax()
-    dd = 1 - s / ms
-    p = Performance(rs.mean(), rs.std(), np.asarray(dd.cummax()))
-    totalRtn = arr[len(arr) - 1] / arr[0] - 1
+    b = np.asarray(arr, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        rs = b[1:] / b[:-1] - 1
+        avg = np.nanmean(rs, axis=0)
+        std = np.nanstd(rs, axis=0, ddof=1)
+        d = 1 - b / np.maximum.accumulate(b, axis=0)
+        if dd:
+            d = np.fmax.accumulate(d, axis=0)
+            mdd = d[-1]
+        else:
+            mdd = np.nanmax(d, axis=0)
+            d = None
+        totalRtn = b[-1] / b[0] - 1
+    return avg, std, d, mdd, totalRtn
+
+
+def _logPerformance(totalRtn: float, p: Performance) -> None:
     logging.warning('\nreturn: {:20.4%}\naverage return: {:>16.4%}\nstandard deviation: {:>12.4f}\nmax drawdown: {:>18.4%}\n'.format(totalRtn, p.avg, p.std, p.mdd))
+
+
+def calcPerformance(arr: np.array, dd: bool = True) -> Performance:
+    '''
+    input: balance series
+    dd: keep the drawdown series, False when only mdd is needed
+    '''
+    avg, std, d, mdd, totalRtn = performanceKernel(arr, dd)
+    p = Performance(avg, std, d, mdd=mdd)
+    _logPerformance(totalRtn, p)
     return p
+
+
+def calcPerformances(mat: np.array, dd: bool = True) -> List[Performance]:
+    '''
+    input: matrix of balance series, one curve per column
+    dd: keep the drawdown series, False when only mdd is needed
+    '''
+    avg, std, d, mdd, totalRtn = performanceKernel(mat, dd)
+    ret = []
+    for i in range(len(avg)):
+        p = Performance(avg[i], std[i], None if d is None else d[:, i], mdd=mdd[i])
+        _logPerformance(totalRtn[i], p)
+        ret.append(p)
+    return ret
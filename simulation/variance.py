@@ -0,0 +1,126 @@
+# coding=utf-8
+import copy
+import logging
+from typing import List
+
+import numpy as np
+
+from simulation.rng import seedSequence
+
+'''Variance reduction for the expected game pnl
+
+antithetic: every chunk plays the mirrored draws 1 - u of its first half, a
+    pair average is one sample (MCSimulation.antithetic runs every mode this way)
+commonRandom: strategy variants play the same outcome streams, game i of every
+    variant reads the same draws, so their difference is measured game by game
+controlVariate: the stake of a trade only depends on the past, so
+    sum(stake * (rate - mean rate)) over a game has mean 0 and follows the
+    game pnl closely, the analytic outcomeMean of the strategy gives the mean rate.
+    With a mean rate of 0 the control is the game pnl itself, the residual
+    vanishes and says nothing about the error: that is reported as degenerate
+    and the plain monte carlo estimate is returned
+
+every estimator reports the plain monte carlo standard error on the same games
+next to its own, factor = (naiveSe / se) ** 2 is how many times more games
+plain monte carlo needs for the same precision.
+'''
+
+
+class Reduction(object):
+    '''
+    value: estimate
+    se: standard error of the estimate
+    naiveSe: standard error of plain monte carlo on the same num of games
+    n: num of games
+    degenerate: the estimator fell back to plain monte carlo, see controlVariate
+    '''
+    def __init__(self, value: float, se: float, naiveSe: float, n: int, degenerate: bool = False) -> None:
+        self.value = value
+        self.se = se
+        self.naiveSe = naiveSe
+        self.n = n
+        self.degenerate = degenerate
+
+    @property
+    def factor(self) -> float:
+        '''variance reduction factor'''
+        return (self.naiveSe / self.se) ** 2 if self.se > 0 else np.inf
+
+    @property
+    def relErr(self) -> float:
+        '''relative error se / value'''
+        return self.se / abs(self.value) if self.value else np.inf
+
+    def games(self, se: float) -> int:
+        '''num of games needed for the standard error se'''
+        return int(np.ceil(self.n * (self.se / se) ** 2))
+
+    def __repr__(self) -> str:
+        return 'Reduction(value={:.6g}, se={:.3g}, naiveSe={:.3g}, factor={:.2f}, n={}{})'.format(
+            self.value, self.se, self.naiveSe, self.factor, self.n, ', degenerate' if self.degenerate else '')
+
+
+def _se(x: np.ndarray) -> float:
+    return np.std(x, ddof=1) / np.sqrt(len(x))
+
+
+def _gamePnL(pnl: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    return np.add.reduceat(pnl, np.cumsum(counts) - counts)
+
+
+def _log(name: str, r: Reduction) -> Reduction:
+    logging.info('{}: {}, plain monte carlo needs {:.1f}x the games'.format(name, r, r.factor))
+    return r
+
+
+def antithetic(sim, batch: bool = False, kernel: bool = False, seed: int = None) -> Reduction:
+    '''expected game pnl of sim on antithetic streams, the unpaired game of an odd chunk is left out'''
+    twin = copy.copy(sim)
+    twin.antithetic = True
+    games, pairs = [], []
+    for stream in twin.streams(seed):
+        g = _gamePnL(*twin.play(stream, batch, kernel))
+        m, h = stream.n - stream.half, stream.half
+        games.extend([g[:m], g[h:h + m]])
+        pairs.append((g[:m] + g[h:h + m]) / 2)
+    games, pairs = np.concatenate(games), np.concatenate(pairs)
+    return _log('antithetic', Reduction(pairs.mean(), _se(pairs), _se(games), len(games)))
+
+
+def commonRandom(sims: list, batch: bool = False, kernel: bool = False, seed: int = None) -> List[Reduction]:
+    '''difference of the expected game pnl of every variant to the first one, all played on the same streams
+
+    sims: strategy variants, e.g. the same class with X=2 and X=3, the first N games are compared
+    seed: seed of the shared streams, default the seed of the first variant
+    return: one Reduction per variant after the first
+    '''
+    root = sims[0].seed if seed is None else seedSequence(seed)
+    g = [np.concatenate([_gamePnL(*x) for x in sim.games(batch, root, kernel)]) for sim in sims]
+    n = min(len(x) for x in g)
+    ret = []
+    for x in g[1:]:
+        d = x[:n] - g[0][:n]
+        naive = np.sqrt((np.var(x[:n], ddof=1) + np.var(g[0][:n], ddof=1)) / n)
+        ret.append(_log('common random numbers', Reduction(d.mean(), _se(d), naive, n)))
+    return ret
+
+
+def controlVariate(sim, batch: bool = False, kernel: bool = False, seed: int = None) -> Reduction:
+    '''expected game pnl of sim with the stake weighted outcome control, needs sim.rate,
+    a control (nearly) equal to the game pnl gives the plain estimate marked degenerate
+    '''
+    mu = sim.outcomeMean()
+    ys, cs = [], []
+    for pnl, counts in sim.games(batch, seed, kernel):
+        stake = pnl / sim.rate(pnl)
+        ys.append(_gamePnL(pnl, counts))
+        cs.append(_gamePnL(pnl - mu * stake, counts))
+    y, c = np.concatenate(ys), np.concatenate(cs)
+    beta = np.cov(y, c)[0, 1] / np.var(c, ddof=1) if np.var(c) > 0 else 0.0
+    z = y - beta * c
+    logging.info('control variate: mean rate {:.6g}, beta {:.4f}'.format(mu, beta))
+    if np.var(z) <= 1e-12 * np.var(y):
+        logging.warning('control variate: the control reproduces the game pnl (mean rate {:.6g}), '
+                        'no variance reduction to report, plain monte carlo estimate'.format(mu))
+        return _log('control variate', Reduction(y.mean(), _se(y), _se(y), len(y), degenerate=True))
+    return _log('control variate', Reduction(z.mean(), _se(z), _se(y), len(y)))
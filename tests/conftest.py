@@ -0,0 +1,42 @@
+# coding=utf-8
+import logging
+import os
+import sys
+
+import numpy as np
+
+## the repository root holds simuT and the simulation package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MPLBACKEND', 'Agg')
+logging.disable(logging.WARNING)
+
+import pytest  # noqa: E402
+
+import simuT  # noqa: E402
+
+## one of every simuT strategy family, small enough to play all modes
+STRATEGIES = {
+    'childSim1_0': lambda: simuT.childSim1_0(10000, 0.002, 3000, 100, 5, 2, simuT.FLAG.LOSS, Seed=3),
+    'childSim1_1': lambda: simuT.childSim1_1(10000, 0.002, 3000, 100, 5, 2, simuT.FLAG.PROFIT, Seed=3),
+    'childSim1_2': lambda: simuT.childSim1_2(10000, 0.002, 3000, 100, 5, 2, simuT.FLAG.LOSS, Seed=3),
+    'childSim2': lambda: simuT.childSim2(10000, 0.002, 3000, 100, 5, 3, 2, simuT.FLAG.LOSS, Seed=3),
+    'SimV3': lambda: simuT.SimV3(10000, 0.002, 3000, 100, 2, Seed=3),
+    'SimV4': lambda: simuT.SimV4(10000, 0.002, 3000, 100, Seed=3),
+}
+
+
+@pytest.fixture(params=sorted(STRATEGIES))
+def strategy(request):
+    '''a new instance of every simuT strategy'''
+    return STRATEGIES[request.param]()
+
+
+def play(sim, **mode):
+    '''flat pnl and trade counts of the N games of sim'''
+    pnl, counts = zip(*sim.games(**mode))
+    return np.concatenate(pnl), np.concatenate(counts)
+
+
+def assertSame(a: tuple, b: tuple) -> None:
+    np.testing.assert_array_equal(a[0], b[0])
+    np.testing.assert_array_equal(a[1], b[1])
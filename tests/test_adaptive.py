@@ -0,0 +1,37 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+import simuT
+from simulation import adaptive
+from simulation.adaptive import QuantileEstimate, runAdaptive
+
+
+def test_quantile_interval_exists_from_min_samples():
+    z = 1.959963984540054
+    for q in (0.05, 0.5, 0.95, 0.99):
+        e = QuantileEstimate(q)
+        n = e.minSamples(z)
+        e.update(np.arange(n - 1.0))
+        assert e.halfWidth(z) == np.inf
+        e.update(np.array([n - 1.0]))
+        assert np.isfinite(e.halfWidth(z))
+    assert QuantileEstimate(0.95).minSamples(z) == 110
+    with pytest.raises(ValueError):
+        QuantileEstimate(0.0)
+
+
+def test_path_quantile_target_converges_after_the_floor():
+    sim = simuT.SimV4(10000, 0.002, 200, 100, Seed=1)
+    ret = runAdaptive(sim, {'mdd95': 1e9}, maxGames=200 * 200, size=200)
+    assert ret.converged
+    assert ret.batches == QuantileEstimate(0.95).minSamples(1.959963984540054)
+
+
+def test_budget_below_the_floor_is_warned(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(adaptive.logging, 'warning', warnings.append)
+    sim = simuT.SimV4(10000, 0.002, 200, 100, Seed=1)
+    ret = runAdaptive(sim, {'mdd95': 1e9}, maxGames=50 * 200, size=200)
+    assert not ret.converged and ret.batches == 50
+    assert any('need 110 batches' in w for w in warnings)
@@ -0,0 +1,58 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+import simuT
+from conftest import assertSame, play
+from kaili import KaliSimu
+from simulation.app import childSim
+from simulation import bootstrap
+from simulation.bootstrap import Bootstrap
+
+
+@pytest.fixture(scope='module')
+def returns(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    path = str(tmp_path_factory.mktemp('bootstrap') / 'returns.npy')
+    np.save(path, rng.choice([0.01, -0.01], 100000) * rng.uniform(0.5, 1.5, 100000))
+    return path
+
+
+@pytest.mark.parametrize('method', bootstrap.METHODS)
+def test_modes_replay_the_same_trades(strategy, method, returns):
+    strategy.source = Bootstrap(returns, method, blockSize=8)
+    ref = play(strategy)
+    if strategy.batchable:
+        assertSame(play(strategy, batch=True), ref)
+    if strategy.compiled:
+        assertSame(play(strategy, kernel=True), ref)
+    spec = simuT.SpecSim(strategy.balance, strategy.initPos, 3000, 100, strategy.spec, Seed=3)
+    spec.source = strategy.source
+    assertSame(play(spec, kernel=True), ref)
+
+
+@pytest.mark.parametrize('method', ['stationary', 'block'])
+def test_resample_is_the_same_with_and_without_numba(method, returns, monkeypatch):
+    src = Bootstrap(returns, method, blockSize=5)
+    u = np.random.default_rng(1).random((50, 64))
+    prev = np.arange(50)
+    ret = []
+    for compiled in (True, False):
+        monkeypatch.setattr(bootstrap, 'HAS_NUMBA', compiled)
+        ret.append((src.resample(u), src.resample(u, 7, prev)))
+    for a, b in zip(*ret):
+        np.testing.assert_array_equal(src.indices(a), src.indices(b))
+
+
+@pytest.mark.parametrize('make', [lambda: KaliSimu(simu_count=100, seed=1),
+                                  lambda: childSim(10000, 0.002, 100, 100, 5, 2, Seed=1)])
+def test_strategies_without_the_decoding_reject_a_source(make, returns):
+    sim = make()
+    sim.source = Bootstrap(returns, 'stationary', blockSize=8)
+    assert not sim.bootstrappable
+    with pytest.raises(ValueError, match='does not replay'):
+        next(sim.streams())
+    with pytest.raises(ValueError, match='does not replay'):
+        sim.compoundPath(100)
+    with pytest.raises(ValueError, match='does not replay'):
+        sim.generatePortfolio(2, 100)
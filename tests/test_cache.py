@@ -0,0 +1,83 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+import simuT
+from simulation import cache
+from simulation.cache import ResultCache
+
+
+@pytest.fixture
+def sim():
+    ret = simuT.SimV4(10000, 0.002, 2000, 100, Seed=1)
+    ret.cache = ResultCache()
+    return ret
+
+
+def test_antithetic_run_is_not_served_the_plain_result(sim):
+    sim.run()
+    plain = np.array(sim._pnl.data)
+    sim.antithetic = True
+    sim.run()
+    assert sim.cache.hits == 0
+    assert not np.array_equal(plain, sim._pnl.data)
+    fresh = simuT.SimV4(10000, 0.002, 2000, 100, Seed=1)
+    fresh.antithetic = True
+    fresh.run()
+    assert np.array_equal(fresh._pnl.data, sim._pnl.data)
+
+
+@pytest.mark.parametrize('method, args', [('generateDF', (2, {})), ('generateGDF', (2, 50, 1))])
+def test_antithetic_curves_miss(sim, method, args):
+    getattr(sim, method)(*args)
+    sim.antithetic = True
+    getattr(sim, method)(*args)
+    assert sim.cache.hits == 0 and sim.cache.misses == 2
+
+
+def test_settings_cover_every_result_setting(sim):
+    assert set(sim.settings()) == {'antithetic', 'chunk', 'compound', 'ruin', 'source', 'version', 'multi'}
+
+
+def test_every_setting_is_keyed(sim, tmp_path, monkeypatch):
+    from simulation.bootstrap import Bootstrap
+
+    np.save(str(tmp_path / 'rtn.npy'), np.random.default_rng(0).normal(0, 0.01, 1000))
+    changes = {'antithetic': True, 'chunk': 500, 'compound': True, 'ruin': 0.5, 'version': 1,
+               'source': Bootstrap(str(tmp_path / 'rtn.npy'))}
+    assert set(changes) | {'multi'} == set(sim.settings())
+    sim.run()
+    for k, v in changes.items():
+        setattr(sim, k, v)
+        sim.run()
+        assert sim.cache.hits == 0, k
+    monkeypatch.setattr(simuT.SimV4, 'multi', {1: 0.2})
+    sim.run()
+    assert sim.cache.hits == 0
+    assert sim.cache.misses == len(changes) + 2
+    ## unchanged settings hit
+    sim.run()
+    assert sim.cache.hits == 1
+
+
+def test_disk_tier_serves_a_new_process(tmp_path):
+    sim = simuT.childSim2(10000, 0.002, 3000, 100, 5, 3, 2, simuT.FLAG.LOSS, Seed=3)
+    sim.cache = ResultCache(str(tmp_path))
+    sim.run()
+    fresh = np.array(sim._pnl.data), np.array(sim._pnl.counts)
+    ## empty memory tier, as in a new process
+    sim.cache = ResultCache(str(tmp_path))
+    sim.run()
+    assert sim.cache.hits == 1
+    np.testing.assert_array_equal(sim._pnl.data, fresh[0])
+    np.testing.assert_array_equal(sim._pnl.counts, fresh[1])
+
+
+@pytest.mark.parametrize('module', ['simulation.compound', 'simulation.stream', 'simulation.shared',
+                                    'simulation.engine', 'simulation.bootstrap'])
+def test_code_version_covers_the_modules_behind_the_results(module, monkeypatch):
+    getsource = cache.inspect.getsource
+    before = cache.codeVersion.__wrapped__(simuT.SimV4)
+    monkeypatch.setattr(cache.inspect, 'getsource',
+                        lambda m: getsource(m) + ('\n# edited' if m.__name__ == module else ''))
+    assert cache.codeVersion.__wrapped__(simuT.SimV4) != before
@@ -0,0 +1,35 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+import simuT
+from simulation.compound import compoundBalance
+
+
+def test_compound_balance_is_the_product_of_the_growth_factors():
+    r = np.random.default_rng(1).normal(0, 0.02, 1000)
+    np.testing.assert_allclose(compoundBalance(r, 100.0), 100.0 * np.cumprod(1 + r), rtol=1e-10)
+    ## chunks chained on the last balance give the whole curve
+    head = compoundBalance(r[:300], 100.0)
+    np.testing.assert_allclose(np.concatenate([head, compoundBalance(r[300:], head[-1])]),
+                               compoundBalance(r, 100.0), rtol=1e-12)
+
+
+def test_total_loss_and_ruin_are_absorbing():
+    b = compoundBalance(np.array([0.1, -1.0, 0.5, 0.2]), 10.0)
+    np.testing.assert_allclose(b, [11.0, 0.0, 0.0, 0.0])
+    ## frozen at the first trade reaching the ruin level, 5
+    b = compoundBalance(np.array([-0.3, -0.3, 0.5, -0.1]), 10.0, ruin=5.0)
+    np.testing.assert_allclose(b, [7.0, 4.9, 4.9, 4.9])
+    np.testing.assert_array_equal(compoundBalance(np.array([0.5, 0.5]), 4.9, ruin=5.0), [4.9, 4.9])
+
+
+def test_compound_run_grows_the_equity_by_the_returns_on_the_init_stake():
+    sim = simuT.SimV4(10000, 0.002, 2000, 100, Seed=3)
+    sim.compound = True
+    sim.run()
+    pnl = sim._pnl.data
+    ## a loss of the whole equity ends at 0 for good
+    growth = np.maximum(1 + pnl / 10000, 0)
+    np.testing.assert_allclose(sim._balances, 10000 * np.cumprod(np.insert(growth, 0, 1)), rtol=1e-10)
+    assert sim.runStream().trade.balance == pytest.approx(sim._balances[-1], rel=1e-12)
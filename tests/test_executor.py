@@ -0,0 +1,38 @@
+# coding=utf-8
+import pickle
+
+import pytest
+
+from simulation.executor import Executor, getExecutor
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_map_runs_every_task_and_reports_progress(backend):
+    done = []
+    with Executor(2, backend) as ex:
+        ret = ex.map(square, [(i,) for i in range(10)], progress=lambda d, t: done.append((d, t)))
+        pool = ex.pool
+        ## the pool is reused by the next call
+        assert sorted(ex.map(square, [(3,)])) == [9] and ex.pool is pool
+    assert sorted(ret) == [i * i for i in range(10)]
+    assert done == [(i, 10) for i in range(1, 11)]
+
+
+def test_copies_start_their_own_pool():
+    ex = Executor(1, 'thread')
+    ex.map(square, [(2,)])
+    copy = pickle.loads(pickle.dumps(ex))
+    assert copy.cores == 1 and copy.backend == 'thread'
+    assert copy.map(square, [(4,)]) == [16] and copy.pool is not ex.pool
+    ex.close()
+    copy.close()
+
+
+def test_module_executor_is_shared_and_backends_are_checked():
+    assert getExecutor(1, 'thread') is getExecutor(1, 'thread')
+    with pytest.raises(ValueError):
+        Executor(1, 'gpu')
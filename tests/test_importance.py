@@ -0,0 +1,27 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+import simuT
+from simulation.importance import tailRisk
+
+
+def test_tilted_estimate_agrees_with_plain_monte_carlo():
+    sim = simuT.SimV3(10000, 0.002, 20000, 100, 2, Seed=3)
+    ## 0.4 is two losing trades of the init stake
+    tilted = tailRisk(sim, loss=0.00004, drawdown=0.00004)
+    ## the untilted winning ratio weighs every game 1, plain monte carlo
+    plain = tailRisk(sim, loss=0.00004, drawdown=0.00004, tilt=sim.wlRatio)
+    for name in ('ruin', 'drawdown'):
+        a, b = tilted[name], plain[name]
+        assert 0 < b.value < 1
+        assert b.se == pytest.approx(b.naiveSe, rel=1e-3)
+        assert abs(a.value - b.value) < 4 * np.hypot(a.se, b.se)
+
+
+@pytest.mark.parametrize('cls', [simuT.childSim1_1, simuT.childSim1_2])
+def test_defaults_play_strategies_without_a_batch_mode(cls):
+    sim = cls(10000, 0.002, 2000, 100, 5, 2, simuT.FLAG.LOSS, Seed=3)
+    assert not sim.batchable
+    ret = tailRisk(sim, loss=0.00004, pilot=1000)
+    assert 0 < ret['ruin'].value <= 1
@@ -0,0 +1,45 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+from kaili import KaliSimu
+from simulation.ragged import Ragged
+from simulation.rng import generator
+
+
+def test_default_stake_is_the_baseline_best_pos():
+    k = KaliSimu(simu_count=1000, seed=1)
+    ## p + loss_rtn (1 - p) / profit_rtn, not the kelly fraction of the outcome() returns
+    assert k.best_pos == pytest.approx(0.2)
+    assert k.kelly_pos == pytest.approx(20.0)
+    path = k.path(generator(1))
+    assert np.max(np.abs(np.diff(path))) == pytest.approx(10000 * 0.2 * 0.015)
+
+
+def test_growth_matches_the_simulated_returns():
+    k = KaliSimu(simu_count=1000, seed=1)
+    trades = 20000
+    for pos in (k.kelly_pos / 2, k.kelly_pos):
+        path = k.compoundPath(trades + 1, pos=pos)
+        ## a log return of the kelly stake has a std of about 0.25, 3 standard errors
+        assert np.log(path[-1] / path[0]) / trades == pytest.approx(k.growth(pos), abs=0.006)
+    ## the kelly fraction maximizes the growth of the outcome() returns
+    assert k.growth(k.kelly_pos) > max(k.growth(k.kelly_pos * 0.9), k.growth(k.kelly_pos * 1.1))
+
+
+def test_negative_edge_stakes_nothing():
+    k = KaliSimu(simu_count=500, winning_rate=0.3, seed=1)
+    assert k.kelly_pos == 0
+    d = k.kelly(paths=50)
+    assert np.all((d['fraction'] >= 0) & (d['fraction'] < k.feasible))
+    assert d.loc[d['growth'].idxmax(), 'optimal']
+
+
+def test_game_plays_the_trades_of_the_path_into_a_row():
+    k = KaliSimu(simu_count=1000, seed=1)
+    out = Ragged()
+    out.start()
+    k.game(generator(1), out)
+    path = k.path(generator(1))
+    assert out.count == 1000
+    np.testing.assert_allclose(path[0] + np.cumsum(out.data), path[1:])
@@ -0,0 +1,10 @@
+# coding=utf-8
+import pytest
+
+from conftest import assertSame, play
+
+
+def test_kernel_plays_the_games_of_the_python_loop(strategy):
+    if not strategy.compiled:
+        pytest.skip('no compiled kernel')
+    assertSame(play(strategy, kernel=True), play(strategy))
@@ -0,0 +1,46 @@
+# coding=utf-8
+import warnings
+
+import numpy as np
+import pytest
+
+import simuT
+from simulation.markov import evaluate
+
+
+def gamePnL(sim, steps: int = None):
+    '''game pnl of run() in batch mode, only the games of at most steps trades'''
+    pnl, counts = map(np.concatenate, zip(*sim.games(batch=True)))
+    ret = np.add.reduceat(pnl, np.cumsum(counts) - counts)
+    return ret if steps is None else ret[counts <= steps]
+
+
+@pytest.mark.parametrize('steps', [60, 1000])
+def test_simv3_every_game_wins_the_first_stake(steps):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        d = evaluate(simuT.SimV3(10000, 0.002, 1, 100, 2, Seed=1), maxSteps=steps)
+    assert d.mean == pytest.approx(0.2, abs=1e-9)
+    assert d.std == pytest.approx(0.0, abs=1e-6)
+    ## loss chains beyond the exact range are truncated, not followed
+    assert 0 < d.truncated < 1e-6
+
+
+def test_childsim2_moments_match_run():
+    sim = simuT.childSim2(10000, 0.002, 100000, 100, 5, 10, 2, simuT.FLAG.LOSS, Seed=1)
+    d = evaluate(sim)
+    g = gamePnL(sim)
+    assert d.truncated == 0
+    assert abs(d.mean - g.mean()) < 4 * g.std() / np.sqrt(len(g))
+    assert d.std == pytest.approx(g.std(), rel=0.03)
+
+
+def test_simv4_moments_match_run():
+    ## the stake triples at odds 1 / 2, the full mean diverges: compare the games finished within the steps
+    steps = 8
+    sim = simuT.SimV4(10000, 0.002, 100000, 100, Seed=1)
+    d = evaluate(sim, maxSteps=steps)
+    g = gamePnL(sim, steps)
+    assert d.truncated == pytest.approx(2.0 ** -steps)
+    assert abs(d.mean - g.mean()) < 4 * g.std() / np.sqrt(len(g))
+    assert d.std == pytest.approx(g.std(), rel=0.05)
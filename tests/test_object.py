@@ -0,0 +1,10 @@
+# coding=utf-8
+import pytest
+
+from conftest import assertSame, play
+
+
+def test_batch_mode_plays_the_games_of_the_python_loop(strategy):
+    if not strategy.batchable:
+        pytest.skip('no batch mode')
+    assertSame(play(strategy, batch=True), play(strategy))
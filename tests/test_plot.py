@@ -0,0 +1,27 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+from simulation.plot import decimate
+
+
+def test_decimate_keeps_both_ends_and_the_extremes():
+    y = np.concatenate([[5.0], np.random.default_rng(0).normal(10, 1, 100000)])
+    idx, v = decimate(y, 200)
+    assert idx[0] == 0 and v[0] == 5.0
+    assert idx[-1] == len(y) - 1
+    assert v.max() == y.max() and v.min() == y.min()
+    assert np.all(np.diff(idx) > 0) and len(idx) <= 202
+
+
+@pytest.mark.parametrize('points', [-1, 0, 1])
+def test_decimate_rejects_less_than_a_bucket(points):
+    with pytest.raises(ValueError):
+        decimate(np.arange(10.0), points)
+
+
+def test_decimate_two_points_keeps_the_ends_and_the_extremes():
+    y = np.array([3.0, 9.0, -4.0, 5.0, 1.0])
+    idx, v = decimate(y, 2)
+    assert idx[0] == 0 and idx[-1] == len(y) - 1
+    assert v.max() == 9.0 and v.min() == -4.0
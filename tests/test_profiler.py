@@ -0,0 +1,24 @@
+# coding=utf-8
+import simuT
+from simulation.profiler import Profiler
+
+
+def test_profile_reports_the_phases_and_the_games_of_run():
+    sim = simuT.childSim1_0(10000, 0.002, 500, 100, 5, 2, simuT.FLAG.LOSS, Seed=3)
+    report = sim.profile('run')
+    assert {'total', 'simulate', 'aggregate', 'partial'} <= set(report['phases'])
+    assert all(p['calls'] == 1 and p['wall'] >= 0 for p in report['phases'].values())
+    assert report['phases']['simulate']['wall'] <= report['phases']['total']['wall']
+    assert report['games'] == 500 and report['trades'] == len(sim._pnl.data)
+    ## the profiler is only set for the call
+    assert sim.profiler is None
+
+
+def test_phases_add_up_over_calls():
+    sim = simuT.SimV4(10000, 0.002, 200, 100, Seed=3)
+    sim.profiler = Profiler()
+    sim.run()
+    sim.run()
+    report = sim.profiler.report()
+    assert report['phases']['simulate']['calls'] == 2
+    assert report['games'] == 400
@@ -0,0 +1,32 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+from simulation.ragged import Ragged
+
+
+def test_rows_counts_and_sums():
+    out = Ragged()
+    for row in ([1.0, 2.0], [], [3.0, 4.0, 5.0]):
+        out.start()
+        out.extend(np.array(row))
+    assert len(out) == 3 and out.size == 5
+    np.testing.assert_array_equal(out.counts, [2, 0, 3])
+    np.testing.assert_array_equal(out.sums(), [3.0, 0.0, 12.0])
+    assert out.tolist() == [[1.0, 2.0], [], [3.0, 4.0, 5.0]]
+    again = Ragged.fromCounts(out.data.copy(), out.counts)
+    assert again.tolist() == out.tolist()
+    with pytest.raises(TypeError):
+        again.append(1.0)
+
+
+def test_a_live_data_view_pins_the_buffer():
+    out = Ragged()
+    out.start()
+    out.append(1.0)
+    view = out.data
+    with pytest.raises(BufferError):
+        out.append(2.0)
+    del view
+    out.append(2.0)
+    assert out.count == 2
@@ -0,0 +1,33 @@
+# coding=utf-8
+import os
+
+import numpy as np
+
+import simuT
+from simulation.executor import Executor
+from simulation.shared import release, sharedMatrix, sharedPath
+
+
+def test_a_reopened_matrix_shares_the_columns():
+    path = sharedPath()
+    try:
+        parent = sharedMatrix(path, 5, 3, mode='w+')
+        worker = sharedMatrix(path, 5, 3)
+        worker[:, 1] = np.arange(5)
+        worker.flush()
+        np.testing.assert_array_equal(parent[:, 1], np.arange(5))
+        ## column-major, every column is one contiguous slice
+        assert parent[:, 1].flags['C_CONTIGUOUS']
+    finally:
+        release(path)
+    assert not os.path.exists(path)
+
+
+def test_gdf_columns_are_the_strategy_curves():
+    sim = simuT.childSim1_0(10000, 0.002, 500, 100, 5, 2, simuT.FLAG.LOSS, Seed=3)
+    with Executor(2, 'thread') as ex:
+        d = sim.generateGDF(3, 200, executor=ex)
+    assert d.columns.tolist() == ['strategy0', 'strategy1', 'strategy2', 'strategyM']
+    for i, ss in enumerate(sim.strategySeeds(3)):
+        np.testing.assert_array_equal(d.iloc[:, i].values, sim(200, ss))
+    np.testing.assert_allclose(d['strategyM'], d.iloc[:, :3].mean(axis=1))
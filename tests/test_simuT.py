@@ -0,0 +1,19 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+import simuT
+from conftest import play
+
+
+def test_child_sim1_1_curves_keep_their_own_distribution():
+    sim = simuT.childSim1_1(10000, 0.002, 10000, 100, 5, 2, simuT.FLAG.LOSS, Seed=3)
+    ## generateDF draws +-2% at a winning ratio of 55%
+    pnl = np.diff(sim.generateDF(1, {}).values[:, 0])
+    np.testing.assert_allclose(np.unique(np.round(pnl, 9)), [-0.4, 0.4])
+    assert np.mean(pnl > 0) == pytest.approx(0.55, abs=0.02)
+    ## the games play the WRatio / LRatio / WLRatio of the constructor, +-1% at 50%
+    pnl, counts = play(sim)
+    first = pnl[np.cumsum(counts) - counts]
+    np.testing.assert_allclose(np.abs(first), 10000 * 0.002 * 0.01)
+    assert np.mean(first > 0) == pytest.approx(0.5, abs=0.02)
@@ -0,0 +1,10 @@
+# coding=utf-8
+import simuT
+from conftest import assertSame, play
+
+
+def test_spec_sim_plays_the_games_of_the_strategy(strategy):
+    ref = play(strategy)
+    spec = simuT.SpecSim(strategy.balance, strategy.initPos, 3000, 100, strategy.spec, Seed=3)
+    assertSame(play(spec, kernel=True), ref)
+    assertSame(play(spec), ref)
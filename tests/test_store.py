@@ -0,0 +1,27 @@
+# coding=utf-8
+import numpy as np
+
+import simuT
+from simulation.store import ResultStore
+
+
+def test_run_round_trips_through_a_reopened_store(tmp_path):
+    sim = simuT.SimV3(10000, 0.002, 3000, 100, 2, Seed=3)
+    store = ResultStore(str(tmp_path / 'run'), 'w', sim.describe())
+    sim.run(store=store)
+    store.close()
+    again = ResultStore(str(tmp_path / 'run'))
+    assert again.meta['params'] == sim.describe()['params']
+    np.testing.assert_array_equal(again['pnl'], sim._pnl.data)
+    np.testing.assert_array_equal(again['counts'], sim._pnl.counts)
+    np.testing.assert_array_equal(again['balances'], sim._balances)
+
+
+def test_load_stream_gives_the_stats_of_run_stream(tmp_path):
+    sim = simuT.childSim2(10000, 0.002, 3000, 100, 5, 3, 2, simuT.FLAG.LOSS, Seed=3)
+    store = ResultStore(str(tmp_path / 'stream'), 'w', sim.describe())
+    st = sim.runStream(store=store)
+    store.close()
+    loaded = sim.loadStream(ResultStore(str(tmp_path / 'stream')))
+    for a, b in ((st.trade, loaded.trade), (st.gamer, loaded.gamer), (st.partial, loaded.partial)):
+        assert (a.avg, a.std, a.mdd, a.balance) == (b.avg, b.std, b.mdd, b.balance)
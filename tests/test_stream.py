@@ -0,0 +1,39 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+import simuT
+import simulation.stream as stream
+from simulation.stream import CurveStat
+from simulation.utils import calcPerformance
+
+
+@pytest.mark.parametrize('compound', [False, True])
+def test_run_stream_gives_the_performance_of_run(compound):
+    sim = simuT.SimV3(10000, 0.002, 3000, 100, 2, Seed=3)
+    sim.compound = compound
+    sim.run()
+    st = sim.runStream()
+    for curve, balances in ((st.trade, sim._balances), (st.partial, sim._partialBalance)):
+        p = calcPerformance(balances)
+        assert curve.balance == pytest.approx(balances[-1], rel=1e-12)
+        assert curve.avg == pytest.approx(p.avg, rel=1e-9)
+        assert curve.std == pytest.approx(p.std, rel=1e-9)
+        assert curve.mdd == pytest.approx(p.mdd, rel=1e-9)
+
+
+@pytest.mark.parametrize('m', [1, 2, 500])
+def test_column_wise_curve_stat_is_the_same_with_and_without_numba(m, monkeypatch):
+    rng = np.random.default_rng(3)
+    chunks = [1000 + np.cumsum(rng.normal(0, 5, (t, m)), axis=0) for t in (1, 300, 2048, 17)]
+    ## a ruined balance
+    chunks[2][5:9, 0] = 0.0
+    ret = []
+    for compiled in (True, False):
+        monkeypatch.setattr(stream, 'HAS_NUMBA', compiled)
+        c = CurveStat(np.full(m, 1000.0))
+        for x in chunks:
+            c.extend(x)
+        ret.append([c.avg, c.std, c.mdd, c.balance])
+    for a, b in zip(*ret):
+        np.testing.assert_array_equal(a, b)
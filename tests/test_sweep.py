@@ -0,0 +1,24 @@
+# coding=utf-8
+import simuT
+from simulation.executor import Executor
+from simulation.sweep import grid, sweep
+
+
+def test_grid_is_the_product_of_the_lists():
+    cells = grid(InitPos=[0.001, 0.002], X=[2, 3], Flag=simuT.FLAG.LOSS)
+    assert len(cells) == 4
+    assert cells[0] == {'InitPos': 0.001, 'X': 2, 'Flag': simuT.FLAG.LOSS}
+
+
+def test_a_cell_gives_the_same_rows_in_any_sweep():
+    base = dict(InitBalance=10000, N=300, K=100, A=5, Flag=simuT.FLAG.LOSS)
+    with Executor(2, 'thread') as ex:
+        full = sweep(simuT.childSim1_0, grid(InitPos=[0.001, 0.002], X=[2, 3], **base), replicates=2, seed=7,
+                     executor=ex)
+        one = sweep(simuT.childSim1_0, grid(InitPos=0.002, X=[3, 3], **base), replicates=2, seed=7, executor=ex)
+    assert len(full) == 8 and len(one) == 2
+    cell = full[(full.InitPos == 0.002) & (full.X == 3)].reset_index(drop=True)
+    assert cell.equals(one)
+    ## replicates are independent runs
+    assert one.loc[0, 'rtn'] != one.loc[1, 'rtn']
+    assert (full.games == 300).all()
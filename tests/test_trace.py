@@ -0,0 +1,28 @@
+# coding=utf-8
+import numpy as np
+
+import simuT
+from conftest import play
+from simulation.trace import TraceSink
+
+
+def test_trace_records_every_trade_of_the_python_games():
+    sim = simuT.childSim1_0(10000, 0.002, 300, 100, 5, 2, simuT.FLAG.LOSS, Seed=3)
+    ## small buffer, grown while recording
+    sim.trace = TraceSink(capacity=4)
+    pnl, counts = play(sim)
+    t = sim.trace.columns()
+    assert len(sim.trace) == len(pnl)
+    np.testing.assert_array_equal(t['pnl'], pnl)
+    np.testing.assert_array_equal(t['game'], np.repeat(np.arange(len(counts)), counts))
+    np.testing.assert_array_equal(t['step'], np.arange(len(pnl)) - np.repeat(np.cumsum(counts) - counts, counts))
+    ## balance within a game, from the init balance
+    run = np.cumsum(pnl) - np.repeat(np.cumsum(pnl)[np.cumsum(counts) - counts] - pnl[np.cumsum(counts) - counts],
+                                     counts)
+    np.testing.assert_allclose(t['balance'], 10000 + run)
+
+
+def test_no_trace_by_default():
+    sim = simuT.childSim1_0(10000, 0.002, 30, 100, 5, 2, simuT.FLAG.LOSS, Seed=3)
+    assert sim.trace is None
+    play(sim)
@@ -0,0 +1,23 @@
+# coding=utf-8
+import numpy as np
+
+import simuT
+from simulation.variance import controlVariate
+
+
+def test_control_equal_to_the_game_pnl_is_degenerate():
+    ## +-1% at 50%, a mean rate of 0
+    sim = simuT.childSim1_0(10000, 0.002, 5000, 100, 5, 2, simuT.FLAG.LOSS, Seed=3)
+    assert sim.outcomeMean() == 0
+    r = controlVariate(sim)
+    assert r.degenerate and r.factor == 1
+    assert r.se > 0 and 'degenerate' in repr(r)
+
+
+def test_control_with_an_edge_reduces_the_variance():
+    sim = simuT.childSim1_0(10000, 0.002, 5000, 100, 5, 2, simuT.FLAG.LOSS, Seed=3, WLRatio=0.55)
+    r = controlVariate(sim)
+    assert not r.degenerate and 1 < r.factor < 1e6
+    ## unbiased against the plain mean of the same games
+    plain = (sim.runStream().gamer.balance - sim.balance) / 5000
+    assert abs(r.value - plain) < 4 * r.naiveSe